@@ -0,0 +1,46 @@
+"""Normalize report keys and add listing indexes
+
+Revision ID: 3ac4bbd3cb60
+Revises: 9d9d1af87b4e
+Create Date: 2026-10-18 09:12:40.118203
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3ac4bbd3cb60'
+down_revision: Union[str, Sequence[str], None] = '9d9d1af87b4e'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Older databases got 'visibility' from the startup ALTER TABLE in main.py
+    columns = [c["name"] for c in sa.inspect(op.get_bind()).get_columns('reports')]
+    if 'visibility' not in columns:
+        op.add_column('reports', sa.Column('visibility', sa.String(), nullable=False, server_default='shared'))
+
+    # Store the canonical lowercase form so listings can filter with "=" instead of ILIKE
+    op.execute("UPDATE reports SET site_name = lower(trim(site_name)), category = lower(trim(category))")
+    op.execute("UPDATE reports SET visibility = 'shared' WHERE visibility IS NULL OR trim(visibility) = ''")
+    op.execute("UPDATE reports SET visibility = lower(trim(visibility))")
+
+    op.create_index(
+        'ix_reports_site_category_date', 'reports',
+        ['site_name', 'category', sa.text('date DESC'), 'visibility'],
+    )
+    op.create_index(
+        'ix_reports_site_date', 'reports',
+        ['site_name', sa.text('date DESC'), 'visibility'],
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_reports_site_date', table_name='reports')
+    op.drop_index('ix_reports_site_category_date', table_name='reports')
@@ -0,0 +1,62 @@
+"""Move users.allowed_sites into a user_sites membership table
+
+Revision ID: 5b1e0f7d2c48
+Revises: cd8a6e37953c
+Create Date: 2026-10-18 14:20:05.318442
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5b1e0f7d2c48'
+down_revision: Union[str, Sequence[str], None] = 'cd8a6e37953c'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    user_sites = op.create_table(
+        'user_sites',
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('site_name', sa.String(), nullable=False),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('user_id', 'site_name'),
+    )
+    op.create_index('ix_user_sites_site_user', 'user_sites', ['site_name', 'user_id'])
+
+    # One row per (user, site) from the old comma-separated string, normalized like the model does
+    bind = op.get_bind()
+    rows = []
+    for user_id, allowed_sites in bind.execute(sa.text("SELECT id, allowed_sites FROM users")):
+        sites = dict.fromkeys(s.strip().lower() for s in (allowed_sites or "").split(",") if s.strip())
+        rows += [{'user_id': user_id, 'site_name': site} for site in sites]
+    if rows:
+        op.bulk_insert(user_sites, rows)
+
+    # users has no DESC indexes, so the SQLite table rebuild is safe here
+    with op.batch_alter_table('users') as batch_op:
+        batch_op.drop_column('allowed_sites')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.batch_alter_table('users') as batch_op:
+        batch_op.add_column(sa.Column('allowed_sites', sa.String(), nullable=False, server_default='shared'))
+
+    bind = op.get_bind()
+    memberships = {}
+    for user_id, site_name in bind.execute(
+        sa.text("SELECT user_id, site_name FROM user_sites ORDER BY user_id, site_name")
+    ):
+        memberships.setdefault(user_id, []).append(site_name)
+    for user_id, sites in memberships.items():
+        bind.execute(sa.text("UPDATE users SET allowed_sites = :sites WHERE id = :id"),
+                     {'sites': ",".join(sites), 'id': user_id})
+
+    op.drop_index('ix_user_sites_site_user', table_name='user_sites')
+    op.drop_table('user_sites')
@@ -0,0 +1,61 @@
+"""Add report_text and its full-text index for report search
+
+Revision ID: b7d5e2a9c3f1
+Revises: 4f7b3e1c9a26
+Create Date: 2026-10-18 19:24:37.112045
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b7d5e2a9c3f1'
+down_revision: Union[str, Sequence[str], None] = '4f7b3e1c9a26'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Same statements as models.REPORT_TEXT_SQLITE_DDL / REPORT_TEXT_POSTGRES_DDL
+SQLITE_DDL = [
+    "CREATE VIRTUAL TABLE report_text_fts USING fts5("
+    "body, content='report_text', content_rowid='report_id', tokenize='unicode61 remove_diacritics 2')",
+    "CREATE TRIGGER report_text_ai AFTER INSERT ON report_text BEGIN "
+    "INSERT INTO report_text_fts(rowid, body) VALUES (new.report_id, new.body); END",
+    "CREATE TRIGGER report_text_ad AFTER DELETE ON report_text BEGIN "
+    "INSERT INTO report_text_fts(report_text_fts, rowid, body) VALUES ('delete', old.report_id, old.body); END",
+    "CREATE TRIGGER report_text_au AFTER UPDATE ON report_text BEGIN "
+    "INSERT INTO report_text_fts(report_text_fts, rowid, body) VALUES ('delete', old.report_id, old.body); "
+    "INSERT INTO report_text_fts(rowid, body) VALUES (new.report_id, new.body); END",
+]
+POSTGRES_DDL = [
+    "ALTER TABLE report_text ADD COLUMN tsv tsvector "
+    "GENERATED ALWAYS AS (to_tsvector('simple', body)) STORED",
+    "CREATE INDEX ix_report_text_tsv ON report_text USING GIN (tsv)",
+]
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'report_text',
+        sa.Column('report_id', sa.Integer(), nullable=False),
+        sa.Column('body', sa.Text(), nullable=False),
+        sa.Column('status', sa.String(), nullable=False),
+        sa.Column('indexed_at', sa.DateTime(), nullable=False),
+        sa.ForeignKeyConstraint(['report_id'], ['reports.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('report_id'),
+    )
+    dialect = op.get_bind().dialect.name
+    statements = {"sqlite": SQLITE_DDL, "postgresql": POSTGRES_DDL}.get(dialect, [])
+    for statement in statements:
+        op.execute(statement)
+    # existing reports are indexed by the background indexer / `python -m app.search`
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    if op.get_bind().dialect.name == "sqlite":
+        op.execute("DROP TABLE IF EXISTS report_text_fts")
+    op.drop_table('report_text')
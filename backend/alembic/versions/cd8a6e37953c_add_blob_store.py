@@ -0,0 +1,50 @@
+"""Add content-addressed blob store
+
+Revision ID: cd8a6e37953c
+Revises: 3ac4bbd3cb60
+Create Date: 2026-10-18 11:03:27.540912
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'cd8a6e37953c'
+down_revision: Union[str, Sequence[str], None] = '3ac4bbd3cb60'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'blobs',
+        sa.Column('sha256', sa.String(length=64), nullable=False),
+        sa.Column('size', sa.BigInteger(), nullable=False),
+        sa.Column('ref_count', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('created_at', sa.DateTime(), nullable=False, server_default=sa.func.now()),
+        sa.PrimaryKeyConstraint('sha256'),
+    )
+    # Existing rows keep NULL until `python migrate_to_blobs.py` moves their files
+    # Older databases may have the column from the startup ALTER TABLE main.py used to run
+    columns = [c["name"] for c in sa.inspect(op.get_bind()).get_columns('reports')]
+    if 'blob_sha256' not in columns:
+        op.add_column('reports', sa.Column('blob_sha256', sa.String(length=64), nullable=True))
+    # SQLite can't add constraints in place (and a batch rebuild would drop the DESC index order)
+    if op.get_bind().dialect.name != 'sqlite':
+        op.create_foreign_key('fk_reports_blob_sha256', 'reports', 'blobs', ['blob_sha256'], ['sha256'])
+    op.create_index('ix_reports_blob_sha256', 'reports', ['blob_sha256'])
+    op.create_index('ix_reports_file_name', 'reports', ['file_name'])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_reports_file_name', table_name='reports')
+    op.drop_index('ix_reports_blob_sha256', table_name='reports')
+    if op.get_bind().dialect.name != 'sqlite':
+        op.drop_constraint('fk_reports_blob_sha256', 'reports', type_='foreignkey')
+    op.drop_column('reports', 'blob_sha256')
+    op.drop_table('blobs')
@@ -0,0 +1,42 @@
+"""Add id to the listing indexes so pages need no sort
+
+Revision ID: e3c81f5a7b20
+Revises: b7d5e2a9c3f1
+Create Date: 2026-10-18 21:05:12.604318
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e3c81f5a7b20'
+down_revision: Union[str, Sequence[str], None] = 'b7d5e2a9c3f1'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def _recreate(category_columns, site_columns):
+    op.drop_index('ix_reports_site_date', table_name='reports')
+    op.drop_index('ix_reports_site_category_date', table_name='reports')
+    op.create_index('ix_reports_site_category_date', 'reports', category_columns)
+    op.create_index('ix_reports_site_date', 'reports', site_columns)
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Listings order by (date DESC, id DESC); without id the tie-breaker forced a sort
+    _recreate(
+        ['site_name', 'category', sa.text('date DESC'), sa.text('id DESC'), 'visibility'],
+        ['site_name', sa.text('date DESC'), sa.text('id DESC'), 'visibility'],
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    _recreate(
+        ['site_name', 'category', sa.text('date DESC'), 'visibility'],
+        ['site_name', sa.text('date DESC'), 'visibility'],
+    )
@@ -1,17 +1,19 @@
 # auth.py
 from datetime import datetime, timedelta
+from typing import Optional
 # from jose import JWTError, jwt
-from passlib.context import CryptContext
-from fastapi import Depends, HTTPException, status
+from fastapi import Depends, HTTPException, Query, Request, status
 from fastapi.security import OAuth2PasswordBearer   # ← THIS is required
 from sqlalchemy.orm import Session
-from . import models, database
+from . import models, database, crud, principals, hashing
+from .principals import Principal
 from .database import SessionLocal, get_db
 import jwt
 from jwt import PyJWTError
 
 
 import os
+import time
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -19,14 +21,17 @@ load_dotenv()
 SECRET_KEY = os.getenv("SECRET_KEY", "your-secret-key")
 ALGORITHM = os.getenv("ALGORITHM", "HS256")
 ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "60"))
+# Lifetime of the ?token= link tokens (between one and two of these)
+LINK_TOKEN_EXPIRE_SECONDS = int(os.getenv("LINK_TOKEN_EXPIRE_SECONDS", "300"))
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+pwd_context = hashing.pwd_context
 
+# Blocking helpers for scripts; request handlers use hashing.hasher instead
 def get_password_hash(password: str) -> str:
-    return pwd_context.hash(password)
+    return hashing.hash_password(password)
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
-    return pwd_context.verify(plain_password, hashed_password)
+    return hashing.check_password(plain_password, hashed_password)
 
 def create_access_token(data: dict):
     to_encode = data.copy()
@@ -34,20 +39,76 @@ def create_access_token(data: dict):
     to_encode.update({"exp": expire})
     return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
 
+def create_link_token(email: str, resource: str) -> str:
+    """Short-lived token that only opens `resource` (e.g. "report_id=42") through ?token=.
+
+    URLs end up in access logs and browser history, so the session token never
+    goes there. The expiry is rounded to the window, so a link stays the same
+    (and the browser cache keeps working) for a while.
+    """
+    window = max(LINK_TOKEN_EXPIRE_SECONDS, 1)
+    expire = (int(time.time()) // window + 2) * window
+    return jwt.encode({"sub": email, "res": resource, "exp": expire}, SECRET_KEY, algorithm=ALGORITHM)
+
 # ---------- NEW: token scheme + dependency ----------
 # OAuth2 scheme that extracts the "Authorization: Bearer <token>" header
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/login")
 
-def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(database.get_db)):
+def _email_from_token(token: str, resource: Optional[str] = None) -> str:
+    """Subject of a session token, or of a link token for `resource` when one is given."""
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         email: str = payload.get("sub")
-        if email is None:
+        # a link token never authenticates anything but its own resource
+        if email is None or payload.get("res") != resource:
             raise HTTPException(status_code=401, detail="Invalid authentication credentials")
     except PyJWTError:
         raise HTTPException(status_code=401, detail="Invalid authentication credentials")
-    
-    user = db.query(models.User).filter(models.User.email == email).first()
-    if user is None:
-        raise HTTPException(status_code=401, detail="User not found")
-    return user
\ No newline at end of file
+    return email
+
+def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(database.get_db)) -> Principal:
+    email = _email_from_token(token)
+
+    # Only hit the database when the principal isn't cached
+    principal = principals.cache.get(email)
+    if principal is None:
+        user = db.query(models.User).filter(models.User.email == email).first()
+        if user is None:
+            raise HTTPException(status_code=401, detail="User not found")
+        principal = Principal.from_user(user)
+        principals.cache.put(email, principal)
+    return principal
+
+async def get_current_user_async(token: str = Depends(oauth2_scheme), db=Depends(database.get_async_db)) -> Principal:
+    """Async twin of get_current_user for endpoints on the async DB path."""
+    return await _principal_async(_email_from_token(token), db)
+
+async def _principal_async(email: str, db) -> Principal:
+    principal = principals.cache.get(email)
+    if principal is None:
+        user = await crud.aget_user_detached(db, email)
+        if user is None:
+            raise HTTPException(status_code=401, detail="User not found")
+        principal = Principal.from_user(user)
+        principals.cache.put(email, principal)
+    return principal
+
+# Same scheme without the automatic 401, so a ?token= query parameter can stand in
+optional_oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/login", auto_error=False)
+
+def get_current_user_header_or_link(param: str):
+    """Dependency for URLs opened by iframes/links/<img>, which can't send headers:
+    get_current_user_async, or a ?token= from create_link_token for this path's `param`."""
+    async def dependency(
+        request: Request,
+        header_token: Optional[str] = Depends(optional_oauth2_scheme),
+        token: Optional[str] = Query(None, description="Link token for clients that can't send headers (iframes, links)"),
+        db=Depends(database.get_async_db),
+    ) -> Principal:
+        if header_token:
+            return await get_current_user_async(header_token, db)
+        if not token:
+            raise HTTPException(status_code=401, detail="Not authenticated", headers={"WWW-Authenticate": "Bearer"})
+        email = _email_from_token(token, f"{param}={request.path_params[param]}")
+        return await _principal_async(email, db)
+    return dependency
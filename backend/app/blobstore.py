@@ -0,0 +1,150 @@
+# blobstore.py
+"""Content-addressed, reference-counted storage for uploaded report files.
+
+Each distinct file is stored once under UPLOAD_FOLDER/blobs/<aa>/<sha256>; a
+`blobs` row tracks how many reports point at it. Re-uploading identical bytes
+(under another site, or via save_as_new) only bumps the count, and the file is
+removed when the last report referencing it goes away.
+"""
+import os
+
+from sqlalchemy import select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from . import models, previews
+from .database import UPLOAD_FOLDER
+
+BLOB_FOLDER = os.path.join(UPLOAD_FOLDER, "blobs")
+
+
+def blob_path(sha256: str) -> str:
+    return os.path.join(BLOB_FOLDER, sha256[:2], sha256)
+
+
+def preview_path(sha256: str, fmt: str) -> str:
+    """Rendered preview of a blob (see previews.py), stored next to it."""
+    return f"{blob_path(sha256)}.preview.{fmt}"
+
+
+def _remove_previews(sha256: str):
+    for fmt in previews.MEDIA_TYPES:
+        try:
+            os.remove(preview_path(sha256, fmt))
+        except FileNotFoundError:
+            pass
+
+
+def queue_preview(file_type: str, sha256: str) -> bool:
+    """Hand a blob to the preview pool unless its preview already exists (dedup uploads)."""
+    fmt = previews.preview_format(file_type)
+    if fmt is None:
+        return False
+    dest = preview_path(sha256, fmt)
+    if os.path.exists(dest):
+        return True
+    return previews.renderer.submit(file_type, blob_path(sha256), dest)
+
+
+def report_file_path(report) -> str:
+    """Where a report's bytes live: its blob, or the legacy flat file for unmigrated rows."""
+    if report.blob_sha256:
+        return blob_path(report.blob_sha256)
+    return os.path.join(UPLOAD_FOLDER, report.file_name)
+
+
+def _incref(db: Session, sha256: str) -> bool:
+    result = db.execute(
+        update(models.Blob)
+        .where(models.Blob.sha256 == sha256)
+        .values(ref_count=models.Blob.ref_count + 1)
+    )
+    return result.rowcount > 0
+
+
+def acquire(db: Session, staged) -> bool:
+    """Take a reference on the blob for a staged upload, storing it if it is new.
+
+    Returns True when the content was already stored (the staged file is dropped
+    without writing anything). Must be followed by db.commit().
+    """
+    if _incref(db, staged.sha256) and os.path.exists(blob_path(staged.sha256)):
+        staged.discard()
+        return True
+
+    path = blob_path(staged.sha256)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    os.replace(staged.path, path)
+    if db.get(models.Blob, staged.sha256) is None:
+        try:
+            with db.begin_nested():
+                db.add(models.Blob(sha256=staged.sha256, size=staged.size, ref_count=1))
+        except IntegrityError:
+            # a concurrent upload of the same bytes created the row first
+            _incref(db, staged.sha256)
+    return False
+
+
+def add_reference(db: Session, sha256: str):
+    """Point one more report at an existing blob."""
+    if not _incref(db, sha256):
+        raise ValueError(f"Unknown blob {sha256}")
+
+
+def release(db: Session, sha256: str):
+    """Drop one reference; deletes the row when unused. Call unlink_unreferenced() after commit."""
+    db.execute(
+        update(models.Blob)
+        .where(models.Blob.sha256 == sha256)
+        .values(ref_count=models.Blob.ref_count - 1)
+    )
+    blob = db.get(models.Blob, sha256, populate_existing=True)
+    if blob is not None and blob.ref_count <= 0:
+        db.delete(blob)
+
+
+def unlink_unreferenced(db: Session, sha256s):
+    """Remove blob files whose row is gone (run after the releasing transaction commits)."""
+    for sha256 in set(filter(None, sha256s)):
+        # re-check: an upload may have re-created the blob since we released it
+        if db.execute(select(models.Blob.sha256).where(models.Blob.sha256 == sha256)).first() is None:
+            try:
+                os.remove(blob_path(sha256))
+            except FileNotFoundError:
+                pass
+            _remove_previews(sha256)
+
+
+def release_reports(db: Session, reports):
+    """Drop the blob references held by reports about to be deleted (before commit)."""
+    for r in reports:
+        if r.blob_sha256:
+            release(db, r.blob_sha256)
+
+
+def remove_report_files(db: Session, reports):
+    """After the delete is committed: remove unreferenced blobs and legacy flat files."""
+    unlink_unreferenced(db, [r.blob_sha256 for r in reports])
+    for r in reports:
+        if not r.blob_sha256:
+            legacy_path = os.path.join(UPLOAD_FOLDER, r.file_name)
+            if os.path.exists(legacy_path):
+                os.remove(legacy_path)
+            else:
+                print(f"⚠️ File {r.file_name} not found on disk")
+
+
+def list_blobs_on_disk(folder: str = BLOB_FOLDER) -> set:
+    """SHA-256 names of every blob file (one scandir per two-character prefix dir)."""
+    found = set()
+    try:
+        with os.scandir(folder) as prefixes:
+            for prefix in prefixes:
+                if prefix.is_dir(follow_symlinks=False):
+                    with os.scandir(prefix.path) as entries:
+                        # previews and temp files have a suffix; blob names are bare hashes
+                        found.update(e.name for e in entries
+                                     if "." not in e.name and e.is_file(follow_symlinks=False))
+    except FileNotFoundError:
+        pass
+    return found
@@ -0,0 +1,178 @@
+# catalog.py
+"""Catalog version and the report-listing result cache.
+
+Report listings only change on upload, delete, visibility change or reconciler
+cleanup. Each of those write paths calls bump(db) inside its transaction, which
+increments the single `catalog_version` row. Listing responses are cached in
+process under (version, visibility class, endpoint, parameters) and carry an
+ETag built from the version, so a client with an up-to-date copy gets a 304.
+
+The version itself is held locally for CATALOG_VERSION_TTL_SECONDS: writes made
+by this process are seen immediately (the local copy is dropped on commit),
+writes from other workers within the TTL. Within the TTL a revalidation or a
+cache hit never touches the database.
+"""
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from sqlalchemy import event, insert, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from . import crud, models
+
+CATALOG_VERSION_TTL_SECONDS = float(os.getenv("CATALOG_VERSION_TTL_SECONDS", "1"))
+LISTING_CACHE_SIZE = int(os.getenv("LISTING_CACHE_SIZE", "1024"))  # entries
+LISTING_CACHE_MAX_BYTES = int(os.getenv("LISTING_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+
+_BUMPED_KEY = "catalog_version_bumped"
+
+
+# ============================================================
+# VERSION
+# ============================================================
+_version_lock = threading.Lock()
+_local_version = None  # (version, expires_at)
+
+
+def bump(db: Session):
+    """Increment the catalog version as part of the caller's transaction."""
+    result = db.execute(
+        update(models.CatalogVersion)
+        .where(models.CatalogVersion.id == 1)
+        .values(version=models.CatalogVersion.version + 1)
+    )
+    if result.rowcount == 0:
+        try:
+            with db.begin_nested():
+                db.execute(insert(models.CatalogVersion).values(id=1, version=1))
+        except IntegrityError:
+            # another writer created the row first
+            db.execute(
+                update(models.CatalogVersion)
+                .where(models.CatalogVersion.id == 1)
+                .values(version=models.CatalogVersion.version + 1)
+            )
+    db.info[_BUMPED_KEY] = True
+
+
+def forget_version():
+    global _local_version
+    with _version_lock:
+        _local_version = None
+
+
+def _cached_version():
+    with _version_lock:
+        if _local_version is not None and _local_version[1] > time.monotonic():
+            return _local_version[0]
+    return None
+
+
+def _remember(version: int) -> int:
+    global _local_version
+    with _version_lock:
+        _local_version = (version, time.monotonic() + CATALOG_VERSION_TTL_SECONDS)
+    return version
+
+
+async def aget_version(db) -> int:
+    """Current catalog version; only reads the database when the local copy expired."""
+    version = _cached_version()
+    if version is None:
+        version = _remember(await crud.aget_catalog_version(db))
+    return version
+
+
+def _after_commit(session):
+    if session.info.pop(_BUMPED_KEY, False):
+        forget_version()
+
+
+def _after_rollback(session, previous_transaction):
+    # a rolled back savepoint doesn't undo the outer transaction's bump
+    if previous_transaction.nested:
+        return
+    session.info.pop(_BUMPED_KEY, None)
+
+
+event.listen(Session, "after_commit", _after_commit)
+event.listen(Session, "after_soft_rollback", _after_rollback)
+
+
+def listing_etag(version: int, visibility_class: str, scope=()) -> str:
+    """ETag of a listing. Users with different visibility see different bodies under
+    the same URL; so do users with different site memberships when the body
+    depends on them (`scope`, e.g. the resolved site list), hashed into the tag."""
+    if not scope:
+        return f'"catalog-{version}-{visibility_class}"'
+    digest = hashlib.sha256("\n".join(scope).encode()).hexdigest()[:16]
+    return f'"catalog-{version}-{visibility_class}-{digest}"'
+
+
+# ============================================================
+# RESULT CACHE
+# ============================================================
+class ResultCache:
+    """LRU of serialized listing bodies, bounded by entry count and total bytes."""
+
+    def __init__(self, maxsize: int = LISTING_CACHE_SIZE, max_bytes: int = LISTING_CACHE_MAX_BYTES):
+        self.maxsize = maxsize
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        with self._lock:
+            body = self._entries.get(key)
+            if body is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return body
+
+    def put(self, key, body: bytes):
+        if self.maxsize <= 0 or len(body) > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= len(old)
+            self._entries[key] = body
+            self._bytes += len(body)
+            # entries keyed by an older version are never requested again and age out first
+            while len(self._entries) > self.maxsize or self._bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= len(evicted)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "maxsize": self.maxsize,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+                "version": _cached_version(),
+            }
+
+
+results = ResultCache()
@@ -1,15 +1,11 @@
-import os
-from .database import SessionLocal
-from .models import Report
-from .main import UPLOAD_FOLDER  # or define the path here
+"""Remove DB entries whose files are missing from disk.
 
-db = SessionLocal()
+Kept for existing scripts/cron jobs; the work is done by the incremental
+reconciler. Run from the `backend/` folder:
 
-reports = db.query(Report).all()
-for r in reports:
-    if not os.path.exists(os.path.join(UPLOAD_FOLDER, r.file_name)):
-        print(f"Deleting missing file DB entry: {r.file_name}")
-        db.delete(r)
+python -m app.cleanup_missing_reports [--dry-run] [--report-stray]
+"""
+from .reconciler import main
 
-db.commit()
-db.close()
+if __name__ == "__main__":
+    main()
@@ -1,12 +1,19 @@
 # crud.py
+import base64
+import heapq
+import json
+from datetime import datetime
+from sqlalchemy import and_, column, delete, exists, func, literal_column, or_, select, table, text, update
 from sqlalchemy.orm import Session
-from . import models
+from starlette.concurrency import run_in_threadpool
+from .database import AsyncSession
+from . import models, schemas
 
 # ✅ Get all reports for a given site (by site_name)
 def get_reports_by_site(db: Session, site_name: str):
     return (
         db.query(models.Report)
-        .filter(models.Report.site_name.ilike(site_name))
+        .filter(models.Report.site_name == models.normalize_key(site_name))
         .order_by(models.Report.date.desc())
         .all()
     )
@@ -16,8 +23,8 @@ def get_reports_by_category(db: Session, site_name: str, category: str):
     return (
         db.query(models.Report)
         .filter(
-            models.Report.site_name.ilike(site_name),
-            models.Report.category.ilike(category)
+            models.Report.site_name == models.normalize_key(site_name),
+            models.Report.category == models.normalize_key(category)
         )
         .order_by(models.Report.date.desc())
         .all()
@@ -28,8 +35,8 @@ def get_reports_by_date(db: Session, site_name: str, category: str, start, end):
     return (
         db.query(models.Report)
         .filter(
-            models.Report.site_name.ilike(site_name),
-            models.Report.category.ilike(category),
+            models.Report.site_name == models.normalize_key(site_name),
+            models.Report.category == models.normalize_key(category),
             models.Report.date >= start,
             models.Report.date <= end
         )
@@ -37,6 +44,355 @@ def get_reports_by_date(db: Session, site_name: str, category: str, start, end):
         .all()
     )
 
+# ✅ Reports uploaded under this site are shown on every site
+GLOBAL_SITE = "admin"
+
+def listing_sites(site_name: str):
+    """The sites a listing for `site_name` covers: itself and the global site."""
+    return list(dict.fromkeys([models.normalize_key(site_name), GLOBAL_SITE]))
+
+def visibility_filter(user):
+    """SQL predicate on Report.visibility for what `user` is allowed to see.
+
+    Admin/personal users see 'personal' reports; anyone else needs a 'personal'
+    membership, checked with an EXISTS on the user_sites primary key inside the
+    listing query itself.
+    """
+    if user.site_name in ("admin", "personal"):
+        return models.Report.visibility.in_(["shared", "personal"])
+    has_personal = exists().where(
+        models.UserSite.user_id == user.id,
+        models.UserSite.site_name == "personal",
+    )
+    return or_(
+        models.Report.visibility == "shared",
+        and_(models.Report.visibility == "personal", has_personal),
+    )
+
+def visibility_class(user) -> str:
+    """Which report set visibility_filter() lets `user` see, as a cache key:
+    'personal' (shared + personal reports) or 'shared'."""
+    if user.site_name in ("admin", "personal") or "personal" in user.allowed_sites:
+        return "personal"
+    return "shared"
+
+# ✅ Shared query builder for the listing endpoints: site (+ admin/global) reports,
+# optionally narrowed by category and date range, with visibility applied in SQL.
+# Statements are 2.0-style select() so the same builder runs on Session and AsyncSession.
+# Only the schemas.ReportOut columns are selected: rows become plain dicts, not ORM entities.
+REPORT_COLUMNS = tuple(getattr(models.Report, field) for field in schemas.REPORT_FIELDS)
+
+def visible_reports_stmt(user, site_name: str, category: str = None, start=None, end=None):
+    stmt = select(*REPORT_COLUMNS).where(
+        models.Report.site_name.in_(listing_sites(site_name)),
+        visibility_filter(user),
+    )
+    if category is not None:
+        stmt = stmt.where(models.Report.category == models.normalize_key(category))
+    if start is not None:
+        stmt = stmt.where(models.Report.date >= start)
+    if end is not None:
+        stmt = stmt.where(models.Report.date <= end)
+    # id breaks ties between reports with the same timestamp so keyset pages are stable
+    return stmt.order_by(models.Report.date.desc(), models.Report.id.desc())
+
+# ✅ Lookup by file name (the legacy /uploaded_reports links): names repeat across sites,
+# so only reports the listings would show `user` on their own sites are candidates.
+# Admins see every site; newest match first.
+def user_file_stmt(user, file_name: str):
+    stmt = select(models.Report).where(models.Report.file_name == file_name, visibility_filter(user))
+    if user.site_name != GLOBAL_SITE:
+        sites = [s for s in (user.site_name, *user.allowed_sites) if s]
+        stmt = stmt.where(models.Report.site_name.in_(
+            list(dict.fromkeys(k for s in sites for k in listing_sites(s)))))
+    return stmt.order_by(models.Report.id.desc())
+
+def report_dicts(result):
+    """Rows of a visible_reports_stmt as plain dicts, ready for schemas.dumps()."""
+    keys = tuple(result.keys())
+    return [dict(zip(keys, row)) for row in result]
+
+def visible_reports_query(db: Session, user, site_name: str, category: str = None, start=None, end=None):
+    """Sync convenience wrapper: the visible reports as a list of dicts."""
+    return report_dicts(db.execute(visible_reports_stmt(user, site_name, category, start, end)))
+
+# ✅ One report by id, only if `user` may see it (404 otherwise, like a missing row)
+def visible_report_stmt(user, report_id: int):
+    return select(models.Report).where(models.Report.id == report_id, visibility_filter(user))
+
+# ✅ Distinct calendar days for a site/category, answered from the listing index
+def report_dates_stmt(user, site_name: str, category: str):
+    day = func.date(models.Report.date)
+    return (
+        visible_reports_stmt(user, site_name, category)
+        .with_only_columns(day)
+        .distinct()
+        .order_by(None)
+        .order_by(day.desc())
+    )
+
+def _date_strings(result):
+    # SQLite returns 'YYYY-MM-DD' strings, PostgreSQL returns date objects
+    return [str(d) for d in result.scalars()]
+
+def visible_report_dates(db: Session, user, site_name: str, category: str):
+    return _date_strings(db.execute(report_dates_stmt(user, site_name, category)))
+
+# ✅ Report counts per (day, category) for a calendar: one GROUP BY over the listing index,
+# returned column-wise ({"dates": [...], "categories": [...], "counts": [...]}), newest day first
+def report_calendar_stmt(user, site_name: str, start=None, end=None):
+    day = func.date(models.Report.date)
+    return (
+        visible_reports_stmt(user, site_name, None, start, end)
+        .with_only_columns(day, models.Report.category, func.count())
+        .group_by(day, models.Report.category)
+        .order_by(None)
+        .order_by(day.desc(), models.Report.category)
+    )
+
+def _calendar_columns(result):
+    dates, categories, counts = [], [], []
+    for day, category, count in result:
+        dates.append(str(day))
+        categories.append(category)
+        counts.append(count)
+    return {"dates": dates, "categories": categories, "counts": counts}
+
+def report_calendar(db: Session, user, site_name: str, start=None, end=None):
+    return _calendar_columns(db.execute(report_calendar_stmt(user, site_name, start, end)))
+
+# ✅ Landing page summary: the newest report and the report count of every (site, category),
+# from one window-function statement. Admin/global reports are counted once in SQL and merged
+# into each site below, like the listings show them on every site.
+def report_summary_stmt(user, site_names):
+    partition = (models.Report.site_name, models.Report.category)
+    ranked = (
+        select(
+            *REPORT_COLUMNS,
+            func.row_number().over(
+                partition_by=partition, order_by=(models.Report.date.desc(), models.Report.id.desc())
+            ).label("rank"),
+            func.count().over(partition_by=partition).label("count"),
+        )
+        .where(
+            models.Report.site_name.in_(list(site_names) + [GLOBAL_SITE]),
+            visibility_filter(user),
+        )
+        .subquery()
+    )
+    return select(ranked).where(ranked.c.rank == 1)
+
+def _newest(a, b):
+    return a if (a["date"], a["id"]) >= (b["date"], b["id"]) else b
+
+def summarize_reports(rows, site_names):
+    """{"sites": [{site_name, total, latest_date, categories: [{category, count, latest}]}]}
+    for `site_names` (normalized keys), in that order."""
+    groups = {}
+    for row in rows:
+        row.pop("rank")
+        count = row.pop("count")
+        groups.setdefault(row["site_name"], {})[row["category"]] = (row, count)
+    sites = []
+    for site in site_names:
+        categories = dict(groups.get(site, {}))
+        if site != GLOBAL_SITE:
+            for category, (latest, count) in groups.get(GLOBAL_SITE, {}).items():
+                if category in categories:
+                    own, own_count = categories[category]
+                    latest, count = _newest(own, latest), own_count + count
+                categories[category] = (latest, count)
+        cells = [{"category": c, "count": n, "latest": latest} for c, (latest, n) in sorted(categories.items())]
+        sites.append({
+            "site_name": site,
+            "total": sum(cell["count"] for cell in cells),
+            "latest_date": max((cell["latest"]["date"] for cell in cells), default=None),
+            "categories": cells,
+        })
+    return {"sites": sites}
+
+# ✅ Rows that hang off reports, removed in the same transaction as the reports:
+# SQLite doesn't enforce ON DELETE CASCADE and reuses the highest rowid, so a
+# leftover report_text row would be inherited by the next upload (and skipped by the indexer),
+# and a job still pointing at the old id would serve that upload as its result
+def delete_report_dependents(db: Session, report_ids):
+    report_ids = list(report_ids)
+    if report_ids:
+        db.execute(delete(models.ReportText).where(models.ReportText.report_id.in_(report_ids)))
+        db.execute(update(models.Job).where(models.Job.report_id.in_(report_ids)).values(report_id=None))
+
+# ✅ Catalog version (see catalog.py): a single-row counter
+def catalog_version_stmt():
+    return select(models.CatalogVersion.version).where(models.CatalogVersion.id == 1)
+
+def get_catalog_version(db: Session) -> int:
+    return db.execute(catalog_version_stmt()).scalar() or 0
+
+# ✅ Keyset pagination on (date, id): the cursor is an opaque token holding the last row's key
+def encode_cursor(row) -> str:
+    raw = json.dumps({"d": row["date"].isoformat(), "i": row["id"]}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+def decode_cursor(cursor: str):
+    """Return (date, id) from a cursor; raises ValueError if it is malformed."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        data = json.loads(raw)
+        return datetime.fromisoformat(data["d"]), int(data["i"])
+    except (ValueError, KeyError, TypeError) as e:
+        raise ValueError("Invalid cursor") from e
+
+def page_stmt(stmt, limit: int, cursor: str = None):
+    """Narrow a visible_reports_stmt to one page (plus one look-ahead row)."""
+    if cursor:
+        last_date, last_id = decode_cursor(cursor)
+        stmt = stmt.where(or_(
+            models.Report.date < last_date,
+            and_(models.Report.date == last_date, models.Report.id < last_id),
+        ))
+    # fetch one extra row to know whether another page exists
+    return stmt.limit(limit + 1)
+
+def site_page_stmts(stmt, limit: int, cursor: str = None, sites=()):
+    """One page statement per listing site, merged by _merge_pages.
+
+    Each reads its rows already ordered off the (site_name, [category,] date DESC,
+    id DESC) index and stops after limit + 1; with an IN over the sites the
+    database would have to sort every matching row before the LIMIT.
+    """
+    if len(sites) < 2:
+        return [page_stmt(stmt, limit, cursor)]
+    return [page_stmt(stmt.where(models.Report.site_name == site), limit, cursor) for site in sites]
+
+def _merge_pages(pages, limit: int):
+    rows = heapq.merge(*pages, key=lambda r: (r["date"], r["id"]), reverse=True)
+    return _split_page(list(rows)[:limit + 1], limit)
+
+def _split_page(rows, limit: int):
+    items = rows[:limit]
+    next_cursor = encode_cursor(items[-1]) if len(rows) > limit else None
+    return items, next_cursor
+
+def paginate_reports(db: Session, stmt, limit: int, cursor: str = None, sites=()):
+    """Return (items, next_cursor) for a statement built by visible_reports_stmt over `sites`."""
+    pages = [report_dicts(db.execute(page)) for page in site_page_stmts(stmt, limit, cursor, sites)]
+    return _merge_pages(pages, limit)
+
+# ✅ Full-text search (see search.py): the listing statement joined to the dialect's index,
+# best match first. Offset pagination, since rank is not a stable keyset.
+SEARCH_SNIPPET_WORDS = 16
+_report_text_fts = table("report_text_fts", column("rowid"))
+
+def fts5_query(q: str) -> str:
+    """User input as an FTS5 query: every word must appear (the last one as a prefix);
+    quoting keeps operators and punctuation in `q` from being parsed as syntax."""
+    terms = ['"' + t.replace('"', '""') + '"' for t in q.split()]
+    if terms:
+        terms[-1] += "*"
+    return " ".join(terms)
+
+def dialect_name(db) -> str:
+    # AsyncSession.get_bind() also returns the sync engine
+    return db.get_bind().dialect.name
+
+def search_stmt(user, q: str, site_name: str, category: str = None, dialect: str = "sqlite"):
+    stmt = visible_reports_stmt(user, site_name, category).order_by(None)
+    if dialect == "postgresql":
+        query = func.plainto_tsquery("simple", q)
+        tsv = literal_column("report_text.tsv")
+        snippet = func.ts_headline("simple", models.ReportText.body, query,
+                                   f"MaxWords={SEARCH_SNIPPET_WORDS},MinWords=5,StartSel=[,StopSel=]")
+        return (
+            stmt.add_columns(snippet.label("snippet"))
+            .join(models.ReportText, models.ReportText.report_id == models.Report.id)
+            .where(tsv.op("@@")(query))
+            .order_by(func.ts_rank(tsv, query).desc(), models.Report.id.desc())
+        )
+    snippet = literal_column(f"snippet(report_text_fts, 0, '[', ']', '…', {SEARCH_SNIPPET_WORDS})")
+    return (
+        stmt.add_columns(snippet.label("snippet"))
+        .join(_report_text_fts, _report_text_fts.c.rowid == models.Report.id)
+        .where(text("report_text_fts MATCH :fts_query").bindparams(fts_query=fts5_query(q)))
+        # bm25() is lower for better matches
+        .order_by(literal_column("bm25(report_text_fts)"), models.Report.id.desc())
+    )
+
+def _split_offset_page(rows, limit: int, offset: int):
+    items = rows[:limit]
+    return items, (offset + limit if len(rows) > limit else None)
+
 # ✅ Keep this if you have users
 def get_user_by_email(db: Session, email: str):
     return db.query(models.User).filter(models.User.email == email).first()
+
+# ============================================================
+# ASYNC VERSIONS (DB_ASYNC=true)
+# ============================================================
+# These accept an AsyncSession, or a regular Session whose blocking execute is
+# pushed to the threadpool, so async endpoints work in both database modes.
+async def _execute(db, stmt, consume):
+    if AsyncSession is not None and isinstance(db, AsyncSession):
+        return consume(await db.execute(stmt))
+    return await run_in_threadpool(lambda: consume(db.execute(stmt)))
+
+async def alist_reports(db, stmt):
+    return await _execute(db, stmt, report_dicts)
+
+async def apaginate_reports(db, stmt, limit: int, cursor: str = None, sites=()):
+    pages = [await _execute(db, page, report_dicts) for page in site_page_stmts(stmt, limit, cursor, sites)]
+    return _merge_pages(pages, limit)
+
+async def asearch_reports(db, stmt, limit: int, offset: int = 0):
+    """Return (items, next_offset) for a search_stmt."""
+    rows = await _execute(db, stmt.limit(limit + 1).offset(offset), report_dicts)
+    return _split_offset_page(rows, limit, offset)
+
+async def aget_visible_report(db, user, report_id: int):
+    return await _execute(db, visible_report_stmt(user, report_id), lambda r: r.scalars().first())
+
+async def avisible_report_dates(db, user, site_name: str, category: str):
+    return await _execute(db, report_dates_stmt(user, site_name, category), _date_strings)
+
+async def areport_calendar(db, user, site_name: str, start=None, end=None):
+    return await _execute(db, report_calendar_stmt(user, site_name, start, end), _calendar_columns)
+
+async def areport_summary(db, user, site_names):
+    rows = await _execute(db, report_summary_stmt(user, site_names), report_dicts)
+    return summarize_reports(rows, site_names)
+
+def _catalog_version_released(db: Session) -> int:
+    version = get_catalog_version(db)
+    db.rollback()
+    return version
+
+async def aget_catalog_version(db) -> int:
+    """Read the catalog version and end the read transaction (same rule as aget_user_detached)."""
+    if AsyncSession is not None and isinstance(db, AsyncSession):
+        version = (await db.execute(catalog_version_stmt())).scalar() or 0
+        await db.rollback()
+        return version
+    return await run_in_threadpool(_catalog_version_released, db)
+
+async def aget_user_by_email(db, email: str):
+    stmt = select(models.User).where(models.User.email == email).limit(1)
+    return await _execute(db, stmt, lambda r: r.scalars().first())
+
+def _get_user_detached(db: Session, email: str):
+    user = get_user_by_email(db, email)
+    if user is not None:
+        db.expunge(user)
+    db.rollback()
+    return user
+
+async def aget_user_detached(db, email: str):
+    """aget_user_by_email that also ends the read transaction, so the request holds no
+    pooled connection while it awaits something slow (bcrypt, another threadpool hop).
+    The returned user is detached but its columns stay readable."""
+    if AsyncSession is not None and isinstance(db, AsyncSession):
+        user = await aget_user_by_email(db, email)
+        if user is not None:
+            db.expunge(user)
+        await db.rollback()
+        return user
+    # one threadpool hop: never wait for a thread while holding a connection
+    return await run_in_threadpool(_get_user_detached, db, email)
@@ -1,8 +1,13 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event, exc
 from sqlalchemy.orm import sessionmaker, declarative_base
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
 import os
+import threading
+import time
 from dotenv import load_dotenv
 
+from . import metrics
+
 # load .env if present
 load_dotenv()
 
@@ -15,11 +20,136 @@ SQLALCHEMY_DATABASE_URL = os.getenv(
     "sqlite:///" + os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "report_db.sqlite"))
 )
 
+# --- Engine profile ---
+# SQL echo formats and prints every statement, so it is opt-in.
+SQL_ECHO = os.getenv("SQL_ECHO", "false").lower() == "true"
+# Connection pool (PostgreSQL and file-backed SQLite)
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "20"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))  # seconds; -1 disables
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() == "true"
+# SQLite connection pragmas
+SQLITE_WAL = os.getenv("SQLITE_WAL", "true").lower() == "true"
+SQLITE_SYNCHRONOUS = os.getenv("SQLITE_SYNCHRONOUS", "NORMAL")
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+SQLITE_MMAP_SIZE = int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024)))
+
+# Pool counters for the whole process, exposed on GET /admin/db-pool
+_pool_stats_lock = threading.Lock()
+pool_stats = {
+    "connects": 0,
+    "checkouts": 0,
+    "checkins": 0,
+    "invalidated": 0,
+    "timeouts": 0,
+    "wait_seconds_total": 0.0,
+    "wait_seconds_max": 0.0,
+}
+
+
+def _record_wait(seconds: float, timed_out: bool):
+    with _pool_stats_lock:
+        pool_stats["wait_seconds_total"] += seconds
+        pool_stats["wait_seconds_max"] = max(pool_stats["wait_seconds_max"], seconds)
+        if timed_out:
+            pool_stats["timeouts"] += 1
+
+
+class _TimedGet:
+    """Measures how long a checkout waits for a pooled connection (including opening a new one)."""
+
+    def _do_get(self):
+        t0 = time.perf_counter()
+        timed_out = False
+        try:
+            return super()._do_get()
+        except exc.TimeoutError:
+            timed_out = True
+            raise
+        finally:
+            _record_wait(time.perf_counter() - t0, timed_out)
+
+
+class TimedQueuePool(_TimedGet, QueuePool):
+    pass
+
+
+class TimedAsyncAdaptedQueuePool(_TimedGet, AsyncAdaptedQueuePool):
+    pass
+
+
+def is_sqlite(url: str) -> bool:
+    return url.startswith("sqlite")
+
+
+def is_sqlite_memory(url: str) -> bool:
+    return is_sqlite(url) and (":memory:" in url or url.partition("://")[2] in ("", "/"))
+
+
+def engine_options(url: str, pool_class=TimedQueuePool) -> dict:
+    """create_engine keyword arguments for the configured profile."""
+    options = {"echo": SQL_ECHO}
+    if is_sqlite_memory(url):
+        # in-memory SQLite keeps SQLAlchemy's single-connection pool
+        return options
+    options.update(poolclass=pool_class, pool_size=DB_POOL_SIZE, max_overflow=DB_MAX_OVERFLOW,
+                   pool_timeout=DB_POOL_TIMEOUT, pool_recycle=DB_POOL_RECYCLE, pool_pre_ping=DB_POOL_PRE_PING)
+    return options
+
+
+def _set_sqlite_pragmas(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    try:
+        if SQLITE_WAL:
+            # readers no longer wait behind the writer during uploads
+            cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute(f"PRAGMA synchronous={SQLITE_SYNCHRONOUS}")
+        cursor.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}")
+        cursor.execute(f"PRAGMA mmap_size={SQLITE_MMAP_SIZE}")
+    finally:
+        cursor.close()
+
+
+def _count(key):
+    def listener(*args):
+        with _pool_stats_lock:
+            pool_stats[key] += 1
+    return listener
+
+
+def configure_engine(sync_engine):
+    """Attach the SQLite pragmas, pool counters and query metrics to an engine (sync or async .sync_engine)."""
+    if is_sqlite(str(sync_engine.url)):
+        event.listen(sync_engine, "connect", _set_sqlite_pragmas)
+    event.listen(sync_engine, "connect", _count("connects"))
+    event.listen(sync_engine, "checkout", _count("checkouts"))
+    event.listen(sync_engine, "checkin", _count("checkins"))
+    event.listen(sync_engine, "invalidate", _count("invalidated"))
+    # query counts and DB time per request, for GET /metrics
+    event.listen(sync_engine, "before_cursor_execute", metrics.before_cursor_execute)
+    event.listen(sync_engine, "after_cursor_execute", metrics.after_cursor_execute)
+    return sync_engine
+
+
+def get_pool_stats(*engines) -> dict:
+    """Process counters plus the live state of each engine's pool."""
+    with _pool_stats_lock:
+        result = dict(pool_stats)
+    result["pools"] = []
+    for e in filter(None, engines):
+        pool = e.pool
+        live = {"url": e.url.render_as_string(hide_password=True), "class": type(pool).__name__,
+                "status": pool.status()}
+        if isinstance(pool, QueuePool):
+            live.update(size=pool.size(), checked_out=pool.checkedout(), overflow=pool.overflow(),
+                        checked_in=pool.checkedin())
+        result["pools"].append(live)
+    return result
+
+
 # Create the engine
-engine = create_engine(
-    SQLALCHEMY_DATABASE_URL,
-    echo=os.getenv("SQL_ECHO", "true").lower() == "true"  # set to False in production
-)
+engine = configure_engine(create_engine(SQLALCHEMY_DATABASE_URL, **engine_options(SQLALCHEMY_DATABASE_URL)))
 
 # SessionLocal class used to create DB sessions
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
@@ -31,8 +161,51 @@ def get_db():
     finally:
         db.close()
 
+# --- Optional async mode (DB_ASYNC=true) ---
+# Uses asyncpg for PostgreSQL and aiosqlite for SQLite; both (and greenlet) are
+# only needed when the mode is switched on.
+DB_ASYNC = os.getenv("DB_ASYNC", "false").lower() == "true"
+
+try:
+    from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+except ImportError:  # greenlet missing: async mode unavailable
+    AsyncSession = async_sessionmaker = create_async_engine = None
+
+def async_database_url(url: str) -> str:
+    """Map a sync DATABASE_URL onto its async driver."""
+    scheme, sep, rest = url.partition("://")
+    driver = {"postgresql": "postgresql+asyncpg", "postgresql+psycopg2": "postgresql+asyncpg",
+              "postgres": "postgresql+asyncpg", "sqlite": "sqlite+aiosqlite"}.get(scheme, scheme)
+    return driver + sep + rest
+
+async_engine = None
+AsyncSessionLocal = None
+if DB_ASYNC:
+    if create_async_engine is None:
+        raise RuntimeError("DB_ASYNC=true requires the 'greenlet' package (pip install 'sqlalchemy[asyncio]')")
+    _async_url = async_database_url(SQLALCHEMY_DATABASE_URL)
+    async_engine = create_async_engine(_async_url, **engine_options(_async_url, TimedAsyncAdaptedQueuePool))
+    configure_engine(async_engine.sync_engine)
+    AsyncSessionLocal = async_sessionmaker(async_engine, expire_on_commit=False)
+
+async def get_async_db():
+    """Session for async endpoints: an AsyncSession in DB_ASYNC mode, otherwise a
+    regular Session (the crud `a*` helpers then run its queries in the threadpool)."""
+    if AsyncSessionLocal is not None:
+        async with AsyncSessionLocal() as db:
+            yield db
+    else:
+        db = SessionLocal()
+        try:
+            yield db
+        finally:
+            db.close()
+
 # Base class for models
 Base = declarative_base()
 
-# Uplaod folder location
-UPLOAD_FOLDER = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'uploaded_reports')
\ No newline at end of file
+# Uplaod folder location (override with UPLOAD_FOLDER env var)
+UPLOAD_FOLDER = os.path.abspath(os.getenv(
+    "UPLOAD_FOLDER",
+    os.path.join(os.path.dirname(os.path.dirname(__file__)), 'uploaded_reports')
+))
@@ -0,0 +1,96 @@
+# extract.py
+"""Plain-text extraction from report files, for the search index (see search.py).
+
+PDFs need the optional PyMuPDF (or pypdf) package; CSV, XLSX and text-like
+files only need what the app already uses. Like previews.py this module only
+depends on the standard library at import time, so pool workers start without
+importing the database layer.
+"""
+import html
+import os
+import re
+
+SEARCH_MAX_CHARS = int(os.getenv("SEARCH_MAX_CHARS", "200000"))  # per report
+
+TEXT_TYPES = {"txt", "csv", "tsv", "md", "json", "log", "xml", "html", "htm"}
+_TAG = re.compile(r"<[^>]+>")
+_SPACE = re.compile(r"\s+")
+
+
+def _pdf_text(src: str, limit: int) -> str:
+    try:
+        import fitz  # PyMuPDF
+    except ImportError:
+        from pypdf import PdfReader
+
+        parts, size = [], 0
+        for page in PdfReader(src).pages:
+            text = page.extract_text() or ""
+            parts.append(text)
+            size += len(text)
+            if size >= limit:
+                break
+        return "\n".join(parts)
+    parts, size = [], 0
+    with fitz.open(src) as doc:
+        for page in doc:
+            text = page.get_text()
+            parts.append(text)
+            size += len(text)
+            if size >= limit:
+                break
+    return "\n".join(parts)
+
+
+def _xlsx_text(src: str, limit: int) -> str:
+    from openpyxl import load_workbook
+
+    parts, size = [], 0
+    # a file object: openpyxl rejects paths without an .xlsx extension, like blob paths
+    with open(src, "rb") as f:
+        workbook = load_workbook(f, read_only=True, data_only=True)
+        try:
+            for sheet in workbook.worksheets:
+                parts.append(sheet.title)
+                for row in sheet.iter_rows(values_only=True):
+                    line = " ".join(str(v) for v in row if v is not None)
+                    parts.append(line)
+                    size += len(line)
+                    if size >= limit:
+                        return "\n".join(parts)
+        finally:
+            workbook.close()
+    return "\n".join(parts)
+
+
+def _plain_text(src: str, limit: int, file_type: str) -> str:
+    with open(src, encoding="utf-8-sig", errors="replace") as f:
+        text = f.read(limit)
+    if file_type in ("html", "htm", "xml"):
+        text = html.unescape(_TAG.sub(" ", text))
+    return text
+
+
+def extract_text(file_type: str, src: str, limit: int = SEARCH_MAX_CHARS):
+    """Return (status, text) for one file.
+
+    status is 'indexed', 'empty' (nothing to index), 'unsupported' (file type,
+    or its optional package is not installed) or 'failed' (unreadable file).
+    """
+    file_type = (file_type or "").lower()
+    try:
+        if file_type == "pdf":
+            text = _pdf_text(src, limit)
+        elif file_type in ("xlsx", "xlsm"):
+            text = _xlsx_text(src, limit)
+        elif file_type in TEXT_TYPES:
+            text = _plain_text(src, limit, file_type)
+        else:
+            return "unsupported", ""
+    except ImportError:
+        return "unsupported", ""
+    except Exception as e:
+        print(f"⚠️ Text extraction failed for {os.path.basename(src)}: {e}")
+        return "failed", ""
+    text = _SPACE.sub(" ", text).strip()[:limit]
+    return ("indexed", text) if text else ("empty", "")
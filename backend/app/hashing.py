@@ -0,0 +1,115 @@
+# hashing.py
+"""bcrypt hashing off the request threadpool.
+
+Password hashing and verification run in a dedicated, separately sized executor
+(a process pool by default, so hashes run in parallel outside the GIL). At most
+PASSWORD_HASH_MAX_PENDING calls may be queued or running; beyond that the call
+is refused with HashingBusy and the endpoint answers 503, so a burst of logins
+sheds load instead of starving the report endpoints. The pool comes from
+pools.py; besides it this module only imports passlib.
+"""
+import asyncio
+import os
+import threading
+
+from passlib.context import CryptContext
+
+from . import pools
+
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+
+PASSWORD_HASH_EXECUTOR = os.getenv("PASSWORD_HASH_EXECUTOR", "process")  # process | thread
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", str(min(4, os.cpu_count() or 1))))
+PASSWORD_HASH_MAX_PENDING = int(os.getenv("PASSWORD_HASH_MAX_PENDING", str(PASSWORD_HASH_WORKERS * 16)))
+PASSWORD_HASH_TIMEOUT_SECONDS = float(os.getenv("PASSWORD_HASH_TIMEOUT_SECONDS", "10"))
+
+
+class HashingBusy(Exception):
+    """The hashing queue is full (or the call waited too long); retry later."""
+
+
+def hash_password(password: str) -> str:
+    return pwd_context.hash(password)
+
+
+def check_password(plain_password: str, hashed_password: str) -> bool:
+    return pwd_context.verify(plain_password, hashed_password)
+
+
+class PasswordHasher:
+    """Bounded front end to the hashing executor."""
+
+    def __init__(self, kind: str = PASSWORD_HASH_EXECUTOR, workers: int = PASSWORD_HASH_WORKERS,
+                 max_pending: int = PASSWORD_HASH_MAX_PENDING, timeout: float = PASSWORD_HASH_TIMEOUT_SECONDS):
+        self.kind = kind
+        self.workers = workers
+        self.max_pending = max_pending
+        self.timeout = timeout
+        self._pool = pools.LazyExecutor(kind, workers, "password-hash")
+        self._lock = threading.Lock()
+        self.pending = 0
+        self.completed = 0
+        self.rejected = 0
+        self.timed_out = 0
+
+    def start(self):
+        """Create the pool and warm every worker up (spawned processes take a moment to boot)."""
+        executor = self._pool.get()
+        if self.kind != "process":
+            return
+        futures = [executor.submit(check_password, "warm-up", _WARM_UP_HASH) for _ in range(self.workers)]
+        for f in futures:
+            f.result()
+
+    def shutdown(self):
+        self._pool.shutdown()
+
+    def _release(self, _future):
+        with self._lock:
+            self.pending -= 1
+            self.completed += 1
+
+    async def run(self, fn, *args):
+        with self._lock:
+            if self.pending >= self.max_pending:
+                self.rejected += 1
+                raise HashingBusy("Too many password operations in progress")
+            self.pending += 1
+        try:
+            future = self._pool.get().submit(fn, *args)
+        except BaseException:
+            with self._lock:
+                self.pending -= 1
+            raise
+        # the slot is held until the worker is really done, even if the caller gave up
+        future.add_done_callback(self._release)
+        try:
+            return await asyncio.wait_for(asyncio.wrap_future(future), self.timeout)
+        except asyncio.TimeoutError:
+            with self._lock:
+                self.timed_out += 1
+            raise HashingBusy("Password operation timed out")
+
+    async def hash(self, password: str) -> str:
+        return await self.run(hash_password, password)
+
+    async def verify(self, plain_password: str, hashed_password: str) -> bool:
+        return await self.run(check_password, plain_password, hashed_password)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "executor": self.kind,
+                "workers": self.workers,
+                "max_pending": self.max_pending,
+                "pending": self.pending,
+                "completed": self.completed,
+                "rejected": self.rejected,
+                "timed_out": self.timed_out,
+            }
+
+
+# cheap hash (4 rounds) used only to load bcrypt in each worker
+_WARM_UP_HASH = pwd_context.hash("warm-up", rounds=4)
+
+hasher = PasswordHasher()
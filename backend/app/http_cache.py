@@ -0,0 +1,44 @@
+# http_cache.py
+"""Conditional GET helpers (ETag / Last-Modified -> 304 Not Modified)."""
+from email.utils import formatdate, parsedate_to_datetime
+
+from starlette.requests import Request
+from starlette.responses import Response
+
+# Report files never change once written (new content means a new blob), so
+# browsers may keep them for a year without revalidating. "private": they are
+# behind authentication and must not land in shared caches.
+IMMUTABLE_CACHE_CONTROL = "private, max-age=31536000, immutable"
+
+
+def http_date(timestamp: float) -> str:
+    return formatdate(timestamp, usegmt=True)
+
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    """If-None-Match uses the weak comparison: W/ prefixes are ignored."""
+    if if_none_match.strip() == "*":
+        return True
+    bare = etag.removeprefix("W/")
+    return any(tag.strip().removeprefix("W/") == bare for tag in if_none_match.split(","))
+
+
+def is_not_modified(request: Request, etag: str = None, last_modified: float = None) -> bool:
+    """True when the client's cached copy is current (RFC 9110 §13.2.2 precedence)."""
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        # If-Modified-Since is ignored when If-None-Match is present
+        return etag is not None and etag_matches(if_none_match, etag)
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since and last_modified is not None:
+        try:
+            since = parsedate_to_datetime(if_modified_since).timestamp()
+        except (TypeError, ValueError):
+            return False
+        return int(last_modified) <= since
+    return False
+
+
+def not_modified_response(headers: dict) -> Response:
+    """304 carrying the validators/caching headers (but no body or content headers)."""
+    return Response(status_code=304, headers=headers)
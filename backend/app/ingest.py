@@ -0,0 +1,236 @@
+# ingest.py
+"""Streaming ingest and naming rules for uploaded report files.
+
+Uploads are copied chunk by chunk into a temp file under UPLOAD_FOLDER/.incoming
+(same filesystem, so the final rename is atomic), hashed and size-checked on the
+way. File I/O runs in the threadpool so the event loop never blocks on disk.
+"""
+import hashlib
+import os
+import tempfile
+import time
+from dataclasses import dataclass
+
+from fastapi import UploadFile
+from starlette.concurrency import run_in_threadpool
+
+from . import metrics
+from .database import UPLOAD_FOLDER
+
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_BYTES", str(200 * 1024 * 1024)))
+# Whole request body of POST /upload-reports/bulk (all files, or the ZIP)
+BULK_UPLOAD_MAX_BYTES = int(os.getenv("BULK_UPLOAD_MAX_BYTES", str(1024 * 1024 * 1024)))
+INCOMING_FOLDER = os.path.join(UPLOAD_FOLDER, ".incoming")
+
+
+class UploadTooLarge(Exception):
+    pass
+
+
+@dataclass
+class StagedFile:
+    """A fully received upload waiting in the incoming folder."""
+    path: str
+    sha256: str
+    size: int
+
+    def discard(self):
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+
+def _write_chunk(buffer, digest, chunk: bytes):
+    digest.update(chunk)
+    buffer.write(chunk)
+    metrics.upload_bytes_total.inc(len(chunk))
+
+
+def _finish(buffer):
+    buffer.flush()
+    os.fsync(buffer.fileno())
+    buffer.close()
+
+
+async def stage_upload(file: UploadFile, max_bytes: int = MAX_UPLOAD_BYTES, folder: str = INCOMING_FOLDER) -> StagedFile:
+    """Stream `file` into a temp file, returning its path, SHA-256 and size.
+
+    Raises UploadTooLarge once more than `max_bytes` have been received; the
+    partial temp file is always removed on failure.
+    """
+    os.makedirs(folder, exist_ok=True)
+    fd, path = tempfile.mkstemp(dir=folder, suffix=".part")
+    buffer = os.fdopen(fd, "wb")
+    digest = hashlib.sha256()
+    size = 0
+    try:
+        while True:
+            chunk = await file.read(UPLOAD_CHUNK_SIZE)
+            if not chunk:
+                break
+            size += len(chunk)
+            if size > max_bytes:
+                raise UploadTooLarge(f"File exceeds the {max_bytes} byte upload limit")
+            await run_in_threadpool(_write_chunk, buffer, digest, chunk)
+        await run_in_threadpool(_finish, buffer)
+    except BaseException:
+        buffer.close()
+        os.remove(path)
+        raise
+    return StagedFile(path=path, sha256=digest.hexdigest(), size=size)
+
+
+def stage_fileobj(fileobj, max_bytes: int = MAX_UPLOAD_BYTES, folder: str = INCOMING_FOLDER) -> StagedFile:
+    """Blocking variant of stage_upload for file-like sources (e.g. ZIP members); run it in the threadpool."""
+    os.makedirs(folder, exist_ok=True)
+    fd, path = tempfile.mkstemp(dir=folder, suffix=".part")
+    buffer = os.fdopen(fd, "wb")
+    digest = hashlib.sha256()
+    size = 0
+    try:
+        for chunk in iter(lambda: fileobj.read(UPLOAD_CHUNK_SIZE), b""):
+            size += len(chunk)
+            if size > max_bytes:
+                raise UploadTooLarge(f"File exceeds the {max_bytes} byte upload limit")
+            _write_chunk(buffer, digest, chunk)
+        _finish(buffer)
+    except BaseException:
+        buffer.close()
+        os.remove(path)
+        raise
+    return StagedFile(path=path, sha256=digest.hexdigest(), size=size)
+
+
+def stage_path(path: str) -> StagedFile:
+    """Hash a file already written to the incoming folder (e.g. a generated report) so it
+    can be stored like an upload."""
+    digest = hashlib.sha256()
+    size = 0
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(UPLOAD_CHUNK_SIZE), b""):
+            digest.update(chunk)
+            size += len(chunk)
+    return StagedFile(path=path, sha256=digest.hexdigest(), size=size)
+
+
+# ============================================================
+# NAMING RULES (shared by /upload-report and /upload-reports/bulk)
+# ============================================================
+class ReportExists(Exception):
+    pass
+
+
+def plan_report_file(existing_reports, category, report_date, file_ext, override=False, save_as_new=False):
+    """Pick the filename for a new report given the reports already on that site/category/date.
+
+    Returns (filename, reports to replace). Raises ReportExists when a report is
+    already there and neither override nor save_as_new is set.
+    """
+    report_date_str = report_date.strftime("%d%m%Y")
+
+    if not existing_reports:
+        # No existing report → normal filename
+        return f"{category}_{report_date_str}.{file_ext}", []
+    if override:
+        return f"{category}_{report_date_str}.{file_ext}", list(existing_reports)
+    if save_as_new:
+        # Create a new filename with iteration _X
+        i = 2
+        while True:
+            filename_candidate = f"{category}_{report_date_str}_{i}.{file_ext}"
+            if not any(r.file_name == filename_candidate for r in existing_reports):
+                return filename_candidate, []
+            i += 1
+    raise ReportExists(
+        f"A report for {category} on {report_date.strftime('%Y-%m-%d')} already exists. Set override or save_as_new."
+    )
+
+
+def place(staged: StagedFile, file_path: str):
+    """Atomically move a staged upload to its final location."""
+    os.replace(staged.path, file_path)
+
+
+def sweep_incoming(folder: str = INCOMING_FOLDER, older_than_seconds: float = 3600):
+    """Remove temp files left behind by a crashed worker."""
+    cutoff = time.time() - older_than_seconds
+    try:
+        with os.scandir(folder) as entries:
+            for e in entries:
+                # "<name>.part.<ext>": generated reports keep their extension (see jobs.py)
+                is_temp = e.name.endswith(".part") or ".part." in e.name
+                if is_temp and e.stat().st_mtime < cutoff:
+                    os.remove(e.path)
+    except FileNotFoundError:
+        pass
+
+
+# Request body limit per upload path, read on every request
+UPLOAD_SIZE_LIMITS = {
+    "/upload-report": MAX_UPLOAD_BYTES,
+    "/upload-reports/bulk": BULK_UPLOAD_MAX_BYTES,
+}
+
+
+class UploadSizeLimitMiddleware:
+    """Reject oversized upload requests before the body is spooled.
+
+    A Content-Length over the limit is refused up front. Bodies without one
+    (chunked transfer) are counted as they arrive: once past the limit the app
+    stops receiving (so the multipart parser stops writing to disk) and the
+    client gets the same 413, whatever the app then tries to answer.
+    """
+
+    def __init__(self, app, limits: dict = UPLOAD_SIZE_LIMITS):
+        self.app = app
+        self.limits = limits
+
+    async def __call__(self, scope, receive, send):
+        max_bytes = self.limits.get(scope["path"]) if scope["type"] == "http" else None
+        if max_bytes is None:
+            await self.app(scope, receive, send)
+            return
+        # allow some slack for the multipart framing and form fields
+        max_bytes += 64 * 1024
+        for name, value in scope["headers"]:
+            if name == b"content-length" and value.isdigit() and int(value) > max_bytes:
+                await _send_too_large(send)
+                return
+
+        received = 0
+        too_large = started = False
+
+        async def counting_receive():
+            nonlocal received, too_large
+            if too_large:
+                raise UploadTooLarge("Upload too large")
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > max_bytes:
+                    too_large = True
+                    raise UploadTooLarge("Upload too large")
+            return message
+
+        async def send_wrapper(message):
+            nonlocal started
+            # the app's answer to the aborted body (an error) is replaced by the 413
+            if not too_large:
+                started = True
+                await send(message)
+
+        try:
+            await self.app(scope, counting_receive, send_wrapper)
+        except Exception:
+            if not too_large:
+                raise
+        if too_large and not started:
+            await _send_too_large(send)
+
+
+async def _send_too_large(send):
+    await send({"type": "http.response.start", "status": 413,
+                "headers": [(b"content-type", b"application/json")]})
+    await send({"type": "http.response.body", "body": b'{"detail":"Upload too large"}'})
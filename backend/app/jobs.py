@@ -0,0 +1,324 @@
+# jobs.py
+"""Background report generation with a database-backed job queue.
+
+POST /jobs stores a `jobs` row (status 'queued') and returns its id at once.
+Each API process runs JOB_WORKERS dispatcher threads. They claim the oldest
+queued job with a conditional UPDATE, so several API workers can share the
+table, and run utils.generate_report() for it in a freshly spawned process. At
+most JOB_WORKERS generations run at a time per API process, and one that
+exceeds JOB_TIMEOUT_SECONDS is killed (pdfkit's wkhtmltopdf included). The
+output goes into the blob store and is registered as a normal Report, so it
+shows up in the listings (catalog version bumped, preview queued).
+
+Job state lives in the database, so a restart loses nothing: queued jobs are
+simply claimed again, and a job left 'running' by a process that died is
+requeued once its lease (JOB_TIMEOUT_SECONDS plus a grace period) has run out,
+up to JOB_MAX_ATTEMPTS attempts.
+"""
+import json
+import os
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+
+from sqlalchemy import func, select, update
+from sqlalchemy.orm import Session
+
+from . import blobstore, catalog, ingest, models, pools, search, utils
+from .database import SessionLocal
+
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))  # 0: this process only queues jobs
+JOB_TIMEOUT_SECONDS = float(os.getenv("JOB_TIMEOUT_SECONDS", "300"))
+JOB_MAX_QUEUED = int(os.getenv("JOB_MAX_QUEUED", "100"))
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "2"))
+JOB_POLL_SECONDS = float(os.getenv("JOB_POLL_SECONDS", "2"))
+JOB_MAX_ROWS = int(os.getenv("JOB_MAX_ROWS", "100000"))  # per excel/csv job
+
+# a 'running' job older than its timeout plus this was lost with its process
+_LEASE_GRACE_SECONDS = 60
+_RECOVERY_INTERVAL_SECONDS = 30
+
+
+class QueueFull(Exception):
+    """Too many jobs are waiting; retry later."""
+
+
+class JobFailed(Exception):
+    pass
+
+
+class JobTimeout(JobFailed):
+    pass
+
+
+# ============================================================
+# SUBMIT / QUERY
+# ============================================================
+def submit(db: Session, kind: str, payload: dict, site_name: str, category: str, report_date: datetime,
+           visibility: str = "shared", owner_id: int = None) -> models.Job:
+    """Queue a generation job (committed) and wake a local worker."""
+    if kind not in utils.REPORT_KINDS:
+        raise ValueError(f"Unknown report kind: {kind}")
+    queued = db.execute(
+        select(func.count()).select_from(models.Job).where(models.Job.status == "queued")
+    ).scalar()
+    if queued >= JOB_MAX_QUEUED:
+        raise QueueFull(f"{queued} report jobs are already waiting")
+    job = models.Job(
+        id=uuid.uuid4().hex,
+        kind=kind,
+        status="queued",
+        # the category as typed names the file, like an upload's (the column is normalized)
+        payload=json.dumps({**payload, "file_category": category}, default=str),
+        site_name=site_name,
+        category=category,
+        date=report_date,
+        visibility=visibility,
+        owner_id=owner_id,
+    )
+    db.add(job)
+    db.commit()
+    db.refresh(job)
+    runner.wake()
+    return job
+
+
+def status_counts(db: Session) -> dict:
+    return dict(db.execute(select(models.Job.status, func.count()).group_by(models.Job.status)).all())
+
+
+# ============================================================
+# GENERATION (one spawned process per job)
+# ============================================================
+def _generate(kind: str, payload_json: str, out_path: str, conn):
+    """Child process entry point: write the file, then send None or an error message."""
+    try:
+        utils.generate_report(kind, json.loads(payload_json), out_path)
+        conn.send(None)
+    except BaseException as e:
+        conn.send(f"{type(e).__name__}: {e}")
+    finally:
+        conn.close()
+
+
+def run_generation(kind: str, payload_json: str, out_path: str, timeout: float = JOB_TIMEOUT_SECONDS):
+    """Generate `out_path` in a separate process; raises JobFailed / JobTimeout."""
+    receiver, sender = pools.SPAWN.Pipe(duplex=False)
+    proc = pools.SPAWN.Process(target=_generate, args=(kind, payload_json, out_path, sender),
+                       name="report-job", daemon=True)
+    proc.start()
+    sender.close()
+    try:
+        if not receiver.poll(timeout):
+            raise JobTimeout(f"Timed out after {timeout:g}s")
+        try:
+            error = receiver.recv()
+        except EOFError:
+            proc.join(5)
+            raise JobFailed(f"Generator process exited with code {proc.exitcode}")
+        if error is not None:
+            raise JobFailed(error)
+    finally:
+        receiver.close()
+        proc.join(5)
+        if proc.is_alive():
+            proc.kill()
+            proc.join()
+
+
+# ============================================================
+# WORKERS
+# ============================================================
+class JobRunner:
+    """Dispatcher threads that claim queued jobs and run them with a timeout."""
+
+    def __init__(self, session_factory=SessionLocal, workers: int = JOB_WORKERS,
+                 timeout: float = JOB_TIMEOUT_SECONDS, poll_seconds: float = JOB_POLL_SECONDS):
+        self.session_factory = session_factory
+        self.workers = workers
+        self.timeout = timeout
+        self.poll_seconds = poll_seconds
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._threads = []
+        self._lock = threading.Lock()
+        self._next_recovery = 0.0
+        self.running = 0
+        self.succeeded = 0
+        self.failed = 0
+        self.timed_out = 0
+        self.requeued = 0
+
+    def start(self):
+        if self.workers <= 0 or self._threads:
+            return
+        self._stop.clear()
+        self._threads = [
+            threading.Thread(target=self._loop, name=f"report-jobs-{i}", daemon=True)
+            for i in range(self.workers)
+        ]
+        for t in self._threads:
+            t.start()
+
+    def stop(self, timeout: float = 5.0):
+        """Stop claiming jobs. A generation still running is left to its lease and requeued later."""
+        self._stop.set()
+        self._wake.set()
+        for t in self._threads:
+            t.join(timeout)
+        self._threads = []
+
+    def wake(self):
+        self._wake.set()
+
+    def _loop(self):
+        while not self._stop.is_set():
+            # cleared before looking, so a submit from now on ends the wait below
+            self._wake.clear()
+            try:
+                job = self._claim()
+            except Exception as e:
+                print("Job queue error:", e)
+                job = None
+            if job is None:
+                self._wake.wait(self.poll_seconds)
+                continue
+            self._run(job)
+
+    def _claim(self):
+        """Mark the oldest queued job as running for this worker; returns it detached, or None."""
+        with self.session_factory() as db:
+            if time.monotonic() >= self._next_recovery:
+                self._next_recovery = time.monotonic() + _RECOVERY_INTERVAL_SECONDS
+                self._recover_stale(db)
+            candidates = db.scalars(
+                select(models.Job.id)
+                .where(models.Job.status == "queued")
+                .order_by(models.Job.created_at)
+                .limit(5)
+            ).all()
+            for job_id in candidates:
+                # another worker may have claimed it since the SELECT
+                claimed = db.execute(
+                    update(models.Job)
+                    .where(models.Job.id == job_id, models.Job.status == "queued")
+                    .values(status="running", started_at=datetime.utcnow(), attempts=models.Job.attempts + 1)
+                ).rowcount
+                db.commit()
+                if claimed:
+                    job = db.get(models.Job, job_id)
+                    db.expunge(job)
+                    return job
+        return None
+
+    def _recover_stale(self, db: Session):
+        """Requeue (or fail, after JOB_MAX_ATTEMPTS) jobs whose worker process died mid-run."""
+        expired = datetime.utcnow() - timedelta(seconds=self.timeout + _LEASE_GRACE_SECONDS)
+        stale = (models.Job.status == "running", models.Job.started_at < expired)
+        requeued = db.execute(
+            update(models.Job)
+            .where(*stale, models.Job.attempts < JOB_MAX_ATTEMPTS)
+            .values(status="queued", started_at=None)
+        ).rowcount
+        db.execute(
+            update(models.Job)
+            .where(*stale)
+            .values(status="failed", error="Interrupted: the worker running it stopped",
+                    finished_at=datetime.utcnow(), payload=None)
+        )
+        db.commit()
+        if requeued:
+            with self._lock:
+                self.requeued += requeued
+
+    def _run(self, job: models.Job):
+        ext = utils.REPORT_KINDS[job.kind]
+        os.makedirs(ingest.INCOMING_FOLDER, exist_ok=True)
+        # keeps its extension (pandas/openpyxl pick the format from it); swept like uploads
+        out_path = os.path.join(ingest.INCOMING_FOLDER, f"job-{job.id}.part.{ext}")
+        with self._lock:
+            self.running += 1
+        try:
+            run_generation(job.kind, job.payload, out_path, self.timeout)
+            self._register(job, ext, out_path)
+        except Exception as e:
+            with self._lock:
+                self.failed += 1
+                if isinstance(e, JobTimeout):
+                    self.timed_out += 1
+            print(f"Report job {job.id} failed: {e}")
+            self._finish_failed(job.id, str(e) or type(e).__name__)
+        else:
+            with self._lock:
+                self.succeeded += 1
+        finally:
+            with self._lock:
+                self.running -= 1
+            if os.path.exists(out_path):
+                os.remove(out_path)
+
+    def _register(self, job: models.Job, ext: str, out_path: str):
+        """Store the output as a blob and a new Report, and mark the job succeeded, in one transaction."""
+        staged = ingest.stage_path(out_path)
+        with self.session_factory() as db:
+            try:
+                existing = db.scalars(select(models.Report).where(
+                    models.Report.site_name == job.site_name,
+                    models.Report.category == job.category,
+                    models.Report.date == job.date,
+                )).all()
+                file_category = json.loads(job.payload).get("file_category") or job.category
+                # generated reports never replace an upload
+                filename, _ = ingest.plan_report_file(existing, file_category, job.date, ext, save_as_new=True)
+                blobstore.acquire(db, staged)
+                report = models.Report(
+                    site_name=job.site_name,
+                    category=job.category,
+                    file_name=filename,
+                    file_type=ext,
+                    date=job.date,
+                    visibility=job.visibility,
+                    blob_sha256=staged.sha256,
+                )
+                db.add(report)
+                db.flush()
+                db.execute(
+                    update(models.Job)
+                    .where(models.Job.id == job.id)
+                    .values(status="succeeded", report_id=report.id, error=None,
+                            finished_at=datetime.utcnow(), payload=None)
+                )
+                catalog.bump(db)
+                db.commit()
+            except Exception:
+                db.rollback()
+                # drops the blob file only if no committed row references it
+                blobstore.unlink_unreferenced(db, [staged.sha256])
+                raise
+        blobstore.queue_preview(ext, staged.sha256)
+        search.indexer.wake()
+
+    def _finish_failed(self, job_id: str, error: str):
+        with self.session_factory() as db:
+            db.execute(
+                update(models.Job)
+                .where(models.Job.id == job_id, models.Job.status == "running")
+                .values(status="failed", error=error[:2000], finished_at=datetime.utcnow(), payload=None)
+            )
+            db.commit()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "workers": self.workers,
+                "timeout_seconds": self.timeout,
+                "running": self.running,
+                "succeeded": self.succeeded,
+                "failed": self.failed,
+                "timed_out": self.timed_out,
+                "requeued": self.requeued,
+            }
+
+
+runner = JobRunner()
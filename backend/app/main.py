@@ -1,57 +1,63 @@
 # main.py
-from fastapi import FastAPI, Depends, HTTPException, UploadFile, File, Form
+from fastapi import FastAPI, Depends, HTTPException, UploadFile, File, Form, Query, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
-from fastapi.staticfiles import StaticFiles
+from fastapi.responses import Response
+from starlette.concurrency import run_in_threadpool
 from fastapi import Body
-from pydantic import BaseModel, EmailStr
+from pydantic import BaseModel, EmailStr, Field
 from sqlalchemy.orm import Session
-from .database import SessionLocal, engine
-from . import models, crud, auth, database
+from .database import SessionLocal
+from . import models, crud, auth, database, reconciler, ingest, blobstore, principals, hashing, http_cache, catalog, schemas, previews, jobs, search, migrate, metrics, profiler
 from .auth import get_current_user
+from .principals import Principal
+from contextlib import asynccontextmanager
+from types import SimpleNamespace
+from sqlalchemy import and_, or_
 from datetime import datetime
-import shutil
 import os
+import asyncio
+import json
+import mimetypes
 import uuid
+import zipfile
 from dotenv import load_dotenv
 
 # load .env variables if present
 load_dotenv()
 
-# --- Debug: print key startup configuration ---
-print("Report Portal starting up...")
-print("DATABASE_URL:", os.getenv("DATABASE_URL"))
-print("ALLOW_ORIGINS:", os.getenv("ALLOW_ORIGINS"))
-
-# --- Create database tables (guarded) ---
-try:
-    models.Base.metadata.create_all(bind=engine)
-    print("Database tables ensured (create_all completed)")
-except Exception as e:
-    print("Error creating database tables:", e)
-    raise
-
-# --- Ensure visibility column exists (backward compatibility) ---
-from sqlalchemy import inspect, String, text
-try:
-    inspector = inspect(engine)
-    if "reports" in inspector.get_table_names():
-        columns = [c["name"] for c in inspector.get_columns("reports")]
-        if "visibility" not in columns:
-            print("Adding missing 'visibility' column to 'reports' table...")
-            with engine.connect() as conn:
-                # Add the column with default value 'shared'
-                if "sqlite" in engine.url.drivername.lower():
-                    conn.execute(text("ALTER TABLE reports ADD COLUMN visibility TEXT DEFAULT 'shared'"))
-                else:  # PostgreSQL
-                    conn.execute(text("ALTER TABLE reports ADD COLUMN visibility VARCHAR DEFAULT 'shared'"))
-                conn.commit()
-            print("Column 'visibility' added successfully")
-except Exception as e:
-    print("Warning: Could not add visibility column:", e)
-    # Don't crash on this—the column might already exist or DB might be read-only
-
-app = FastAPI(title="Report Portal API")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Startup work happens here, once per worker, not when the module is imported
+    print("Report Portal starting up...")
+    print("DATABASE_URL:", os.getenv("DATABASE_URL"))
+    print("ALLOW_ORIGINS:", os.getenv("ALLOW_ORIGINS"))
+    # Schema changes are an explicit step (python -m app.migrate); this only checks
+    # the revision, or migrates when DB_AUTO_MIGRATE=true
+    await run_in_threadpool(migrate.check_on_startup)
+    # Drop temp files from uploads interrupted by a crash
+    ingest.sweep_incoming()
+    # Orphan cleanup runs off the request path (RECONCILE_INTERVAL_SECONDS > 0 to enable)
+    reconciler.start_background()
+    # Report generation jobs queued before a restart are picked up again
+    jobs.runner.start()
+    # Indexes new uploads and backfills reports that have no search text yet
+    search.indexer.start()
+    # Boot the password hashing workers now rather than on the first login
+    await run_in_threadpool(hashing.hasher.start)
+    yield
+    jobs.runner.stop()
+    search.indexer.stop()
+    reconciler.stop_background()
+    profiler.profiler.stop()
+    hashing.hasher.shutdown()
+    previews.renderer.shutdown()
+
+app = FastAPI(title="Report Portal API", lifespan=lifespan)
+
+# Oversized uploads are refused before the multipart body is read (MAX_UPLOAD_BYTES,
+# BULK_UPLOAD_MAX_BYTES for the bulk endpoint)
+app.add_middleware(ingest.UploadSizeLimitMiddleware)
 
 # --- CORS ---
 # allow_origins can be a comma-separated list in the ALLOW_ORIGINS env var
@@ -64,6 +70,13 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Opt-in request profiling (PROFILE_SAMPLE_PERCENT / PROFILE_SLOW_MS), inside the metrics
+# middleware so it shares the request's SQL accounting
+app.add_middleware(profiler.ProfilerMiddleware)
+
+# Outermost, so CORS preflights and refused uploads are timed too (see GET /metrics)
+app.add_middleware(metrics.MetricsMiddleware)
+
 # --- Database dependency ---
 def get_db():
     db = SessionLocal()
@@ -76,7 +89,7 @@ class LoginRequest(BaseModel):
     email: str
     password: str
 
-from typing import List, Optional
+from typing import List, Literal, Optional, Union
 
 class CreateUserRequest(BaseModel):
     email: EmailStr
@@ -87,19 +100,27 @@ class CreateUserRequest(BaseModel):
 # ============================================================
 # AUTHENTICATION
 # ============================================================
-# AUTHENTICATION
-@app.post("/login")
-def login(login_req: LoginRequest, db: Session = Depends(get_db)):
+async def password_work(operation):
+    """Await a hashing.hasher call; a full hashing queue becomes 503 + Retry-After."""
+    try:
+        return await operation
+    except hashing.HashingBusy as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "1"})
+
+@app.post("/login", response_model=schemas.LoginResponse)
+async def login(login_req: LoginRequest, db=Depends(database.get_async_db)):
     email = login_req.email
     password = login_req.password
     print("Received login attempt:", email)
 
-    user = crud.get_user_by_email(db, email)
+    # returns with the DB connection already released, so none is held during bcrypt
+    user = await crud.aget_user_detached(db, email)
     if not user:
         print("Login failed: user not found for email:", email)
         raise HTTPException(status_code=401, detail="Invalid credentials")
 
-    if not auth.verify_password(password, user.hashed_password):
+    # bcrypt runs in the hashing pool, not in the request threadpool
+    if not await password_work(hashing.hasher.verify(password, user.hashed_password)):
         print("Login failed: password incorrect for email:", email)
         raise HTTPException(status_code=401, detail="Invalid credentials")
 
@@ -121,28 +142,30 @@ def login(login_req: LoginRequest, db: Session = Depends(get_db)):
 # ============================================================
 # CREATE ACCOUNT
 # ============================================================
-@app.post("/create-account")
-def create_account(req: CreateUserRequest, db: Session = Depends(get_db)):
+@app.post("/create-account", response_model=schemas.CreateAccountResponse)
+async def create_account(req: CreateUserRequest, db: Session = Depends(get_db)):
     print("Incoming create-account payload:", req)
 
     # Check if email exists
-    existing_user = crud.get_user_by_email(db, req.email)
+    existing_user = await crud.aget_user_detached(db, req.email)
     if existing_user:
         raise HTTPException(status_code=400, detail="User already exists")
 
-    # Create new user
-    hashed_password = auth.get_password_hash(req.password)
+    # Create new user (hashed off the request threadpool)
+    hashed_password = await password_work(hashing.hasher.hash(req.password))
     allowed = req.allowed_sites or [req.site_name]
     new_user = models.User(
         email=req.email,
         hashed_password=hashed_password,
         site_name=req.site_name or "shared",
-        allowed_sites=",".join(allowed)
+        allowed_sites=allowed
     )
 
-    db.add(new_user)
-    db.commit()
-    db.refresh(new_user)
+    def save():
+        db.add(new_user)
+        db.commit()
+        db.refresh(new_user)
+    await run_in_threadpool(save)
 
     # AUTO-LOGIN AFTER CREATION (critical fix)
     token = auth.create_access_token({
@@ -154,7 +177,7 @@ def create_account(req: CreateUserRequest, db: Session = Depends(get_db)):
         "message": f"User {req.email} created successfully",
         "access_token": token,
         "token_type": "bearer",
-        "allowed_sites": new_user.allowed_sites.split(",")
+        "allowed_sites": new_user.site_list
     }
 
 # ============================================================
@@ -173,7 +196,7 @@ def get_sites():
 # CHANGE REPORT VISIBILITY (ADMIN ONLY)
 # ============================================================
 @app.patch("/report/{report_id}/visibility")
-def change_report_visibility(report_id: int, payload: dict = Body(...), db: Session = Depends(get_db), user: models.User = Depends(get_current_user)):
+def change_report_visibility(report_id: int, payload: dict = Body(...), db: Session = Depends(get_db), user: Principal = Depends(get_current_user)):
     if user.site_name != "admin":
         raise HTTPException(status_code=403, detail="Only admins can change report visibility")
 
@@ -187,6 +210,7 @@ def change_report_visibility(report_id: int, payload: dict = Body(...), db: Sess
 
     report.visibility = visibility
     db.add(report)
+    catalog.bump(db)
     db.commit()
     db.refresh(report)
 
@@ -203,72 +227,96 @@ def get_categories():
     """Return fixed list of report categories."""
     return REPORT_CATEGORIES
 
-# ============================================================
-# FETCH REPORTS BY SITE NAME
-# ============================================================
-@app.get("/reports")
-def get_reports(site_name: str, db: Session = Depends(get_db), user: models.User = Depends(get_current_user)):
-    """Fetch all reports for a given site, including admin reports, filtered by visibility tags and current user."""
-    reports = (
-        db.query(models.Report)
-        .filter(
-            (models.Report.site_name.ilike(site_name.lower())) |
-            (models.Report.site_name.ilike("admin"))
-        )
-        .order_by(models.Report.date.desc())
-        .all()
-    )
+# Listings are paginated by default; `unpaginated=true` restores the old full-list response
+DEFAULT_PAGE_SIZE = int(os.getenv("REPORT_PAGE_SIZE", "100"))
+MAX_PAGE_SIZE = int(os.getenv("REPORT_MAX_PAGE_SIZE", "1000"))
 
-    # Apply visibility filtering in Python for clarity
-    allowed_sites = (user.allowed_sites or "").split(',')
+# Documents the listing body; the response itself is pre-serialized by cached_listing
+ReportListing = Union[schemas.ReportPage, List[schemas.ReportOut]]
 
-    def visible_to_user(r):
-        vis = (r.visibility or "shared").lower()
-        if vis == "shared":
-            return True
-        if vis == "personal":
-            return user.site_name == "admin" or user.site_name == "personal" or ("personal" in allowed_sites)
-        return False
+async def report_page(db, stmt, site_name: str, limit: int, cursor: Optional[str], unpaginated: bool):
+    """Return the whole list (opt-in) or one keyset page: {"items": [...], "next_cursor": ...}."""
+    if unpaginated:
+        return await crud.alist_reports(db, stmt)
+    try:
+        items, next_cursor = await crud.apaginate_reports(db, stmt, limit, cursor, crud.listing_sites(site_name))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return {"items": items, "next_cursor": next_cursor}
+
+async def cached_listing(request: Request, db, user, key: tuple, build, scope: tuple = ()):
+    """Serve a listing from the catalog-versioned result cache, or 304 if the client is current.
+
+    `key` identifies the endpoint and its parameters; `build` runs the queries on a miss
+    and returns plain data (column rows as dicts), encoded with schemas.dumps(). `scope`
+    is whatever else the body depends on that the URL doesn't show (it goes into the ETag).
+    """
+    version = await catalog.aget_version(db)
+    vis = crud.visibility_class(user)
+    headers = {"ETag": catalog.listing_etag(version, vis, scope), "Cache-Control": "private, no-cache"}
+    if http_cache.is_not_modified(request, headers["ETag"]):
+        return http_cache.not_modified_response(headers)
+
+    cache_key = (version, vis) + key
+    body = catalog.results.get(cache_key)
+    if body is None:
+        body = schemas.dumps(await build())
+        catalog.results.put(cache_key, body)
+    return schemas.FastJSONResponse(body, headers=headers)
 
-    return [r for r in reports if visible_to_user(r)]
+# ============================================================
+# FETCH REPORTS BY SITE NAME
+# ============================================================
+@app.get("/reports", response_model=ReportListing)
+async def get_reports(
+    site_name: str,
+    request: Request,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    unpaginated: bool = False,
+    db=Depends(database.get_async_db),
+    user: Principal = Depends(auth.get_current_user_async),
+):
+    """Fetch reports for a given site, including admin reports, filtered by visibility tags and current user."""
+    key = ("reports", models.normalize_key(site_name), None, None, limit, cursor, unpaginated)
+    return await cached_listing(request, db, user, key, lambda: report_page(
+        db, crud.visible_reports_stmt(user, site_name), site_name, limit, cursor, unpaginated))
 
 # ============================================================
 # FETCH REPORTS BY CATEGORY (site_name + category)
 # ============================================================
-@app.get("/reports/{site_name}/{category}")
-def get_reports_by_category(site_name: str, category: str, db: Session = Depends(get_db), user: models.User = Depends(get_current_user)):
-    """Fetch all reports by site + category, including admin/global, filtered by visibility."""
-    reports = (
-        db.query(models.Report)
-        .filter(
-            (
-                models.Report.site_name.ilike(site_name.lower()) |
-                models.Report.site_name.ilike("admin")
-            ),
-            models.Report.category.ilike(category.lower())
-        )
-        .order_by(models.Report.date.desc())
-        .all()
-    )
-
-    allowed_sites = (user.allowed_sites or "").split(',')
-
-    def visible_to_user(r):
-        vis = (r.visibility or "shared").lower()
-        if vis == "shared":
-            return True
-        if vis == "personal":
-            return user.site_name == "admin" or user.site_name == "personal" or ("personal" in allowed_sites)
-        return False
-
-    return [r for r in reports if visible_to_user(r)]
+@app.get("/reports/{site_name}/{category}", response_model=ReportListing)
+async def get_reports_by_category(
+    site_name: str,
+    category: str,
+    request: Request,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    unpaginated: bool = False,
+    db=Depends(database.get_async_db),
+    user: Principal = Depends(auth.get_current_user_async),
+):
+    """Fetch reports by site + category, including admin/global, filtered by visibility."""
+    key = ("reports", models.normalize_key(site_name), models.normalize_key(category), None, limit, cursor, unpaginated)
+    return await cached_listing(request, db, user, key, lambda: report_page(
+        db, crud.visible_reports_stmt(user, site_name, category), site_name, limit, cursor, unpaginated))
 
 # ============================================================
 # FETCH REPORTS BY DATE (site_name + category + date)
 # ============================================================
-@app.get("/reports/{site_name}/{category}/{date}")
-def get_reports_by_date(site_name: str, category: str, date: str, db: Session = Depends(get_db), user: models.User = Depends(get_current_user)):
-    """Fetch all reports by site, category, and date, including admin/global."""
+@app.get("/reports/{site_name}/{category}/{date}", response_model=ReportListing)
+async def get_reports_by_date(
+    site_name: str,
+    category: str,
+    date: str,
+    request: Request,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    unpaginated: bool = False,
+    db=Depends(database.get_async_db),
+    user: Principal = Depends(auth.get_current_user_async),
+):
+    """Fetch reports by site, category, and date, including admin/global."""
     try:
         parsed_date = datetime.strptime(date, "%Y-%m-%d").date()
     except ValueError:
@@ -277,45 +325,214 @@ def get_reports_by_date(site_name: str, category: str, date: str, db: Session =
     start = datetime.combine(parsed_date, datetime.min.time())
     end = datetime.combine(parsed_date, datetime.max.time())
 
-    reports = (
-        db.query(models.Report)
-        .filter(
-            (
-                models.Report.site_name.ilike(site_name.lower()) |
-                models.Report.site_name.ilike("admin")
-            ),
-            models.Report.category.ilike(category.lower()),
-            models.Report.date >= start,
-            models.Report.date <= end,
-        )
-        .order_by(models.Report.date.desc())
-        .all()
+    key = ("reports", models.normalize_key(site_name), models.normalize_key(category), parsed_date, limit, cursor, unpaginated)
+    return await cached_listing(request, db, user, key, lambda: report_page(
+        db, crud.visible_reports_stmt(user, site_name, category, start, end), site_name, limit, cursor, unpaginated))
+
+# ============================================================
+# FULL-TEXT SEARCH (report contents, see search.py)
+# ============================================================
+@app.get("/search", response_model=schemas.SearchPage)
+async def search_reports(
+    q: str = Query(..., min_length=1, max_length=200),
+    site_name: str = Query(...),
+    category: Optional[str] = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    offset: int = Query(0, ge=0, le=10_000),
+    db=Depends(database.get_async_db),
+    user: Principal = Depends(auth.get_current_user_async),
+):
+    """Reports of a site (and admin/global) whose contents match `q`, best match first.
+
+    Same visibility rules as GET /reports. Newly uploaded reports become
+    searchable once the background indexer has extracted their text.
+    """
+    if not q.strip():
+        raise HTTPException(status_code=400, detail="Search query is empty")
+    stmt = crud.search_stmt(user, q, site_name, category, crud.dialect_name(db))
+    items, next_offset = await crud.asearch_reports(db, stmt, limit, offset)
+    return schemas.FastJSONResponse(schemas.dumps({"items": items, "next_offset": next_offset}))
+
+# ============================================================
+# REPORT CONTENT (authenticated, cacheable file streaming)
+# ============================================================
+def _link(user: Principal, resource: str):
+    return {"token": auth.create_link_token(user.email, resource), "expires_in": auth.LINK_TOKEN_EXPIRE_SECONDS}
+
+@app.post("/report/{report_id}/link")
+async def create_report_link(report_id: int, db=Depends(database.get_async_db), user: Principal = Depends(auth.get_current_user_async)):
+    """A short-lived ?token= that opens this report's /content and /preview (for iframes, links, <img>)."""
+    if await crud.aget_visible_report(db, user, report_id) is None:
+        raise HTTPException(status_code=404, detail="Report not found")
+    return _link(user, f"report_id={report_id}")
+
+@app.get("/report/{report_id}/content")
+async def get_report_content(
+    report_id: int,
+    request: Request,
+    db=Depends(database.get_async_db),
+    user: Principal = Depends(auth.get_current_user_header_or_link("report_id")),
+):
+    """Stream a report's file if the user may see it, with Range and conditional GET support.
+
+    Blob-backed reports get a strong ETag (the content SHA-256) and immutable
+    cache headers; a matching If-None-Match / If-Modified-Since returns 304.
+    """
+    report = await crud.aget_visible_report(db, user, report_id)
+    if report is None:
+        raise HTTPException(status_code=404, detail="Report not found")
+
+    file_path = blobstore.report_file_path(report)
+    try:
+        stat_result = await run_in_threadpool(os.stat, file_path)
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail="File missing on server")
+
+    if report.blob_sha256:
+        etag = f'"{report.blob_sha256}"'
+    else:
+        # legacy flat file: no content hash yet, so only a weak validator
+        etag = f'W/"{int(stat_result.st_mtime)}-{stat_result.st_size}"'
+    headers = {
+        "ETag": etag,
+        "Last-Modified": http_cache.http_date(stat_result.st_mtime),
+        "Cache-Control": http_cache.IMMUTABLE_CACHE_CONTROL,
+    }
+    if http_cache.is_not_modified(request, etag, stat_result.st_mtime):
+        return http_cache.not_modified_response(headers)
+
+    # FileResponse handles Range/If-Range (206) and uses the server's zero-copy
+    # http.response.pathsend extension when available; the stat is reused
+    return metrics.CountedFileResponse(
+        file_path,
+        headers=headers,
+        media_type=mimetypes.guess_type(report.file_name)[0] or "application/octet-stream",
+        filename=report.file_name,
+        content_disposition_type="inline",
+        stat_result=stat_result,
     )
 
-    allowed_sites = (user.allowed_sites or "").split(',')
+# ============================================================
+# REPORT PREVIEW (rendered in the background after upload)
+# ============================================================
+@app.get("/report/{report_id}/preview")
+async def get_report_preview(
+    report_id: int,
+    request: Request,
+    db=Depends(database.get_async_db),
+    user: Principal = Depends(auth.get_current_user_header_or_link("report_id")),
+):
+    """Serve a report's preview: a PNG for PDFs/images, the first rows as JSON for CSV/XLSX.
 
-    def visible_to_user(r):
-        vis = (r.visibility or "shared").lower()
-        if vis == "shared":
-            return True
-        if vis == "personal":
-            return user.site_name == "admin" or user.site_name == "personal" or ("personal" in allowed_sites)
-        return False
+    404 when the type has no preview or it isn't rendered yet (it gets queued);
+    clients then fall back to /report/{id}/content.
+    """
+    report = await crud.aget_visible_report(db, user, report_id)
+    if report is None:
+        raise HTTPException(status_code=404, detail="Report not found")
+    fmt = previews.preview_format(report.file_type)
+    if fmt is None or not report.blob_sha256:
+        raise HTTPException(status_code=404, detail="No preview for this report")
 
-    return [r for r in reports if visible_to_user(r)]
+    # previews are derived from immutable blobs, so they never change either
+    etag = f'"{report.blob_sha256}-preview"'
+    headers = {"ETag": etag, "Cache-Control": http_cache.IMMUTABLE_CACHE_CONTROL}
+    if http_cache.is_not_modified(request, etag):
+        return http_cache.not_modified_response(headers)
+
+    path = blobstore.preview_path(report.blob_sha256, fmt)
+    try:
+        stat_result = await run_in_threadpool(os.stat, path)
+    except FileNotFoundError:
+        if blobstore.queue_preview(report.file_type, report.blob_sha256):
+            raise HTTPException(status_code=404, detail="Preview not ready")
+        raise HTTPException(status_code=404, detail="No preview for this report")
+    return metrics.CountedFileResponse(path, headers=headers, media_type=previews.MEDIA_TYPES[fmt], stat_result=stat_result)
 
 # ============================================================
 # FILE UPLOAD
 # ============================================================
 
-UPLOAD_FOLDER = os.path.join(os.path.dirname(__file__), "..", "uploaded_reports")
-UPLOAD_FOLDER = os.path.abspath(UPLOAD_FOLDER)
+UPLOAD_FOLDER = database.UPLOAD_FOLDER
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 
-# Serve uploaded files
-app.mount("/uploaded_reports", StaticFiles(directory=UPLOAD_FOLDER), name="uploaded_reports")
+# Serve uploaded files by their logical name (bytes live in the blob store)
+@app.get("/uploaded_reports/{file_name}")
+def get_uploaded_file(file_name: str, db: Session = Depends(get_db), user: Principal = Depends(get_current_user)):
+    """Serve a report file by name from the sites the user can list; when several share a name the newest upload wins."""
+    report = db.execute(crud.user_file_stmt(user, file_name).limit(1)).scalars().first()
+    if not report:
+        raise HTTPException(status_code=404, detail="Not Found")
+    file_path = blobstore.report_file_path(report)
+    if not os.path.isfile(file_path):
+        raise HTTPException(status_code=404, detail="File missing on server")
+    return metrics.CountedFileResponse(file_path, media_type=mimetypes.guess_type(file_name)[0] or "application/octet-stream")
+
+def _plan_upload(db: Session, site_name, category, report_date, file_ext, override, save_as_new):
+    """Pick the target filename; returns (filename, existing reports to replace)."""
+    # Check existing reports
+    existing_reports = db.query(models.Report).filter(
+        models.Report.site_name == models.normalize_key(site_name),
+        models.Report.category == models.normalize_key(category),
+        models.Report.date == report_date
+    ).all()
+    try:
+        return ingest.plan_report_file(existing_reports, category, report_date, file_ext, override, save_as_new)
+    except ingest.ReportExists as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+def _commit_reports(db: Session, items):
+    """Store staged files as blobs and swap the DB rows for all items in one transaction.
+
+    `items` is a list of (staged file, reports to replace, new report). Returns the
+    upload result payload for each new report.
+    """
+    placed = []
+    results = []
+    try:
+        for staged, replaced, new_report in items:
+            deduplicated = blobstore.acquire(db, staged)
+            if not deduplicated:
+                placed.append(staged.sha256)
+            new_report.blob_sha256 = staged.sha256
+            blobstore.release_reports(db, replaced)
+            crud.delete_report_dependents(db, [r.id for r in replaced])
+            for r in replaced:
+                db.delete(r)
+            db.add(new_report)
+            results.append((new_report, staged, deduplicated))
+        db.flush()
+        payloads = [
+            {
+                "id": new_report.id,
+                "file_name": new_report.file_name,
+                "site_name": new_report.site_name,
+                "category": new_report.category,
+                "date": new_report.date.strftime("%Y-%m-%d"),
+                "visibility": new_report.visibility,
+                "size": staged.size,
+                "sha256": staged.sha256,
+                "deduplicated": deduplicated
+            }
+            for new_report, staged, deduplicated in results
+        ]
+        renditions = [(new_report.file_type, staged.sha256) for new_report, staged, _ in results]
+        catalog.bump(db)
+        db.commit()
+    except Exception:
+        db.rollback()
+        blobstore.unlink_unreferenced(db, placed)
+        raise
+
+    # Replaced content is only removed once the new rows are committed
+    blobstore.remove_report_files(db, [r for _, replaced, _ in items for r in replaced])
+    for file_type, sha256 in renditions:
+        blobstore.queue_preview(file_type, sha256)
+    # text extraction for the search index happens in the background too
+    search.indexer.wake()
+    return payloads
 
-@app.post("/upload-report")
+@app.post("/upload-report", response_model=schemas.UploadResponse)
 async def upload_report(
     site_name: str = Form(...),
     category: str = Form(...),
@@ -326,81 +543,41 @@ async def upload_report(
     file: UploadFile = File(...),
     db: Session = Depends(get_db)
 ):
+    staged = None
     try:
         # Parse date or default to now
         report_date = datetime.strptime(date, "%Y-%m-%d") if date and date.strip() else datetime.now()
-        report_date_str = report_date.strftime("%d%m%Y")
 
         # File extension
         file_ext = file.filename.split('.')[-1]
 
-        # Check existing reports
-        existing_reports = db.query(models.Report).filter(
-            models.Report.site_name == site_name.lower(),
-            models.Report.category == category.lower(),
-            models.Report.date == report_date
-        ).all()
-
-        if existing_reports:
-            if override:
-                # Delete existing files + DB
-                for r in existing_reports:
-                    existing_file_path = os.path.join(UPLOAD_FOLDER, r.file_name)
-                    if os.path.exists(existing_file_path):
-                        os.remove(existing_file_path)
-                    db.delete(r)
-                db.commit()
-                filename = f"{category}_{report_date_str}.{file_ext}"
-            elif save_as_new:
-                # Create a new filename with iteration _X
-                i = 2
-                while True:
-                    filename_candidate = f"{category}_{report_date_str}_{i}.{file_ext}"
-                    if not any(r.file_name == filename_candidate for r in existing_reports):
-                        filename = filename_candidate
-                        break
-                    i += 1
-            else:
-                raise HTTPException(
-                    status_code=400,
-                    detail=f"A report for {category} on {report_date.strftime('%Y-%m-%d')} already exists. Set override or save_as_new."
-                )
-        else:
-            # No existing report → normal filename
-            filename = f"{category}_{report_date_str}.{file_ext}"
-
-        file_path = os.path.join(UPLOAD_FOLDER, filename)
+        # Blocking DB work runs in the threadpool so the event loop stays free
+        filename, replaced = await run_in_threadpool(
+            _plan_upload, db, site_name, category, report_date, file_ext, override, save_as_new
+        )
 
-        # Save file
-        with open(file_path, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
+        # Stream the body to a temp file (hashed + size-checked along the way)
+        try:
+            staged = await ingest.stage_upload(file)
+        except ingest.UploadTooLarge as e:
+            raise HTTPException(status_code=413, detail=str(e))
 
-        # Save to DB
         # visibility can be provided by the uploader; default to 'shared'
         visibility = visibility.lower() if visibility else "shared"
 
         new_report = models.Report(
-            site_name=site_name.lower(),
-            category=category.lower(),
+            site_name=site_name,
+            category=category,
             file_name=filename,
             file_type=file_ext,
             date=report_date,
             visibility=visibility
         )
-        db.add(new_report)
-        db.commit()
-        db.refresh(new_report)
+        [payload] = await run_in_threadpool(_commit_reports, db, [(staged, replaced, new_report)])
 
         return {
             "message": "Report uploaded successfully",
-            "report": {
-                "id": new_report.id,
-                "file_name": filename,
-                "site_name": new_report.site_name,
-                "category": new_report.category,
-                    "date": new_report.date.strftime("%Y-%m-%d"),
-                    "visibility": new_report.visibility
-            }
+            "report": payload
         }
 
     except HTTPException:
@@ -408,7 +585,269 @@ async def upload_report(
     except Exception as e:
         print("Upload error:", e)
         raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        # No-op once the file has been stored (or dropped as a duplicate)
+        if staged is not None:
+            staged.discard()
+
+# ============================================================
+# BULK UPLOAD (many files or one ZIP + a manifest)
+# ============================================================
+BULK_UPLOAD_CONCURRENCY = int(os.getenv("BULK_UPLOAD_CONCURRENCY", "8"))
+# Limits on an uploaded ZIP, checked against its directory before anything is extracted
+BULK_ZIP_MAX_MEMBERS = int(os.getenv("BULK_ZIP_MAX_MEMBERS", "1000"))
+BULK_ZIP_MAX_BYTES = int(os.getenv("BULK_ZIP_MAX_BYTES", str(1024 * 1024 * 1024)))  # uncompressed total
+
+class BulkManifestEntry(BaseModel):
+    file: str  # uploaded filename, or member name inside the ZIP
+    site_name: str
+    category: str
+    date: Optional[str] = None
+    visibility: Optional[str] = None
+    override: bool = False
+    save_as_new: bool = False
+
+def _open_archive(fileobj):
+    """Open an uploaded ZIP (blocking: reads its central directory) and enforce the limits.
+
+    The declared sizes can be trusted as a bound: a member never yields more
+    bytes than its header says. Returns (zip_file, {member name: member name}).
+    """
+    try:
+        zip_file = zipfile.ZipFile(fileobj)
+    except zipfile.BadZipFile:
+        raise HTTPException(status_code=400, detail="archive is not a valid ZIP file")
+    members = [info for info in zip_file.infolist() if not info.is_dir()]
+    detail = None
+    if len(members) > BULK_ZIP_MAX_MEMBERS:
+        detail = f"archive has {len(members)} files, more than {BULK_ZIP_MAX_MEMBERS}"
+    elif sum(info.file_size for info in members) > BULK_ZIP_MAX_BYTES:
+        detail = f"archive expands to more than {BULK_ZIP_MAX_BYTES} bytes"
+    if detail:
+        zip_file.close()
+        raise HTTPException(status_code=413, detail=detail)
+    return zip_file, {info.filename: info.filename for info in members}
+
+def _plan_bulk(db: Session, entries, report_dates):
+    """Resolve filenames for the whole batch with a single lookup of existing reports.
+
+    Returns one (filename, replaced) tuple or error message per entry.
+    """
+    keys = {
+        (models.normalize_key(e.site_name), models.normalize_key(e.category), report_dates[i])
+        for i, e in enumerate(entries) if report_dates[i] is not None
+    }
+    existing = {}
+    if keys:
+        rows = db.query(models.Report).filter(or_(*[
+            and_(models.Report.site_name == site, models.Report.category == category, models.Report.date == day)
+            for site, category, day in keys
+        ])).all()
+        for r in rows:
+            existing.setdefault((r.site_name, r.category, r.date), []).append(r)
+
+    # names handed out earlier in this batch count as existing for later entries
+    planned = {}
+    plans = []
+    for i, e in enumerate(entries):
+        if report_dates[i] is None:
+            plans.append("Invalid date format. Use YYYY-MM-DD.")
+            continue
+        key = (models.normalize_key(e.site_name), models.normalize_key(e.category), report_dates[i])
+        in_batch = planned.setdefault(key, [])
+        if in_batch and e.override:
+            plans.append("Another file in this batch targets the same site/category/date.")
+            continue
+        file_ext = e.file.split('.')[-1]
+        try:
+            filename, replaced = ingest.plan_report_file(
+                existing.get(key, []) + in_batch, e.category, report_dates[i], file_ext, e.override, e.save_as_new
+            )
+        except ingest.ReportExists as exc:
+            plans.append(str(exc))
+            continue
+        in_batch.append(SimpleNamespace(file_name=filename))
+        plans.append((filename, replaced))
+    return plans
+
+@app.post("/upload-reports/bulk", response_class=schemas.FastJSONResponse)
+async def bulk_upload_reports(
+    manifest: str = Form(...),
+    files: List[UploadFile] = File(None),
+    archive: UploadFile = File(None),
+    db: Session = Depends(get_db)
+):
+    """Ingest many reports in one request: several `files`, or one ZIP `archive`.
+
+    `manifest` is a JSON list with one entry per file (file, site_name, category,
+    date, visibility, override, save_as_new). Collisions are resolved for the
+    whole batch with one query, files are written concurrently and every new row
+    is inserted in a single transaction. Returns a per-file result.
+    """
+    try:
+        entries = [BulkManifestEntry(**e) for e in json.loads(manifest)]
+    except (ValueError, TypeError) as e:
+        raise HTTPException(status_code=400, detail=f"Invalid manifest: {e}")
 
+    zip_file = None
+    if archive is not None:
+        zip_file, sources = await run_in_threadpool(_open_archive, archive.file)
+    else:
+        sources = {f.filename: f for f in files or []}
+
+    results = [{"file": e.file} for e in entries]
+    report_dates = []
+    for e in entries:
+        try:
+            report_dates.append(datetime.strptime(e.date, "%Y-%m-%d") if e.date and e.date.strip() else datetime.now())
+        except ValueError:
+            report_dates.append(None)
+
+    plans = await run_in_threadpool(_plan_bulk, db, entries, report_dates)
+
+    # Stream every accepted file to the incoming folder concurrently
+    semaphore = asyncio.Semaphore(BULK_UPLOAD_CONCURRENCY)
+
+    async def stage(source):
+        async with semaphore:
+            if zip_file is not None:
+                def extract():
+                    with zip_file.open(source) as member:
+                        return ingest.stage_fileobj(member)
+                return await run_in_threadpool(extract)
+            return await ingest.stage_upload(source)
+
+    todo = []
+    for i, (e, plan) in enumerate(zip(entries, plans)):
+        if isinstance(plan, str):
+            results[i].update(status="error", detail=plan)
+        elif e.file not in sources:
+            results[i].update(status="error", detail="File not found in the upload")
+        else:
+            todo.append(i)
+
+    # each source is read once, however many entries name it (an UploadFile can't be
+    # read concurrently); the entries then each take their own reference on the blob
+    names = list(dict.fromkeys(entries[i].file for i in todo))
+    staged_files = await asyncio.gather(*(stage(sources[name]) for name in names), return_exceptions=True)
+    staged_by_name = dict(zip(names, staged_files))
+    try:
+        items, item_index = [], []
+        for i in todo:
+            staged = staged_by_name[entries[i].file]
+            if isinstance(staged, ingest.UploadTooLarge):
+                results[i].update(status="error", detail=str(staged))
+                continue
+            if isinstance(staged, BaseException):
+                raise staged
+            e = entries[i]
+            filename, replaced = plans[i]
+            new_report = models.Report(
+                site_name=e.site_name,
+                category=e.category,
+                file_name=filename,
+                file_type=e.file.split('.')[-1],
+                date=report_dates[i],
+                visibility=e.visibility.lower() if e.visibility else "shared"
+            )
+            items.append((staged, replaced, new_report))
+            item_index.append(i)
+
+        if items:
+            payloads = await run_in_threadpool(_commit_reports, db, items)
+            for i, payload in zip(item_index, payloads):
+                results[i].update(status="created", report=payload)
+    except Exception as e:
+        print("Bulk upload error:", e)
+        raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        for staged in staged_files:
+            if isinstance(staged, ingest.StagedFile):
+                staged.discard()
+        if zip_file is not None:
+            await run_in_threadpool(zip_file.close)
+
+    created = sum(1 for r in results if r["status"] == "created")
+    return {"created": created, "failed": len(results) - created, "results": results}
+
+
+# ============================================================
+# REPORT GENERATION JOBS
+# ============================================================
+class JobRequest(BaseModel):
+    kind: Literal["excel", "csv", "pdf"]
+    site_name: str
+    category: str
+    date: Optional[str] = None  # YYYY-MM-DD, defaults to today
+    visibility: Optional[str] = "shared"
+    rows: Optional[List[dict]] = None  # excel / csv
+    columns: Optional[List[str]] = None  # excel / csv, defaults to the first row's keys
+    html: Optional[str] = None  # pdf
+
+def _visible_job(db: Session, job_id: str, user: Principal):
+    job = db.get(models.Job, job_id)
+    # other users' jobs look like missing ones
+    if job is None or (job.owner_id != user.id and user.site_name != "admin"):
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+@app.post("/jobs", status_code=202, response_model=schemas.JobOut)
+def submit_job(req: JobRequest, db: Session = Depends(get_db), user: Principal = Depends(get_current_user)):
+    """Queue a report generation job; poll GET /jobs/{id}, then download GET /jobs/{id}/result.
+
+    The finished file is also registered as a normal report under site/category/date.
+    """
+    if user.site_name != "admin":
+        raise HTTPException(status_code=403, detail="Only admins can generate reports")
+    if req.kind == "pdf" and not req.html:
+        raise HTTPException(status_code=400, detail="html is required for pdf jobs")
+    if req.kind != "pdf" and req.rows is None:
+        raise HTTPException(status_code=400, detail="rows are required for excel and csv jobs")
+    if req.rows is not None and len(req.rows) > jobs.JOB_MAX_ROWS:
+        raise HTTPException(status_code=413, detail=f"A job can have at most {jobs.JOB_MAX_ROWS} rows")
+    visibility = (req.visibility or "shared").lower()
+    if visibility not in ["shared", "personal"]:
+        raise HTTPException(status_code=400, detail="visibility must be 'shared' or 'personal'")
+    try:
+        report_date = datetime.strptime(req.date, "%Y-%m-%d") if req.date and req.date.strip() else datetime.now()
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid date format. Use YYYY-MM-DD.")
+
+    payload = {"html": req.html} if req.kind == "pdf" else {"rows": req.rows, "columns": req.columns}
+    try:
+        return jobs.submit(db, req.kind, payload, req.site_name, req.category, report_date,
+                           visibility=visibility, owner_id=user.id)
+    except jobs.QueueFull as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "5"})
+
+@app.get("/jobs/{job_id}", response_model=schemas.JobOut)
+def get_job(job_id: str, db: Session = Depends(get_db), user: Principal = Depends(get_current_user)):
+    """Status of a generation job (its owner or an admin)."""
+    return _visible_job(db, job_id, user)
+
+@app.post("/jobs/{job_id}/link")
+def create_job_link(job_id: str, db: Session = Depends(get_db), user: Principal = Depends(get_current_user)):
+    """A short-lived ?token= that opens this job's /result."""
+    _visible_job(db, job_id, user)
+    return _link(user, f"job_id={job_id}")
+
+@app.get("/jobs/{job_id}/result")
+def get_job_result(job_id: str, db: Session = Depends(get_db), user: Principal = Depends(auth.get_current_user_header_or_link("job_id"))):
+    """Download the file a succeeded job generated (409 while it is queued/running or if it failed)."""
+    job = _visible_job(db, job_id, user)
+    if job.status != "succeeded":
+        raise HTTPException(status_code=409, detail=f"Job is {job.status}")
+    report = db.get(models.Report, job.report_id) if job.report_id else None
+    if report is None:
+        raise HTTPException(status_code=404, detail="The generated report has been deleted")
+    file_path = blobstore.report_file_path(report)
+    if not os.path.isfile(file_path):
+        raise HTTPException(status_code=404, detail="File missing on server")
+    return metrics.CountedFileResponse(
+        file_path,
+        media_type=mimetypes.guess_type(report.file_name)[0] or "application/octet-stream",
+        filename=report.file_name,
+    )
 
 # ============================================================
 # REPORT FILE ACCESS (DIRECT BY ID)
@@ -420,7 +859,7 @@ def get_report_file(report_id: int, db: Session = Depends(get_db)):
     if not report:
         raise HTTPException(status_code=404, detail="Report not found")
 
-    file_path = os.path.join(UPLOAD_FOLDER, report.file_name)
+    file_path = blobstore.report_file_path(report)
     if not os.path.exists(file_path):
         raise HTTPException(status_code=404, detail="File missing on server")
 
@@ -429,45 +868,217 @@ def get_report_file(report_id: int, db: Session = Depends(get_db)):
 # ============================================================
 # REPORT DATES (ALL UNIQUE DATES FOR A CATEGORY)
 # ============================================================
-@app.get("/report-dates/{site_name}/{category}")
-def get_report_dates(site_name: str, category: str, db: Session = Depends(get_db)):
-    """Return all unique report dates for a given site and category, including admin/global."""
-    
-    reports = (
-        db.query(models.Report)
-        .filter(
-            (
-                models.Report.site_name.ilike(site_name.lower()) |
-                models.Report.site_name.ilike("admin")
-            ),
-            models.Report.category.ilike(category.lower())
-        )
-        .all()
-    )
+@app.get("/report-dates/{site_name}/{category}", response_model=List[str])
+async def get_report_dates(site_name: str, category: str, request: Request, db=Depends(database.get_async_db), user: Principal = Depends(auth.get_current_user_async)):
+    """Return all unique report dates for a given site and category, including admin/global.
 
-    # Remove DB entries for missing files
-    cleaned = []
-    for r in reports:
-        file_path = os.path.join(UPLOAD_FOLDER, r.file_name)
-        if os.path.exists(file_path):
-            cleaned.append(r)
-        else:
-            db.delete(r)
-    db.commit()
+    Read-only: a single SELECT DISTINCT over the listing index. Rows whose files
+    are missing on disk are cleaned up by the reconciler (app.reconciler: background or CLI).
+    """
+    key = ("dates", models.normalize_key(site_name), models.normalize_key(category))
+    return await cached_listing(request, db, user, key, lambda: crud.avisible_report_dates(db, user, site_name, category))
 
-    # Rebuild unique date list
-    unique_dates = sorted(
-        {r.date.strftime("%Y-%m-%d") for r in cleaned},
-        reverse=True
-    )
+# ============================================================
+# DASHBOARD SUMMARY (LANDING PAGE, ONE ROUND TRIP)
+# ============================================================
+@app.get("/dashboard-summary", response_model=schemas.DashboardSummary)
+async def get_dashboard_summary(
+    request: Request,
+    site_name: Optional[str] = None,
+    db=Depends(database.get_async_db),
+    user: Principal = Depends(auth.get_current_user_async),
+):
+    """Per site (the user's allowed sites, or just `site_name`): report count, newest report
+    date, and the newest report and count of each category, including admin/global reports.
+
+    One SQL statement; cached and ETag'd like the listings, so concurrent landing page
+    views with the same visibility and sites share one result until the catalog changes.
+    """
+    requested = [site_name] if site_name else list(user.allowed_sites) or [user.site_name]
+    sites = sorted({models.normalize_key(s) for s in requested})
+    key = ("summary",) + tuple(sites)
+    # without site_name the sites come from the user's memberships, not the URL
+    return await cached_listing(request, db, user, key, lambda: crud.areport_summary(db, user, sites),
+                                scope=tuple(sites))
+
+# ============================================================
+# REPORT CALENDAR (COUNTS PER DATE AND CATEGORY)
+# ============================================================
+def _parse_day(value: Optional[str], name: str):
+    if value is None:
+        return None
+    try:
+        return datetime.strptime(value, "%Y-%m-%d").date()
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"Invalid {name} date format. Use YYYY-MM-DD.")
+
+@app.get("/report-calendar/{site_name}", response_model=schemas.ReportCalendar)
+async def get_report_calendar(
+    site_name: str,
+    request: Request,
+    start: Optional[str] = None,
+    end: Optional[str] = None,
+    db=Depends(database.get_async_db),
+    user: Principal = Depends(auth.get_current_user_async),
+):
+    """Report counts per calendar day and category (all categories), including admin/global.
+
+    One GROUP BY over the listing index with the /reports visibility rules; `start`
+    and `end` (YYYY-MM-DD, inclusive) bound the days. The result is column-wise:
+    dates[i], categories[i], counts[i] describe one cell, newest day first.
+    """
+    start_day, end_day = _parse_day(start, "start"), _parse_day(end, "end")
+    start_at = datetime.combine(start_day, datetime.min.time()) if start_day else None
+    end_at = datetime.combine(end_day, datetime.max.time()) if end_day else None
+    key = ("calendar", models.normalize_key(site_name), start_day, end_day)
+    return await cached_listing(request, db, user, key, lambda: crud.areport_calendar(
+        db, user, site_name, start_at, end_at))
+
+# ============================================================
+# ORPHAN RECONCILER (ADMIN ONLY)
+# ============================================================
+@app.get("/admin/reconciler")
+def get_reconciler_stats(user: Principal = Depends(get_current_user)):
+    """Cumulative counters from the background/CLI reconciler in this process."""
+    if user.site_name != "admin":
+        raise HTTPException(status_code=403, detail="Only admins can view reconciler stats")
+    return reconciler.get_stats()
+
+@app.post("/admin/reconciler/run")
+def run_reconciler(dry_run: bool = True, report_stray: bool = False, user: Principal = Depends(get_current_user)):
+    """Run one reconciliation pass now; defaults to a dry-run report."""
+    if user.site_name != "admin":
+        raise HTTPException(status_code=403, detail="Only admins can run the reconciler")
+    return reconciler.reconcile(dry_run=dry_run, report_stray=report_stray)
 
-    return unique_dates
+# ============================================================
+# DATABASE POOL STATS (ADMIN ONLY)
+# ============================================================
+@app.get("/admin/db-pool")
+def get_db_pool_stats(user: Principal = Depends(get_current_user)):
+    """Connection pool checkout/wait counters and the live pool state, for sizing DB_POOL_*."""
+    if user.site_name != "admin":
+        raise HTTPException(status_code=403, detail="Only admins can view pool stats")
+    return database.get_pool_stats(database.engine, database.async_engine and database.async_engine.sync_engine)
+
+# ============================================================
+# AUTH PRINCIPAL CACHE STATS (ADMIN ONLY)
+# ============================================================
+@app.get("/admin/auth-cache")
+def get_auth_cache_stats(user: Principal = Depends(get_current_user)):
+    """Hit/miss counters of the in-process user principal cache."""
+    if user.site_name != "admin":
+        raise HTTPException(status_code=403, detail="Only admins can view cache stats")
+    return principals.cache.stats()
+
+# ============================================================
+# LISTING CACHE STATS (ADMIN ONLY)
+# ============================================================
+@app.get("/admin/listing-cache")
+def get_listing_cache_stats(user: Principal = Depends(get_current_user)):
+    """Hit/miss/eviction counters of the catalog-versioned listing cache."""
+    if user.site_name != "admin":
+        raise HTTPException(status_code=403, detail="Only admins can view cache stats")
+    return catalog.results.stats()
+
+# ============================================================
+# PREVIEW POOL STATS (ADMIN ONLY)
+# ============================================================
+@app.get("/admin/previews")
+def get_preview_stats(user: Principal = Depends(get_current_user)):
+    """Queue depth and counters of the background preview renderer."""
+    if user.site_name != "admin":
+        raise HTTPException(status_code=403, detail="Only admins can view preview stats")
+    return previews.renderer.stats()
+
+# ============================================================
+# REPORT JOB STATS (ADMIN ONLY)
+# ============================================================
+@app.get("/admin/jobs")
+def get_job_stats(db: Session = Depends(get_db), user: Principal = Depends(get_current_user)):
+    """Job counts by status (all workers) and this process's runner counters."""
+    if user.site_name != "admin":
+        raise HTTPException(status_code=403, detail="Only admins can view job stats")
+    return {"jobs": jobs.status_counts(db), "runner": jobs.runner.stats()}
+
+# ============================================================
+# SEARCH INDEX STATS (ADMIN ONLY)
+# ============================================================
+@app.get("/admin/search-index")
+def get_search_index_stats(db: Session = Depends(get_db), user: Principal = Depends(get_current_user)):
+    """Indexed reports by extraction status, reports still waiting, and this process's indexer counters."""
+    if user.site_name != "admin":
+        raise HTTPException(status_code=403, detail="Only admins can view search index stats")
+    return {**search.index_status(db), "indexer": search.indexer.stats()}
+
+# ============================================================
+# PROMETHEUS METRICS
+# ============================================================
+@app.get("/metrics", include_in_schema=False)
+def get_metrics(request: Request):
+    """Request latency, status, SQL and file-transfer metrics of this worker (Prometheus text format).
+
+    Open by default like most scrape targets; set METRICS_TOKEN to require a bearer token.
+    """
+    if metrics.METRICS_TOKEN and request.headers.get("authorization") != f"Bearer {metrics.METRICS_TOKEN}":
+        raise HTTPException(status_code=401, detail="Invalid metrics token")
+    return Response(metrics.render(), media_type=metrics.CONTENT_TYPE)
+
+# ============================================================
+# REQUEST PROFILER (ADMIN ONLY)
+# ============================================================
+class ProfilerSettings(BaseModel):
+    sample_percent: Optional[float] = Field(None, ge=0, le=100)
+    slow_ms: Optional[float] = Field(None, ge=0)  # 0 turns slow-request capture off
+
+@app.get("/admin/profiler")
+def get_profiler_stats(user: Principal = Depends(get_current_user)):
+    """Profiler settings and counters of this worker (overhead: sampling time / time spent watching)."""
+    if user.site_name != "admin":
+        raise HTTPException(status_code=403, detail="Only admins can view the profiler")
+    return profiler.profiler.stats()
+
+@app.put("/admin/profiler")
+def configure_profiler(req: ProfilerSettings, user: Principal = Depends(get_current_user)):
+    """Switch profiling on or off for the worker that answers, without a restart."""
+    if user.site_name != "admin":
+        raise HTTPException(status_code=403, detail="Only admins can configure the profiler")
+    profiler.profiler.configure(sample_percent=req.sample_percent, slow_ms=req.slow_ms)
+    return profiler.profiler.stats()
+
+@app.get("/admin/profiles")
+def list_profiles(user: Principal = Depends(get_current_user)):
+    """Profiled requests in the ring buffer, newest first (without stacks and SQL)."""
+    if user.site_name != "admin":
+        raise HTTPException(status_code=403, detail="Only admins can view profiles")
+    return [{k: v for k, v in e.items() if k not in ("stacks", "statements")} for e in profiler.profiler.entries()]
+
+@app.get("/admin/profiles/flamegraph")
+def get_profiles_flamegraph(route: Optional[str] = None, profile_id: Optional[int] = None,
+                            user: Principal = Depends(get_current_user)):
+    """Collapsed stacks of the buffered profiles (all, one route template or one profile),
+    ready for flamegraph.pl or speedscope."""
+    if user.site_name != "admin":
+        raise HTTPException(status_code=403, detail="Only admins can view profiles")
+    entries = [e for e in profiler.profiler.entries()
+               if (route is None or e["route"] == route) and (profile_id is None or e["id"] == profile_id)]
+    return Response(profiler.profiler.collapsed(entries), media_type="text/plain")
+
+@app.get("/admin/profiles/{profile_id}")
+def get_profile(profile_id: int, user: Principal = Depends(get_current_user)):
+    """One profiled request with its stacks and SQL statements."""
+    if user.site_name != "admin":
+        raise HTTPException(status_code=403, detail="Only admins can view profiles")
+    entry = profiler.profiler.get(profile_id)
+    if entry is None:
+        raise HTTPException(status_code=404, detail="Profile not found (the buffer keeps the latest ones)")
+    return entry
 
 # ============================================================
 # DELETED REPORTS
 # ============================================================
 @app.delete("/delete-report/{report_id}")
-def delete_report(report_id: int, db: Session = Depends(get_db), user: models.User = Depends(get_current_user)):
+def delete_report(report_id: int, db: Session = Depends(get_db), user: Principal = Depends(get_current_user)):
     # Only admins allowed
     if user.site_name != "admin":
         raise HTTPException(status_code=403, detail="Only admins can delete reports")
@@ -476,16 +1087,11 @@ def delete_report(report_id: int, db: Session = Depends(get_db), user: models.Us
     if not report:
         raise HTTPException(status_code=404, detail="Report not found")
 
-    # Full file path
-    file_path = os.path.join(UPLOAD_FOLDER, report.file_name)
-
-    # Delete the file if it exists
-    if os.path.exists(file_path):
-        os.remove(file_path)
-    else:
-        print(f"⚠️ File {report.file_name} not found on disk")
-
-    # Remove from DB
+    # Remove from DB, then delete the blob if no other report shares it
+    blobstore.release_reports(db, [report])
+    crud.delete_report_dependents(db, [report.id])
     db.delete(report)
+    catalog.bump(db)
     db.commit()
+    blobstore.remove_report_files(db, [report])
     return {"detail": "Report deleted successfully"}
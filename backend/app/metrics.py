@@ -0,0 +1,294 @@
+# metrics.py
+"""Process metrics in the Prometheus text format, served on GET /metrics.
+
+- MetricsMiddleware times every request under its route template (e.g.
+  /reports/{site_name}/{category}, never the raw path, so label sets stay
+  bounded) and counts responses by status and requests in flight.
+- SQLAlchemy cursor events (database.configure_engine) count queries and DB
+  time, in total and per request: http_request_db_queries shows endpoints that
+  issue N+1 or unbounded queries. Queries run in the threadpool are attributed
+  to the request that started them (the context is copied into the thread).
+- Upload bytes are counted as they are staged (ingest.py), served file bytes
+  by CountedFileResponse.
+
+Only the standard library is used: an update is a lock and a few additions,
+and nothing is formatted until the endpoint is scraped. Each worker process
+keeps its own numbers, like the other in-process stats.
+"""
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+
+from starlette.responses import FileResponse
+
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() == "true"
+# When set, GET /metrics requires "Authorization: Bearer <METRICS_TOKEN>"
+METRICS_TOKEN = os.getenv("METRICS_TOKEN", "")
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+UNMATCHED_ROUTE = "<unmatched>"
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 250, 1000)
+DB_TIME_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 5.0)
+
+
+# ============================================================
+# METRIC TYPES
+# ============================================================
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(names, values, extra="") -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help_text: str, labels=()):
+        self.name = name
+        self.help = help_text
+        self.label_names = tuple(labels)
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def render(self):
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} {self.kind}"
+        with self._lock:
+            items = sorted(self._copy().items())
+        if not items and not self.label_names:
+            items = [((), self._zero())]
+        for key, value in items:
+            yield from self._samples(key, value)
+
+    def _copy(self):
+        return dict(self._values)
+
+    def _zero(self):
+        return 0
+
+    def _samples(self, key, value):
+        yield f"{self.name}{_labels(self.label_names, key)} {_number(value)}"
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, *labels):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def inc(self, amount=1, *labels):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def dec(self, amount=1, *labels):
+        self.inc(-amount, *labels)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, labels=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help_text, labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, *labels):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(labels)
+            if state is None:
+                # one slot per bucket plus +Inf, then the sum
+                state = self._values[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+            state[index] += 1
+            state[-1] += value
+
+    def _copy(self):
+        return {key: list(state) for key, state in self._values.items()}
+
+    def _zero(self):
+        return [0] * (len(self.buckets) + 1) + [0.0]
+
+    def _samples(self, key, state):
+        cumulative = 0
+        for bound, count in zip(self.buckets + (float("inf"),), state):
+            cumulative += count
+            le = 'le="' + _number(bound) + '"'
+            yield f"{self.name}_bucket{_labels(self.label_names, key, le)} {cumulative}"
+        yield f"{self.name}_sum{_labels(self.label_names, key)} {_number(state[-1])}"
+        yield f"{self.name}_count{_labels(self.label_names, key)} {cumulative}"
+
+
+REGISTRY = []
+
+
+def _register(metric):
+    REGISTRY.append(metric)
+    return metric
+
+
+def render() -> str:
+    """Every registered metric in the Prometheus text exposition format."""
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+# ============================================================
+# METRICS
+# ============================================================
+requests_total = _register(Counter(
+    "http_requests_total", "HTTP responses by route template and status.", ("method", "route", "status")))
+requests_in_progress = _register(Gauge(
+    "http_requests_in_progress", "HTTP requests being handled.", ("method",)))
+request_duration = _register(Histogram(
+    "http_request_duration_seconds", "Time from receiving a request to sending the last response byte.",
+    ("method", "route")))
+request_db_queries = _register(Histogram(
+    "http_request_db_queries", "SQL statements executed per request.", ("method", "route"), QUERY_COUNT_BUCKETS))
+request_db_seconds = _register(Histogram(
+    "http_request_db_seconds", "Time spent in SQL statements per request.", ("method", "route"), DB_TIME_BUCKETS))
+db_queries_total = _register(Counter(
+    "db_queries_total", "SQL statements executed by this process (requests and background workers)."))
+db_query_seconds_total = _register(Counter(
+    "db_query_seconds_total", "Time spent in SQL statements by this process."))
+upload_bytes_total = _register(Counter(
+    "upload_bytes_total", "Bytes of uploaded report files staged to disk."))
+file_bytes_sent_total = _register(Counter(
+    "file_bytes_sent_total", "Bytes of report and preview files served.", ("route",)))
+
+
+# ============================================================
+# SQL ACCOUNTING
+# ============================================================
+class RequestStats:
+    """SQL work done on behalf of one request.
+
+    `statements` stays None unless the profiler records this request's SQL
+    (profiler.py); it then keeps the first `statement_limit` (statement, seconds).
+    """
+
+    __slots__ = ("queries", "db_seconds", "statements", "statement_limit")
+
+    def __init__(self):
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.statements = None
+        self.statement_limit = 0
+
+
+current_request = ContextVar("metrics_request", default=None)
+
+
+def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if context is not None:
+        context._metrics_started = time.perf_counter()
+
+
+def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = getattr(context, "_metrics_started", None)
+    if started is None:
+        return
+    elapsed = time.perf_counter() - started
+    db_queries_total.inc()
+    db_query_seconds_total.inc(elapsed)
+    stats = current_request.get()
+    if stats is not None:
+        stats.queries += 1
+        stats.db_seconds += elapsed
+        if stats.statements is not None and len(stats.statements) < stats.statement_limit:
+            stats.statements.append((statement, elapsed))
+
+
+# ============================================================
+# REQUEST TIMING
+# ============================================================
+def route_template(scope) -> str:
+    route = scope.get("route")
+    return getattr(route, "path", None) or UNMATCHED_ROUTE
+
+
+class MetricsMiddleware:
+    """Pure ASGI middleware (no per-request Request/Response objects)."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not METRICS_ENABLED:
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        status = 500
+        stats = RequestStats()
+        token = current_request.set(stats)
+        requests_in_progress.inc(1, method)
+        started = time.perf_counter()
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - started
+            current_request.reset(token)
+            requests_in_progress.dec(1, method)
+            route = route_template(scope)
+            requests_total.inc(1, method, route, str(status))
+            request_duration.observe(elapsed, method, route)
+            request_db_queries.observe(stats.queries, method, route)
+            request_db_seconds.observe(stats.db_seconds, method, route)
+
+
+# ============================================================
+# FILE SERVING
+# ============================================================
+class CountedFileResponse(FileResponse):
+    """FileResponse that adds the bytes it sends to file_bytes_sent_total."""
+
+    async def __call__(self, scope, receive, send):
+        sent = 0
+        length = 0
+
+        async def send_wrapper(message):
+            nonlocal sent, length
+            if message["type"] == "http.response.start":
+                for name, value in message.get("headers", ()):
+                    if name == b"content-length":
+                        length = int(value)
+            elif message["type"] == "http.response.body":
+                sent += len(message.get("body", b""))
+            elif message["type"] == "http.response.pathsend":
+                # zero-copy: the server sends the whole (non-range) file
+                sent += length
+            await send(message)
+
+        try:
+            await super().__call__(scope, receive, send_wrapper)
+        finally:
+            if sent:
+                file_bytes_sent_total.inc(sent, route_template(scope))
@@ -0,0 +1,125 @@
+# migrate.py
+"""Explicit schema management step; run it once before starting the API workers.
+
+Run from the `backend/` folder:
+
+python -m app.migrate            # bring the database to the latest Alembic revision
+python -m app.migrate --check    # only report; exit code 1 if it is not current
+
+- A new database gets every table from the models (create_all) and is stamped
+  at the latest revision: the first migrations start from the pre-Alembic schema.
+- A database under Alembic is upgraded (`alembic upgrade head`).
+- A pre-Alembic database (tables but no alembic_version) is stamped at the
+  revision that matches the schema the API used to create on import, then
+  upgraded; the migrations add the newer tables and columns.
+
+Importing app.main never touches the schema. Its lifespan only checks that the
+database is current, or runs upgrade() once per worker with DB_AUTO_MIGRATE=true
+(single-process setups; concurrent workers should use the explicit step).
+"""
+import argparse
+import os
+import sys
+
+from sqlalchemy import inspect
+
+from . import models
+from .database import engine as default_engine
+
+DB_AUTO_MIGRATE = os.getenv("DB_AUTO_MIGRATE", "false").lower() == "true"
+
+# The schema the API created on import before Alembic (reports.site_name, no blobs)
+LEGACY_REVISION = "9d9d1af87b4e"
+
+BACKEND_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+
+
+def alembic_config(connection=None):
+    """Alembic config for this backend without alembic.ini, so the ini's logging
+    setup never replaces the server's. `connection` is used instead of DATABASE_URL."""
+    from alembic.config import Config
+
+    config = Config()
+    config.set_main_option("script_location", os.path.join(BACKEND_DIR, "alembic"))
+    config.attributes["connection"] = connection
+    return config
+
+
+def head_revision() -> str:
+    from alembic.script import ScriptDirectory
+
+    return ScriptDirectory.from_config(alembic_config()).get_current_head()
+
+
+def current_revision(connection):
+    from alembic.runtime.migration import MigrationContext
+
+    return MigrationContext.configure(connection).get_current_revision()
+
+
+def status(engine=default_engine) -> dict:
+    """{"current": revision or None, "head": latest revision, "tables": bool}"""
+    with engine.connect() as conn:
+        has_tables = inspect(conn).has_table("reports")
+        current = current_revision(conn)
+    return {"current": current, "head": head_revision(), "tables": has_tables}
+
+
+def _legacy_revision(conn):
+    """Revision matching a pre-Alembic database: the old create_all at import gave
+    reports its site_name column, which is where the first revision leaves it."""
+    columns = [c["name"] for c in inspect(conn).get_columns("reports")]
+    return LEGACY_REVISION if "site_name" in columns else None
+
+
+def upgrade(engine=default_engine) -> str:
+    """Bring the schema up to date (see the module docstring); returns what was done."""
+    from alembic import command
+
+    with engine.begin() as conn:
+        config = alembic_config(conn)
+        if current_revision(conn) is not None:
+            command.upgrade(config, "head")
+            return "upgraded"
+        if not inspect(conn).has_table("reports"):
+            models.Base.metadata.create_all(conn)
+            command.stamp(config, "head")
+            return "created"
+        # No create_all here: the migrations create the newer tables themselves and
+        # move data into them (users.allowed_sites -> user_sites)
+        revision = _legacy_revision(conn)
+        if revision is not None:
+            command.stamp(config, revision)
+        command.upgrade(config, "head")
+    return "legacy"
+
+
+def check_on_startup(engine=default_engine):
+    """Lifespan hook: migrate (DB_AUTO_MIGRATE) or just warn when the schema is behind."""
+    if DB_AUTO_MIGRATE:
+        print("Database schema:", upgrade(engine))
+        return
+    try:
+        state = status(engine)
+    except Exception as e:
+        print("Warning: could not check the database schema:", e)
+        return
+    if state["current"] != state["head"]:
+        print(f"Warning: database schema is at {state['current'] or 'no revision'}, "
+              f"latest is {state['head']} - run `python -m app.migrate`")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Create or upgrade the Report Portal database schema.")
+    parser.add_argument("--check", action="store_true", help="only report; exit code 1 if not at the latest revision")
+    args = parser.parse_args(argv)
+
+    if args.check:
+        state = status()
+        print(f"current: {state['current']}  head: {state['head']}")
+        sys.exit(0 if state["current"] == state["head"] else 1)
+    print("Database schema:", upgrade())
+
+
+if __name__ == "__main__":
+    main()
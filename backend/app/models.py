@@ -1,8 +1,15 @@
 # models.py
-from sqlalchemy import Column, Integer, String, ForeignKey, DateTime
+from datetime import datetime
+from sqlalchemy import DDL, Column, Integer, BigInteger, String, Text, ForeignKey, DateTime, Index, event
+from sqlalchemy.orm import relationship, validates
 from .database import Base
 
 
+def normalize_key(value):
+    """Canonical (trimmed, lowercase) form used for site_name/category lookups."""
+    return value.strip().lower() if isinstance(value, str) else value
+
+
 class User(Base):
     __tablename__ = "users"
 
@@ -12,16 +19,144 @@ class User(Base):
     # Main assigned site (personal / shared / admin)
     site_name = Column(String, nullable=False)
 
-    # NEW — comma-separated list of allowed sites
-    allowed_sites = Column(String, default="shared", nullable=False) 
+    # Sites the user may access, one user_sites row each (formerly a comma-separated column)
+    site_memberships = relationship(
+        "UserSite", back_populates="user", cascade="all, delete-orphan",
+        lazy="selectin", order_by="UserSite.site_name",
+    )
+
+    @property
+    def site_list(self):
+        return [m.site_name for m in self.site_memberships]
+
+    # Comma-separated view of the memberships, the format the old column (and /login) used
+    @property
+    def allowed_sites(self) -> str:
+        return ",".join(self.site_list)
+
+    @allowed_sites.setter
+    def allowed_sites(self, value):
+        """Replace the memberships from a comma-separated string or a list of site names."""
+        if isinstance(value, str):
+            value = value.split(",")
+        wanted = list(dict.fromkeys(normalize_key(s) for s in value or [] if s and s.strip()))
+        current = {m.site_name: m for m in self.site_memberships}
+        self.site_memberships = [current.get(s) or UserSite(site_name=s) for s in wanted]
+
+class UserSite(Base):
+    """Membership of a user in a site; access checks join on it instead of parsing strings."""
+    __tablename__ = "user_sites"
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    site_name = Column(String, primary_key=True)
+    user = relationship("User", back_populates="site_memberships")
+
+    # (user_id, site_name) is the primary key; this one answers "who can see site X"
+    __table_args__ = (Index("ix_user_sites_site_user", site_name, user_id),)
+
+    @validates("site_name")
+    def _normalize(self, key, value):
+        return normalize_key(value)
+
+class Blob(Base):
+    """One stored file, addressed by its SHA-256 and shared by every report with the same bytes."""
+    __tablename__ = "blobs"
+    sha256 = Column(String(64), primary_key=True)
+    size = Column(BigInteger, nullable=False)
+    # number of reports pointing at this blob; the file is deleted when it drops to 0
+    ref_count = Column(Integer, default=0, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+class CatalogVersion(Base):
+    """Single-row counter bumped by every write that changes what the report listings return."""
+    __tablename__ = "catalog_version"
+    id = Column(Integer, primary_key=True)
+    version = Column(BigInteger, default=0, nullable=False)
 
 class Report(Base):
     __tablename__ = "reports"
     id = Column(Integer, primary_key=True, index=True)
     site_name = Column(String, nullable=False)   # changed from site_id
     category = Column(String, nullable=False)
-    file_name = Column(String, nullable=False)
+    file_name = Column(String, nullable=False, index=True)  # logical name, also used by /uploaded_reports
     file_type = Column(String, nullable=False)
     date = Column(DateTime, nullable=False)
     # Visibility tag: 'shared' (visible to shared/personal/admin) or 'personal' (visible to personal/admin)
     visibility = Column(String, default="shared", nullable=False)
+    # Stored content (see blobstore.py); NULL only for legacy rows still in the flat folder
+    blob_sha256 = Column(String(64), ForeignKey("blobs.sha256"), nullable=True, index=True)
+
+    # Listing queries filter on equality of the canonical lowercase keys and
+    # order by (date, id) descending, so a page per site is read straight off
+    # these indexes: no table scan and no sort.
+    __table_args__ = (
+        Index("ix_reports_site_category_date", site_name, category, date.desc(), id.desc(), visibility),
+        Index("ix_reports_site_date", site_name, date.desc(), id.desc(), visibility),
+    )
+
+    @validates("site_name", "category", "visibility")
+    def _normalize(self, key, value):
+        # Always store the canonical lowercase form so filters can use "=" instead of ILIKE
+        return normalize_key(value)
+
+class ReportText(Base):
+    """Text extracted from a report's file, for full-text search (see search.py)."""
+    __tablename__ = "report_text"
+    report_id = Column(Integer, ForeignKey("reports.id", ondelete="CASCADE"), primary_key=True)
+    body = Column(Text, default="", nullable=False)
+    # indexed | empty (no text found) | unsupported (file type / missing extractor) | failed
+    status = Column(String, default="indexed", nullable=False)
+    indexed_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+# The search index itself is dialect specific, so it is created next to the table:
+# SQLite: an FTS5 external-content table over report_text, kept in sync by triggers.
+# PostgreSQL: a generated tsvector column with a GIN index.
+REPORT_TEXT_SQLITE_DDL = [
+    "CREATE VIRTUAL TABLE report_text_fts USING fts5("
+    "body, content='report_text', content_rowid='report_id', tokenize='unicode61 remove_diacritics 2')",
+    "CREATE TRIGGER report_text_ai AFTER INSERT ON report_text BEGIN "
+    "INSERT INTO report_text_fts(rowid, body) VALUES (new.report_id, new.body); END",
+    "CREATE TRIGGER report_text_ad AFTER DELETE ON report_text BEGIN "
+    "INSERT INTO report_text_fts(report_text_fts, rowid, body) VALUES ('delete', old.report_id, old.body); END",
+    "CREATE TRIGGER report_text_au AFTER UPDATE ON report_text BEGIN "
+    "INSERT INTO report_text_fts(report_text_fts, rowid, body) VALUES ('delete', old.report_id, old.body); "
+    "INSERT INTO report_text_fts(rowid, body) VALUES (new.report_id, new.body); END",
+]
+REPORT_TEXT_POSTGRES_DDL = [
+    "ALTER TABLE report_text ADD COLUMN tsv tsvector "
+    "GENERATED ALWAYS AS (to_tsvector('simple', body)) STORED",
+    "CREATE INDEX ix_report_text_tsv ON report_text USING GIN (tsv)",
+]
+for _statement in REPORT_TEXT_SQLITE_DDL:
+    event.listen(ReportText.__table__, "after_create", DDL(_statement).execute_if(dialect="sqlite"))
+for _statement in REPORT_TEXT_POSTGRES_DDL:
+    event.listen(ReportText.__table__, "after_create", DDL(_statement).execute_if(dialect="postgresql"))
+event.listen(ReportText.__table__, "before_drop",
+             DDL("DROP TABLE IF EXISTS report_text_fts").execute_if(dialect="sqlite"))
+
+class Job(Base):
+    """A report-generation job (see jobs.py); the row is the durable queue entry."""
+    __tablename__ = "jobs"
+    id = Column(String(32), primary_key=True)  # uuid4 hex, so ids can't be guessed
+    kind = Column(String, nullable=False)  # excel | csv | pdf
+    # queued -> running -> succeeded | failed
+    status = Column(String, default="queued", nullable=False)
+    payload = Column(Text, nullable=True)  # JSON input, dropped once the job finishes
+    # where the output is registered as a Report
+    site_name = Column(String, nullable=False)
+    category = Column(String, nullable=False)
+    date = Column(DateTime, nullable=False)
+    visibility = Column(String, default="shared", nullable=False)
+    owner_id = Column(Integer, ForeignKey("users.id", ondelete="SET NULL"), nullable=True)
+    report_id = Column(Integer, ForeignKey("reports.id", ondelete="SET NULL"), nullable=True)
+    error = Column(Text, nullable=True)
+    attempts = Column(Integer, default=0, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    started_at = Column(DateTime, nullable=True)
+    finished_at = Column(DateTime, nullable=True)
+
+    # workers pick the oldest queued job
+    __table_args__ = (Index("ix_jobs_status_created", status, created_at),)
+
+    @validates("site_name", "category", "visibility")
+    def _normalize(self, key, value):
+        return normalize_key(value)
@@ -0,0 +1,49 @@
+# pools.py
+"""Executors for the background work that runs beside the request threads.
+
+Password hashing, preview rendering and text extraction each run in their own
+lazily created pool (processes by default, threads when the kind is
+"thread"), and report jobs get one process each. Processes are always started
+with spawn: never fork a process that is running the server's threads. The
+modules whose functions run in these workers keep their imports light, so a
+spawned worker starts without importing the database layer.
+"""
+import multiprocessing
+import threading
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+
+SPAWN = multiprocessing.get_context("spawn")
+
+
+def make_executor(kind: str, workers: int, thread_name_prefix: str) -> Executor:
+    """A process pool for kind "process", otherwise a thread pool."""
+    if kind == "process":
+        return ProcessPoolExecutor(workers, mp_context=SPAWN)
+    return ThreadPoolExecutor(workers, thread_name_prefix=thread_name_prefix)
+
+
+class LazyExecutor:
+    """An executor created on first use; shutdown() cancels queued work and allows a restart."""
+
+    def __init__(self, kind: str, workers: int, thread_name_prefix: str):
+        self.kind = kind
+        self.workers = workers
+        self.thread_name_prefix = thread_name_prefix
+        self._executor = None
+        self._lock = threading.Lock()
+
+    @property
+    def running(self) -> bool:
+        return self._executor is not None
+
+    def get(self) -> Executor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = make_executor(self.kind, self.workers, self.thread_name_prefix)
+            return self._executor
+
+    def shutdown(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True, cancel_futures=True)
@@ -0,0 +1,212 @@
+# previews.py
+"""Lightweight report previews, rendered in the background after upload.
+
+PDFs get a first-page PNG, images a downscaled PNG, and CSV/XLSX files their
+first PREVIEW_MAX_ROWS rows as JSON. A preview is stored next to its blob
+(blobs/<aa>/<sha256>.preview.<png|json>) and, like the blob, never changes.
+
+Rendering runs in a small dedicated executor with a bounded queue (the same
+shape as hashing.py), so an upload only pays for queueing the job. If the
+queue is full, or the server restarted before a job ran, the preview is queued
+again the first time it is requested; until it exists clients fall back to the
+full file. PDF and image rendering need the optional PyMuPDF and Pillow
+packages; without them those types simply have no preview. At import time this
+module only depends on the standard library (and pools.py).
+"""
+import csv
+import io
+import itertools
+import json
+import os
+import threading
+from functools import partial
+
+from . import pools
+
+PREVIEW_EXECUTOR = os.getenv("PREVIEW_EXECUTOR", "process")  # process | thread
+PREVIEW_WORKERS = int(os.getenv("PREVIEW_WORKERS", "2"))  # 0 disables rendering
+PREVIEW_MAX_PENDING = int(os.getenv("PREVIEW_MAX_PENDING", str(PREVIEW_WORKERS * 32)))
+PREVIEW_MAX_ROWS = int(os.getenv("PREVIEW_MAX_ROWS", "50"))
+PREVIEW_MAX_PX = int(os.getenv("PREVIEW_MAX_PX", "800"))  # longest side of PNG previews
+
+IMAGE_TYPES = {"png", "jpg", "jpeg", "gif", "bmp", "webp", "tif", "tiff"}
+MEDIA_TYPES = {"png": "image/png", "json": "application/json"}
+
+
+# ============================================================
+# RENDERERS (run in the pool workers)
+# ============================================================
+def _render_pdf(src: str) -> bytes:
+    import fitz  # PyMuPDF
+
+    with fitz.open(src) as doc:
+        page = doc[0]
+        zoom = PREVIEW_MAX_PX / max(page.rect.width, page.rect.height)
+        return page.get_pixmap(matrix=fitz.Matrix(zoom, zoom)).tobytes("png")
+
+
+def _render_image(src: str) -> bytes:
+    from PIL import Image
+
+    with Image.open(src) as img:
+        img.thumbnail((PREVIEW_MAX_PX, PREVIEW_MAX_PX))
+        if img.mode not in ("1", "L", "LA", "P", "RGB", "RGBA"):
+            img = img.convert("RGBA")
+        out = io.BytesIO()
+        img.save(out, format="PNG", optimize=True)
+        return out.getvalue()
+
+
+def _table(columns, rows, sheet=None) -> bytes:
+    table = {"columns": columns, "rows": rows[:PREVIEW_MAX_ROWS], "truncated": len(rows) > PREVIEW_MAX_ROWS}
+    if sheet is not None:
+        table["sheet"] = sheet
+    # spreadsheet cells may hold dates/decimals
+    return json.dumps(table, default=str, separators=(",", ":")).encode()
+
+
+def _render_csv(src: str) -> bytes:
+    with open(src, newline="", encoding="utf-8-sig", errors="replace") as f:
+        # header + the shown rows + one to tell whether the file goes on
+        rows = list(itertools.islice(csv.reader(f), PREVIEW_MAX_ROWS + 2))
+    return _table(rows[0] if rows else [], rows[1:])
+
+
+def _render_xlsx(src: str) -> bytes:
+    from openpyxl import load_workbook
+
+    # a file object: openpyxl rejects paths without an .xlsx extension, like blob paths
+    with open(src, "rb") as f:
+        workbook = load_workbook(f, read_only=True, data_only=True)
+        try:
+            sheet = workbook.worksheets[0]
+            rows = [list(r) for r in sheet.iter_rows(max_row=PREVIEW_MAX_ROWS + 2, values_only=True)]
+            title = sheet.title
+        finally:
+            workbook.close()
+    columns = ["" if v is None else str(v) for v in rows[0]] if rows else []
+    return _table(columns, rows[1:], sheet=title)
+
+
+def _renderer(file_type: str):
+    file_type = (file_type or "").lower()
+    if file_type == "pdf":
+        return _render_pdf
+    if file_type in IMAGE_TYPES:
+        return _render_image
+    if file_type == "csv":
+        return _render_csv
+    if file_type in ("xlsx", "xlsm"):
+        return _render_xlsx
+    return None
+
+
+def preview_format(file_type: str):
+    """'png', 'json' or None (no preview for this file type)."""
+    renderer = _renderer(file_type)
+    if renderer is None:
+        return None
+    return "json" if renderer in (_render_csv, _render_xlsx) else "png"
+
+
+def render(file_type: str, src: str, dest: str) -> bool:
+    """Render one preview to `dest`; False when the renderer's optional package is missing."""
+    try:
+        data = _renderer(file_type)(src)
+    except ImportError:
+        return False
+    # write then rename, so a reader never sees half a preview
+    tmp = f"{dest}.{os.getpid()}-{threading.get_ident()}.tmp"
+    try:
+        with open(tmp, "wb") as f:
+            f.write(data)
+        os.replace(tmp, dest)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+    return True
+
+
+# ============================================================
+# WORKER POOL
+# ============================================================
+class PreviewRenderer:
+    """Bounded, de-duplicating queue in front of the preview executor."""
+
+    def __init__(self, kind: str = PREVIEW_EXECUTOR, workers: int = PREVIEW_WORKERS,
+                 max_pending: int = PREVIEW_MAX_PENDING):
+        self.kind = kind
+        self.workers = workers
+        self.max_pending = max_pending
+        self._pool = pools.LazyExecutor(kind, workers, "preview")
+        self._lock = threading.Lock()
+        self._in_flight = set()
+        # don't keep re-rendering files that failed, or types we have no renderer for
+        self._failed = set()
+        self._unavailable = set()
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+
+    def shutdown(self):
+        self._pool.shutdown()
+
+    def submit(self, file_type: str, src: str, dest: str) -> bool:
+        """Queue a render of `src` into `dest`. Returns True if it is queued (now or
+        already); False if there will be no preview (unsupported type, failed
+        before, rendering disabled) or the queue is full."""
+        file_type = (file_type or "").lower()
+        if self.workers <= 0 or _renderer(file_type) is None:
+            return False
+        with self._lock:
+            if dest in self._in_flight:
+                return True
+            if file_type in self._unavailable or dest in self._failed:
+                return False
+            if len(self._in_flight) >= self.max_pending:
+                self.rejected += 1
+                return False
+            self._in_flight.add(dest)
+        try:
+            future = self._pool.get().submit(render, file_type, src, dest)
+        except BaseException:
+            with self._lock:
+                self._in_flight.discard(dest)
+            raise
+        future.add_done_callback(partial(self._done, file_type, dest))
+        return True
+
+    def _done(self, file_type, dest, future):
+        error = None if future.cancelled() else future.exception()
+        with self._lock:
+            self._in_flight.discard(dest)
+            if future.cancelled():
+                return
+            if error is not None:
+                self.failed += 1
+                if len(self._failed) >= 10_000:
+                    self._failed.clear()
+                self._failed.add(dest)
+            elif future.result():
+                self.completed += 1
+            else:
+                self._unavailable.add(file_type)
+        if error is not None:
+            print(f"⚠️ Preview rendering failed for {os.path.basename(dest)}: {error}")
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "executor": self.kind,
+                "workers": self.workers,
+                "max_pending": self.max_pending,
+                "pending": len(self._in_flight),
+                "completed": self.completed,
+                "failed": self.failed,
+                "rejected": self.rejected,
+                "unavailable_types": sorted(self._unavailable),
+            }
+
+
+renderer = PreviewRenderer()
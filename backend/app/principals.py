@@ -0,0 +1,171 @@
+# principals.py
+"""In-process TTL/LRU cache of authenticated user principals.
+
+get_current_user used to load the `users` row on every authenticated request.
+The fields the endpoints need (id, email, site_name, allowed sites) are kept
+here as an immutable Principal keyed by the token subject, so the database is
+only queried on a miss.
+
+Entries are dropped whenever a User is inserted, updated or deleted through the
+ORM in this process (including bulk query updates/deletes). Changes made by
+another process - e.g. `create_admin.py` run from a shell - are picked up once
+the entry expires, so AUTH_CACHE_TTL_SECONDS bounds how stale a principal can be.
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Optional, Tuple
+
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+
+from . import models
+
+AUTH_CACHE_SIZE = int(os.getenv("AUTH_CACHE_SIZE", "10000"))
+AUTH_CACHE_TTL_SECONDS = float(os.getenv("AUTH_CACHE_TTL_SECONDS", "30"))  # 0 disables the cache
+
+
+@dataclass(frozen=True)
+class Principal:
+    """What the endpoints need to know about the authenticated user."""
+    id: int
+    email: str
+    site_name: str
+    allowed_sites: Tuple[str, ...]
+
+    @classmethod
+    def from_user(cls, user: models.User) -> "Principal":
+        return cls(id=user.id, email=user.email, site_name=user.site_name,
+                   allowed_sites=tuple(user.site_list))
+
+
+class PrincipalCache:
+    """Bounded LRU map of subject -> Principal with a per-entry TTL."""
+
+    def __init__(self, maxsize: int = AUTH_CACHE_SIZE, ttl: float = AUTH_CACHE_TTL_SECONDS):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl > 0 and self.maxsize > 0
+
+    def get(self, key: str) -> Optional[Principal]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] > time.monotonic():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return None
+
+    def put(self, key: str, principal: Principal):
+        if not self.enabled:
+            return
+        with self._lock:
+            self._entries[key] = (principal, time.monotonic() + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, *keys):
+        with self._lock:
+            for key in keys:
+                if self._entries.pop(key, None) is not None:
+                    self.invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            self.invalidations += len(self._entries)
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+                "ttl_seconds": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+                "invalidations": self.invalidations,
+            }
+
+
+cache = PrincipalCache()
+
+
+# ============================================================
+# INVALIDATION (ORM events)
+# ============================================================
+_PENDING_KEY = "principal_cache_invalidations"
+
+
+def _user_keys(user) -> set:
+    """Current and previous email of a User (the email itself may be what changed)."""
+    history = inspect(user).attrs.email.history
+    return {e for e in (user.email, *history.deleted) if e}
+
+
+def _on_user_change(mapper, connection, user):
+    keys = _user_keys(user)
+    cache.invalidate(*keys)
+    # drop them again on commit, in case a request re-cached the old row meanwhile
+    session = Session.object_session(user)
+    if session is not None:
+        session.info.setdefault(_PENDING_KEY, set()).update(keys)
+
+
+def _on_orm_execute(state):
+    # query(User).update(...) / delete(UserSite) etc. bypass the mapper events: drop everything
+    if (state.is_update or state.is_delete) and any(m.class_ in (models.User, models.UserSite) for m in state.all_mappers):
+        cache.clear()
+        state.session.info[_PENDING_KEY + "_all"] = True
+
+
+def _after_commit(session):
+    keys = session.info.pop(_PENDING_KEY, None)
+    if session.info.pop(_PENDING_KEY + "_all", False):
+        cache.clear()
+    elif keys:
+        cache.invalidate(*keys)
+
+
+def _after_rollback(session, previous_transaction):
+    if previous_transaction.nested:
+        return  # a savepoint rollback leaves the outer transaction's changes pending
+    session.info.pop(_PENDING_KEY, None)
+    session.info.pop(_PENDING_KEY + "_all", None)
+
+
+def _on_membership_change(mapper, connection, membership):
+    attr = inspect(membership).attrs.user
+    # a membership removed from user.site_memberships has already lost its parent
+    users = [u for u in (attr.loaded_value, *attr.history.deleted) if isinstance(u, models.User)]
+    for user in users:
+        _on_user_change(mapper, connection, user)
+    if not users:
+        # parent not loaded: we can't tell whose principal it is
+        cache.clear()
+        session = Session.object_session(membership)
+        if session is not None:
+            session.info[_PENDING_KEY + "_all"] = True
+
+
+for _event in ("after_insert", "after_update", "after_delete"):
+    event.listen(models.User, _event, _on_user_change)
+    event.listen(models.UserSite, _event, _on_membership_change)
+event.listen(Session, "do_orm_execute", _on_orm_execute)
+event.listen(Session, "after_commit", _after_commit)
+event.listen(Session, "after_soft_rollback", _after_rollback)
@@ -0,0 +1,343 @@
+# profiler.py
+"""Opt-in sampling profiler for slow or randomly chosen requests.
+
+Off unless PROFILE_SAMPLE_PERCENT (a share of requests) or PROFILE_SLOW_MS (any
+request that ends up slower) is set; admins can change both per worker at
+runtime with PUT /admin/profiler. Watched requests are sampled by one
+background thread every PROFILE_INTERVAL_MS:
+
+- while the request's code runs on the event loop, the loop thread's stack
+  above ProfilerMiddleware;
+- while it is suspended, its coroutine await chain, followed by the stack of
+  the worker thread running its threadpool call (found by the function's code
+  object), or the object it is waiting on.
+
+Each kept request (its collapsed stacks, SQL statements and timings) goes into
+a ring buffer of PROFILE_BUFFER_SIZE entries; GET /admin/profiles/flamegraph
+returns them in the collapsed-stack format read by flamegraph.pl and speedscope.
+
+The sampler measures its own time and stretches the pause between samples so
+it never uses more than PROFILE_MAX_OVERHEAD of one CPU, however many requests
+are watched. Query strings and SQL parameters are never recorded.
+"""
+import functools
+import os
+import random
+import sys
+import threading
+import time
+from collections import deque
+from datetime import datetime, timedelta, timezone
+
+import anyio.to_thread
+
+from . import metrics
+
+PROFILE_SAMPLE_PERCENT = float(os.getenv("PROFILE_SAMPLE_PERCENT", "0"))  # 0-100
+PROFILE_SLOW_MS = float(os.getenv("PROFILE_SLOW_MS", "0"))  # 0: no slow-request capture
+PROFILE_INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", "10"))
+PROFILE_MAX_OVERHEAD = float(os.getenv("PROFILE_MAX_OVERHEAD", "0.02"))  # share of one CPU
+PROFILE_BUFFER_SIZE = int(os.getenv("PROFILE_BUFFER_SIZE", "50"))  # kept requests
+PROFILE_MAX_STATEMENTS = int(os.getenv("PROFILE_MAX_STATEMENTS", "200"))  # per request
+
+MAX_STACK_DEPTH = 256
+STATEMENT_MAX_CHARS = 2000
+_RUN_SYNC_CODE = anyio.to_thread.run_sync.__code__
+
+
+# ============================================================
+# STACKS
+# ============================================================
+_labels = {}
+
+
+def _label(frame) -> str:
+    code = frame.f_code
+    label = _labels.get(code)
+    if label is None:
+        name = getattr(code, "co_qualname", code.co_name)
+        label = _labels[code] = f"{frame.f_globals.get('__name__', '?')}.{name}"
+    return label
+
+
+def _thread_stack(top, root, first):
+    """Labels of the frames above `root` up to `top` (outermost first), or None
+    when `root` is not on that stack. Empty while `root` runs its own code
+    rather than `first`, the frame of the app it wraps."""
+    labels = []
+    frame, child = top, None
+    while frame is not None and len(labels) < MAX_STACK_DEPTH:
+        if frame is root:
+            labels.reverse()
+            return labels if child is first else []
+        labels.append(_label(frame))
+        frame, child = frame.f_back, frame
+    return None
+
+
+def _await_chain(coro):
+    """Frames of a suspended coroutine chain (outermost first) and the innermost awaited object."""
+    frames = []
+    while coro is not None and len(frames) < MAX_STACK_DEPTH:
+        frame = getattr(coro, "cr_frame", None) or getattr(coro, "gi_frame", None) or getattr(coro, "ag_frame", None)
+        if frame is None:
+            break
+        frames.append(frame)
+        coro = getattr(coro, "cr_await", None) or getattr(coro, "gi_yieldfrom", None) or getattr(coro, "ag_await", None)
+    return frames, coro
+
+
+def _function_code(func):
+    while isinstance(func, functools.partial):
+        func = func.func
+    return getattr(getattr(func, "__func__", func), "__code__", None)
+
+
+def _worker_stack(code, frames, claimed):
+    """Stack of the first unclaimed thread running `code`, from that frame up."""
+    for thread_id, top in frames.items():
+        if thread_id in claimed:
+            continue
+        labels = []
+        frame = top
+        while frame is not None and len(labels) < MAX_STACK_DEPTH:
+            labels.append(_label(frame))
+            if frame.f_code is code:
+                claimed.add(thread_id)
+                labels.reverse()
+                return labels
+            frame = frame.f_back
+    return None
+
+
+class _Watched:
+    """A request being sampled."""
+
+    __slots__ = ("frame", "coro", "thread_id", "stacks")
+
+    def __init__(self, frame, coro):
+        self.frame = frame
+        self.coro = coro
+        self.thread_id = threading.get_ident()
+        self.stacks = {}
+
+
+# ============================================================
+# PROFILER
+# ============================================================
+class Profiler:
+    """Sampling thread plus the ring buffer of kept requests."""
+
+    def __init__(self, sample_percent: float = PROFILE_SAMPLE_PERCENT, slow_ms: float = PROFILE_SLOW_MS,
+                 interval_ms: float = PROFILE_INTERVAL_MS, max_overhead: float = PROFILE_MAX_OVERHEAD,
+                 buffer_size: int = PROFILE_BUFFER_SIZE, max_statements: int = PROFILE_MAX_STATEMENTS):
+        self.sample_percent = sample_percent
+        self.slow_ms = slow_ms
+        self.interval = interval_ms / 1000
+        self.max_overhead = max_overhead
+        self.max_statements = max_statements
+        self._buffer = deque(maxlen=buffer_size)
+        self._active = set()
+        self._thread = None
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self._next_id = 0
+        self.samples = 0
+        self.captured = 0
+        self.sampling_seconds = 0.0
+        self.active_seconds = 0.0
+
+    @property
+    def enabled(self) -> bool:
+        return self.sample_percent > 0 or self.slow_ms > 0
+
+    def configure(self, sample_percent=None, slow_ms=None):
+        if sample_percent is not None:
+            self.sample_percent = sample_percent
+        if slow_ms is not None:
+            self.slow_ms = slow_ms
+
+    def choose(self) -> bool:
+        """Whether a new request is profiled regardless of its latency."""
+        return self.sample_percent > 0 and random.random() * 100 < self.sample_percent
+
+    def watch(self, frame, coro) -> _Watched:
+        watched = _Watched(frame, coro)
+        with self._lock:
+            self._active.add(watched)
+            if self._thread is None:
+                self._stop.clear()
+                self._thread = threading.Thread(target=self._loop, name="request-profiler", daemon=True)
+                self._thread.start()
+        self._wake.set()
+        return watched
+
+    def finish(self, watched, scope, status, seconds, stats, chosen):
+        """Stop sampling `watched`; keep it when it was chosen or is slow."""
+        with self._lock:
+            self._active.discard(watched)
+        duration_ms = seconds * 1000
+        slow = self.slow_ms > 0 and duration_ms >= self.slow_ms
+        if not (chosen or slow):
+            return
+        stacks = dict(watched.stacks)
+        statements = stats.statements or []
+        entry = {
+            "method": scope["method"],
+            "path": scope["path"],
+            "route": metrics.route_template(scope),
+            "status": status,
+            "reason": "slow" if slow else "sampled",
+            "started_at": (datetime.now(timezone.utc) - timedelta(seconds=seconds)).isoformat(timespec="milliseconds"),
+            "duration_ms": round(duration_ms, 3),
+            "samples": sum(stacks.values()),
+            "queries": stats.queries,
+            "db_ms": round(stats.db_seconds * 1000, 3),
+            "statements": [{"sql": sql[:STATEMENT_MAX_CHARS], "ms": round(elapsed * 1000, 3)}
+                           for sql, elapsed in statements],
+            "statements_truncated": stats.queries > len(statements),
+            "stacks": stacks,
+        }
+        with self._lock:
+            self._next_id += 1
+            entry["id"] = self._next_id
+            self._buffer.append(entry)
+            self.captured += 1
+
+    def stop(self, timeout: float = 5.0):
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def _loop(self):
+        while not self._stop.is_set():
+            self._wake.clear()
+            if not self._active:
+                self._wake.wait()
+                continue
+            started = time.perf_counter()
+            self._sample()
+            cost = time.perf_counter() - started
+            # hard cap: sampling time / elapsed time never exceeds max_overhead
+            pause = max(self.interval, cost / self.max_overhead - cost)
+            self._stop.wait(pause)
+            with self._lock:
+                self.sampling_seconds += cost
+                self.active_seconds += time.perf_counter() - started
+
+    def _sample(self):
+        frames = sys._current_frames()
+        frames.pop(threading.get_ident(), None)
+        with self._lock:
+            active = list(self._active)
+        claimed = set()
+        for watched in active:
+            stack = _thread_stack(frames.get(watched.thread_id), watched.frame, watched.coro.cr_frame)
+            if stack is None:
+                stack = self._suspended_stack(watched, frames, claimed)
+            if stack:
+                key = ";".join(stack)
+                watched.stacks[key] = watched.stacks.get(key, 0) + 1
+                self.samples += 1
+
+    def _suspended_stack(self, watched, frames, claimed):
+        chain, awaited = _await_chain(watched.coro)
+        labels = [_label(frame) for frame in chain]
+        for frame in reversed(chain):
+            if frame.f_code is _RUN_SYNC_CODE:
+                code = _function_code(frame.f_locals.get("func"))
+                worker = _worker_stack(code, frames, claimed) if code is not None else None
+                return labels + ["(threadpool)"] + (worker or [])
+        if awaited is not None:
+            labels.append(f"(await {type(awaited).__name__})")
+        return labels
+
+    # ============================================================
+    # READING THE BUFFER
+    # ============================================================
+    def entries(self) -> list:
+        """Kept requests, newest first."""
+        with self._lock:
+            return list(reversed(self._buffer))
+
+    def get(self, profile_id: int):
+        return next((e for e in self.entries() if e["id"] == profile_id), None)
+
+    def collapsed(self, entries) -> str:
+        """Collapsed stacks ("frame;frame;frame count" lines), rooted at "METHOD route"."""
+        merged = {}
+        for entry in entries:
+            root = f"{entry['method']} {entry['route']}"
+            for stack, count in entry["stacks"].items():
+                key = f"{root};{stack}" if stack else root
+                merged[key] = merged.get(key, 0) + count
+        return "".join(f"{stack} {count}\n" for stack, count in sorted(merged.items()))
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "enabled": self.enabled,
+                "sample_percent": self.sample_percent,
+                "slow_ms": self.slow_ms,
+                "interval_ms": self.interval * 1000,
+                "max_overhead": self.max_overhead,
+                "watching": len(self._active),
+                "buffered": len(self._buffer),
+                "captured": self.captured,
+                "samples": self.samples,
+                "overhead": round(self.sampling_seconds / self.active_seconds, 4) if self.active_seconds else 0.0,
+            }
+
+
+profiler = Profiler()
+
+
+# ============================================================
+# MIDDLEWARE
+# ============================================================
+class ProfilerMiddleware:
+    """Pure ASGI middleware; a pass-through unless the profiler is enabled.
+
+    Sits inside MetricsMiddleware so it shares the request's SQL accounting.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not profiler.enabled:
+            await self.app(scope, receive, send)
+            return
+        chosen = profiler.choose()
+        if not chosen and profiler.slow_ms <= 0:
+            await self.app(scope, receive, send)
+            return
+
+        stats = metrics.current_request.get()
+        token = None
+        if stats is None:
+            # METRICS_ENABLED=false: no outer middleware set one up
+            stats = metrics.RequestStats()
+            token = metrics.current_request.set(stats)
+        stats.statements = []
+        stats.statement_limit = profiler.max_statements
+        status = 500
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        coro = self.app(scope, receive, send_wrapper)
+        watched = profiler.watch(sys._getframe(), coro)
+        started = time.perf_counter()
+        try:
+            await coro
+        finally:
+            profiler.finish(watched, scope, status, time.perf_counter() - started, stats, chosen)
+            if token is not None:
+                metrics.current_request.reset(token)
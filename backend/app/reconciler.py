@@ -0,0 +1,242 @@
+# reconciler.py
+"""Incremental reconciliation between `reports` rows and stored files.
+
+Replaces the old full-table `cleanup_missing_reports.py` pass and the inline
+cleanup that used to run inside GET /report-dates. The upload folder and the
+blob store are listed once with os.scandir, then `reports` is walked by id in
+small batches; each batch is its own short transaction and batches are rate
+limited so live traffic keeps the database.
+
+Run once from the `backend/` folder:
+
+python -m app.reconciler --dry-run --report-stray
+
+or set RECONCILE_INTERVAL_SECONDS to run it in the background of the API process.
+"""
+import argparse
+import os
+import threading
+import time
+from dataclasses import dataclass, field, asdict
+from datetime import datetime
+
+from sqlalchemy import delete, func, select
+
+from . import models, blobstore, catalog, crud
+from .database import SessionLocal, UPLOAD_FOLDER
+
+RECONCILE_INTERVAL_SECONDS = float(os.getenv("RECONCILE_INTERVAL_SECONDS", "0"))  # 0 disables the background loop
+RECONCILE_BATCH_SIZE = int(os.getenv("RECONCILE_BATCH_SIZE", "500"))
+RECONCILE_MAX_BATCHES_PER_SECOND = float(os.getenv("RECONCILE_MAX_BATCHES_PER_SECOND", "5"))
+RECONCILE_DRY_RUN = os.getenv("RECONCILE_DRY_RUN", "false").lower() == "true"
+
+
+@dataclass
+class ReconcileResult:
+    dry_run: bool
+    files_on_disk: int = 0
+    rows_scanned: int = 0
+    orphans_found: int = 0
+    orphans_deleted: int = 0
+    stray_files: int = 0
+    orphan_file_names: list = field(default_factory=list)
+    stray_file_names: list = field(default_factory=list)
+    started_at: str = ""
+    duration_seconds: float = 0.0
+
+
+# Cumulative counters for the process, exposed on GET /admin/reconciler
+_stats_lock = threading.Lock()
+stats = {
+    "runs": 0,
+    "rows_scanned": 0,
+    "orphans_found": 0,
+    "orphans_deleted": 0,
+    "stray_files": 0,
+    "errors": 0,
+    "last_run": None,
+    "last_error": None,
+}
+
+
+def list_upload_folder(folder: str) -> set:
+    """Names of the regular files directly under `folder` (single scandir pass)."""
+    try:
+        with os.scandir(folder) as entries:
+            return {e.name for e in entries if e.is_file(follow_symlinks=False)}
+    except FileNotFoundError:
+        return set()
+
+
+def reconcile(
+    session_factory=SessionLocal,
+    folder: str = UPLOAD_FOLDER,
+    batch_size: int = RECONCILE_BATCH_SIZE,
+    max_batches_per_second: float = RECONCILE_MAX_BATCHES_PER_SECOND,
+    dry_run: bool = False,
+    report_stray: bool = False,
+) -> ReconcileResult:
+    """Delete `reports` rows whose file is gone; optionally list files no row references."""
+    result = ReconcileResult(dry_run=dry_run, started_at=datetime.now().isoformat(timespec="seconds"))
+    t0 = time.monotonic()
+    min_interval = 1.0 / max_batches_per_second if max_batches_per_second > 0 else 0.0
+
+    # Snapshot the highest id *before* listing the folder: uploads write the file
+    # before committing the row, so every row up to this id already has its file
+    # in the listing if it exists at all. Newer rows are left for the next run.
+    with session_factory() as db:
+        max_id = db.execute(select(func.max(models.Report.id))).scalar() or 0
+    on_disk = list_upload_folder(folder)
+    blob_folder = os.path.join(folder, "blobs")
+    blobs_on_disk = blobstore.list_blobs_on_disk(blob_folder)
+    result.files_on_disk = len(on_disk) + len(blobs_on_disk)
+    referenced = set()
+
+    def is_missing(row):
+        if row.blob_sha256:
+            return (row.blob_sha256 not in blobs_on_disk
+                    and not os.path.exists(os.path.join(blob_folder, row.blob_sha256[:2], row.blob_sha256)))
+        return row.file_name not in on_disk and not os.path.exists(os.path.join(folder, row.file_name))
+
+    last_id = 0
+    while last_id < max_id:
+        batch_started = time.monotonic()
+        with session_factory() as db:
+            rows = db.execute(
+                select(models.Report.id, models.Report.file_name, models.Report.blob_sha256)
+                .where(models.Report.id > last_id, models.Report.id <= max_id)
+                .order_by(models.Report.id)
+                .limit(batch_size)
+            ).all()
+            if not rows:
+                break
+            last_id = rows[-1].id
+            result.rows_scanned += len(rows)
+            if report_stray:
+                referenced.update(r.blob_sha256 or r.file_name for r in rows)
+
+            # Candidates are re-checked: the file may have been (re)written since the scan
+            orphans = [r for r in rows if is_missing(r)]
+            result.orphans_found += len(orphans)
+            result.orphan_file_names.extend(r.file_name for r in orphans)
+            if orphans and not dry_run:
+                blobstore.release_reports(db, orphans)
+                crud.delete_report_dependents(db, [r.id for r in orphans])
+                db.execute(delete(models.Report).where(models.Report.id.in_([r.id for r in orphans])))
+                catalog.bump(db)
+                db.commit()
+                result.orphans_deleted += len(orphans)
+
+        # Rate limit so the reconciler never hogs the database
+        elapsed = time.monotonic() - batch_started
+        if elapsed < min_interval:
+            time.sleep(min_interval - elapsed)
+
+    if report_stray:
+        with session_factory() as db:
+            # rows committed while we were scanning still count as references
+            newer = db.execute(
+                select(models.Report.file_name, models.Report.blob_sha256).where(models.Report.id > max_id)
+            ).all()
+            referenced.update(r.blob_sha256 or r.file_name for r in newer)
+        # legacy flat files are reported by name, blob files as blobs/<sha256>
+        result.stray_file_names = sorted(on_disk - referenced) + sorted(
+            f"blobs/{sha}" for sha in blobs_on_disk - referenced
+        )
+        result.stray_files = len(result.stray_file_names)
+
+    result.duration_seconds = round(time.monotonic() - t0, 3)
+    _record(result)
+    return result
+
+
+def _record(result: ReconcileResult):
+    with _stats_lock:
+        stats["runs"] += 1
+        stats["rows_scanned"] += result.rows_scanned
+        stats["orphans_found"] += result.orphans_found
+        stats["orphans_deleted"] += result.orphans_deleted
+        stats["stray_files"] += result.stray_files
+        last = asdict(result)
+        # keep the exposed counters small; the full lists are in the CLI/POST output
+        last["orphan_file_names"] = last["orphan_file_names"][:100]
+        last["stray_file_names"] = last["stray_file_names"][:100]
+        stats["last_run"] = last
+
+
+def get_stats() -> dict:
+    with _stats_lock:
+        return dict(stats)
+
+
+# ============================================================
+# BACKGROUND LOOP (inside the API process)
+# ============================================================
+_stop_event = threading.Event()
+_thread = None
+
+
+def _loop(interval: float, dry_run: bool):
+    while not _stop_event.wait(interval):
+        try:
+            reconcile(dry_run=dry_run)
+        except Exception as e:
+            print("Reconciler error:", e)
+            with _stats_lock:
+                stats["errors"] += 1
+                stats["last_error"] = str(e)
+
+
+def start_background(interval: float = RECONCILE_INTERVAL_SECONDS, dry_run: bool = RECONCILE_DRY_RUN):
+    """Start the periodic reconciler thread (no-op when interval <= 0)."""
+    global _thread
+    if interval <= 0 or (_thread is not None and _thread.is_alive()):
+        return
+    _stop_event.clear()
+    _thread = threading.Thread(target=_loop, args=(interval, dry_run), name="report-reconciler", daemon=True)
+    _thread.start()
+
+
+def stop_background(timeout: float = 5.0):
+    global _thread
+    _stop_event.set()
+    if _thread is not None:
+        _thread.join(timeout)
+        _thread = None
+
+
+# ============================================================
+# CLI
+# ============================================================
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Reconcile report rows with files in the upload folder.")
+    parser.add_argument("--dry-run", action="store_true", help="only report what would be deleted")
+    parser.add_argument("--report-stray", action="store_true", help="also list files no report references")
+    parser.add_argument("--batch-size", type=int, default=RECONCILE_BATCH_SIZE)
+    parser.add_argument("--max-batches-per-second", type=float, default=RECONCILE_MAX_BATCHES_PER_SECOND)
+    parser.add_argument("--loop", type=float, metavar="SECONDS", help="keep running every SECONDS")
+    args = parser.parse_args(argv)
+
+    while True:
+        result = reconcile(
+            batch_size=args.batch_size,
+            max_batches_per_second=args.max_batches_per_second,
+            dry_run=args.dry_run,
+            report_stray=args.report_stray,
+        )
+        verb = "Would delete" if args.dry_run else "Deleted"
+        for name in result.orphan_file_names:
+            print(f"{verb} missing file DB entry: {name}")
+        for name in result.stray_file_names:
+            print(f"Stray file (no report row): {name}")
+        print(
+            f"Scanned {result.rows_scanned} rows / {result.files_on_disk} files in {result.duration_seconds}s: "
+            f"{result.orphans_found} orphans, {result.orphans_deleted} deleted, {result.stray_files} stray files"
+        )
+        if not args.loop:
+            break
+        time.sleep(args.loop)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,165 @@
+# schemas.py
+"""Response models and the fast JSON encoder used for report listings.
+
+Listings select only the ReportOut columns and hand plain dicts to dumps(), which
+uses orjson when it is installed (pydantic-core's encoder otherwise). That skips
+both ORM entity loading and jsonable_encoder's per-value introspection, which
+dominated CPU time for responses with thousands of rows.
+"""
+from datetime import datetime
+from typing import List, Optional
+
+import pydantic_core
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel, ConfigDict
+
+try:
+    import orjson
+except ImportError:  # optional speed-up
+    orjson = None
+
+
+# ============================================================
+# REPORTS
+# ============================================================
+class ReportOut(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
+    id: int
+    site_name: str
+    category: str
+    file_name: str
+    file_type: str
+    date: datetime
+    visibility: str
+    blob_sha256: Optional[str] = None
+
+
+# Columns selected by the listing queries, in response order
+REPORT_FIELDS = tuple(ReportOut.model_fields)
+
+
+class ReportPage(BaseModel):
+    items: List[ReportOut]
+    next_cursor: Optional[str] = None
+
+
+class ReportCalendar(BaseModel):
+    # parallel arrays, one entry per (day, category) with reports
+    dates: List[str]
+    categories: List[str]
+    counts: List[int]
+
+
+class CategorySummary(BaseModel):
+    category: str
+    count: int
+    latest: ReportOut
+
+
+class SiteSummary(BaseModel):
+    site_name: str
+    total: int
+    latest_date: Optional[datetime] = None
+    categories: List[CategorySummary]
+
+
+class DashboardSummary(BaseModel):
+    sites: List[SiteSummary]
+
+
+class SearchHit(ReportOut):
+    # matching text around the hit, terms wrapped in [ ]
+    snippet: Optional[str] = None
+
+
+class SearchPage(BaseModel):
+    items: List[SearchHit]
+    next_offset: Optional[int] = None
+
+
+# ============================================================
+# USERS
+# ============================================================
+class UserOut(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
+    id: int
+    email: str
+    site_name: str
+    allowed_sites: str  # comma-separated, as the frontend stores it
+
+
+class LoginResponse(BaseModel):
+    access_token: str
+    token_type: str
+    user: UserOut
+
+
+class CreateAccountResponse(BaseModel):
+    message: str
+    access_token: str
+    token_type: str
+    allowed_sites: List[str]
+
+
+# ============================================================
+# UPLOADS
+# ============================================================
+class UploadResult(BaseModel):
+    id: int
+    file_name: str
+    site_name: str
+    category: str
+    date: str  # YYYY-MM-DD
+    visibility: str
+    size: int
+    sha256: str
+    deduplicated: bool
+
+
+class UploadResponse(BaseModel):
+    message: str
+    report: UploadResult
+
+
+# ============================================================
+# REPORT GENERATION JOBS
+# ============================================================
+class JobOut(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
+    id: str
+    kind: str
+    status: str  # queued | running | succeeded | failed
+    site_name: str
+    category: str
+    date: datetime
+    visibility: str
+    report_id: Optional[int] = None  # the generated Report, once succeeded
+    error: Optional[str] = None
+    attempts: int
+    created_at: datetime
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+
+
+# ============================================================
+# JSON ENCODING
+# ============================================================
+def dumps(content) -> bytes:
+    """Serialize plain data (dicts, lists, datetimes) to JSON bytes."""
+    if orjson is not None:
+        # anything orjson doesn't know (models, Decimal, ...) goes through pydantic
+        return orjson.dumps(content, default=pydantic_core.to_jsonable_python)
+    return pydantic_core.to_json(content)
+
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse rendered with dumps() instead of json.dumps; bytes are taken as
+    already-encoded JSON (e.g. a cached listing body)."""
+
+    def render(self, content) -> bytes:
+        if isinstance(content, bytes):
+            return content
+        return dumps(content)
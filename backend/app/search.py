@@ -0,0 +1,191 @@
+# search.py
+"""Full-text search index over report contents.
+
+Uploads never extract text themselves: they only wake the indexer, a
+background thread that picks up reports without a `report_text` row (newest
+first), extracts their text in a small executor (extract.py) and stores it in
+short transactions. A backfill of existing reports is the same loop, so it
+also runs from the command line:
+
+python -m app.search
+
+The database keeps the actual index in sync with `report_text` (an FTS5 table
+on SQLite, a tsvector column with a GIN index on PostgreSQL; see models.py),
+and crud.search_stmt() queries it with the listing visibility rules.
+"""
+import argparse
+import os
+import threading
+
+from sqlalchemy import delete, func, select
+from sqlalchemy.exc import IntegrityError
+
+from . import blobstore, extract, models, pools
+from .database import SessionLocal
+
+SEARCH_INDEX_WORKERS = int(os.getenv("SEARCH_INDEX_WORKERS", "1"))  # 0: no background indexing
+SEARCH_INDEX_EXECUTOR = os.getenv("SEARCH_INDEX_EXECUTOR", "process")  # process | thread
+SEARCH_INDEX_BATCH_SIZE = int(os.getenv("SEARCH_INDEX_BATCH_SIZE", "20"))
+SEARCH_INDEX_INTERVAL_SECONDS = float(os.getenv("SEARCH_INDEX_INTERVAL_SECONDS", "60"))
+
+
+def index_status(db) -> dict:
+    """Indexed reports by extraction status, and how many reports are not indexed yet."""
+    by_status = dict(db.execute(
+        select(models.ReportText.status, func.count()).group_by(models.ReportText.status)
+    ).all())
+    reports = db.execute(select(func.count()).select_from(models.Report)).scalar()
+    return {"reports": by_status, "pending": max(reports - sum(by_status.values()), 0)}
+
+
+class SearchIndexer:
+    """Background thread that indexes reports missing from `report_text`."""
+
+    def __init__(self, session_factory=SessionLocal, workers: int = SEARCH_INDEX_WORKERS,
+                 kind: str = SEARCH_INDEX_EXECUTOR, batch_size: int = SEARCH_INDEX_BATCH_SIZE,
+                 interval: float = SEARCH_INDEX_INTERVAL_SECONDS):
+        self.session_factory = session_factory
+        self.workers = workers
+        self.kind = kind
+        self.batch_size = batch_size
+        self.interval = interval
+        self._pool = pools.LazyExecutor(kind, max(workers, 1), "search-index")
+        self._thread = None
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self.indexed = 0
+        self.empty = 0
+        self.unsupported = 0
+        self.failed = 0
+        self.errors = 0
+
+    def start(self):
+        if self.workers <= 0 or self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._loop, name="search-indexer", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 5.0):
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+        self._pool.shutdown()
+
+    def wake(self):
+        self._wake.set()
+
+    def _loop(self):
+        while not self._stop.is_set():
+            self._wake.clear()
+            try:
+                done = self.run_once()
+            except Exception as e:
+                print("Search indexer error:", e)
+                with self._lock:
+                    self.errors += 1
+                done = 0
+            # a full batch means there is probably more to do
+            if done < self.batch_size:
+                self._wake.wait(self.interval)
+
+    def run_once(self) -> int:
+        """Index one batch of unindexed reports; returns how many were handled."""
+        with self.session_factory() as db:
+            rows = db.execute(
+                select(models.Report.id, models.Report.file_type, models.Report.file_name,
+                       models.Report.blob_sha256)
+                .outerjoin(models.ReportText, models.ReportText.report_id == models.Report.id)
+                .where(models.ReportText.report_id.is_(None))
+                .order_by(models.Report.id.desc())
+                .limit(self.batch_size)
+            ).all()
+            # no connection is held while the files are read
+            db.rollback()
+        if not rows:
+            return 0
+
+        executor = self._pool.get()
+        futures = [executor.submit(extract.extract_text, r.file_type, blobstore.report_file_path(r)) for r in rows]
+        results = []
+        for r, future in zip(rows, futures):
+            try:
+                status, body = future.result()
+            except Exception as e:
+                print(f"⚠️ Text extraction failed for report {r.id}: {e}")
+                status, body = "failed", ""
+            results.append((r.id, status, body))
+
+        with self.session_factory() as db:
+            try:
+                db.add_all(models.ReportText(report_id=report_id, body=body, status=status)
+                           for report_id, status, body in results)
+                # rows of reports deleted in the meantime (SQLite does not cascade)
+                db.execute(delete(models.ReportText).where(
+                    ~select(models.Report.id).where(models.Report.id == models.ReportText.report_id).exists()
+                ))
+                db.commit()
+            except IntegrityError:
+                # another API process indexed some of these first
+                db.rollback()
+                return len(rows)
+        with self._lock:
+            for _, status, _ in results:
+                setattr(self, status, getattr(self, status) + 1)
+        return len(rows)
+
+    def index_all(self) -> int:
+        """Index every report missing from the index (backfill); returns the count."""
+        total = 0
+        while True:
+            done = self.run_once()
+            total += done
+            if done < self.batch_size:
+                return total
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "executor": self.kind,
+                "workers": self.workers,
+                "indexed": self.indexed,
+                "empty": self.empty,
+                "unsupported": self.unsupported,
+                "failed": self.failed,
+                "errors": self.errors,
+            }
+
+
+indexer = SearchIndexer()
+
+
+# ============================================================
+# CLI
+# ============================================================
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Backfill the report full-text search index.")
+    parser.add_argument("--retry", choices=["unsupported", "failed", "all"],
+                        help="first drop rows with this status (e.g. after installing PyMuPDF) so they are redone")
+    parser.add_argument("--batch-size", type=int, default=SEARCH_INDEX_BATCH_SIZE)
+    args = parser.parse_args(argv)
+
+    if args.retry:
+        with SessionLocal() as db:
+            stmt = delete(models.ReportText)
+            if args.retry != "all":
+                stmt = stmt.where(models.ReportText.status == args.retry)
+            db.execute(stmt)
+            db.commit()
+    backfill = SearchIndexer(workers=max(SEARCH_INDEX_WORKERS, 1), batch_size=args.batch_size)
+    try:
+        total = backfill.index_all()
+    finally:
+        backfill.stop()
+    print(f"Indexed {total} reports: {backfill.stats()}")
+
+
+if __name__ == "__main__":
+    main()
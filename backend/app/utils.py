@@ -1,11 +1,134 @@
 # utils.py
-import pandas as pd
-import pdfkit
-from datetime import datetime
+import csv
+import itertools
+import os
+from datetime import date, datetime, time
+from decimal import Decimal
+
+# pandas and pdfkit are imported on first use, so importing the app stays cheap
+# Up to this many rows generate_excel_report() keeps the pandas DataFrame path;
+# bigger (or unsized) inputs are streamed with write_rows()
+DATAFRAME_MAX_ROWS = int(os.getenv("DATAFRAME_MAX_ROWS", "10000"))
+
+# Written as-is; anything else goes through _excel_cell()
+_EXCEL_TYPES = {str, int, float, bool, Decimal, date, type(None)}
+
+
+def _row_values(row, columns):
+    """One output row as a list: dicts by key, SQLAlchemy Rows/tuples as-is, ORM objects by attribute."""
+    if isinstance(row, dict):
+        return [row.get(c) for c in columns]
+    if isinstance(row, (list, tuple)) or hasattr(row, "_fields"):
+        return list(row)
+    return [getattr(row, c) for c in columns]
+
+
+def _columns_of(row):
+    if isinstance(row, dict):
+        return list(row)
+    if hasattr(row, "_fields"):  # sqlalchemy Row
+        return list(row._fields)
+    return None
+
+
+def _excel_cell(value):
+    # Excel has no timezones and openpyxl refuses unknown types
+    if isinstance(value, (datetime, time)):
+        return value.isoformat() if value.tzinfo is not None else value
+    return str(value)
+
+
+def write_rows(rows, file_path, columns=None, sheet_title="Report"):
+    """Stream rows into an .xlsx or .csv file in constant memory; returns the row count.
+
+    `rows` is any iterable (a generator, or a SQLAlchemy result such as
+    `db.execute(stmt.execution_options(yield_per=1000))`) of dicts, Rows, tuples
+    or ORM objects. The header is `columns`, or the keys/fields of the first row;
+    ORM objects need `columns` to know which attributes to write.
+    """
+    rows = iter(rows)
+    first = next(rows, None)
+    if first is not None:
+        if columns is None:
+            columns = _columns_of(first)
+            if columns is None:
+                raise ValueError("columns are required for rows that are not dicts or Rows")
+        rows = itertools.chain([first], rows)
+    columns = list(columns or [])
+
+    count = 0
+    if file_path.lower().endswith(".csv"):
+        with open(file_path, "w", newline="", encoding="utf-8") as f:
+            writer = csv.writer(f)
+            writer.writerow(columns)
+            for row in rows:
+                writer.writerow(_row_values(row, columns))
+                count += 1
+        return count
+
+    from openpyxl import Workbook
+
+    # write-only mode streams each row to a temp file instead of keeping cells in memory
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet(sheet_title)
+    sheet.append(columns)
+    for row in rows:
+        # checked up front: a failed append() would break the write-only sheet
+        sheet.append([v if type(v) in _EXCEL_TYPES else _excel_cell(v) for v in _row_values(row, columns)])
+        count += 1
+    workbook.save(file_path)
+    return count
+
 
 def generate_excel_report(data, file_path):
-    df = pd.DataFrame(data)
-    df.to_excel(file_path, index=False)
+    """Write `data` (dicts) to an Excel file: pandas for small lists, streamed otherwise."""
+    if isinstance(data, (list, tuple)) and len(data) <= DATAFRAME_MAX_ROWS:
+        import pandas as pd  # heavy; only needed here
+
+        df = pd.DataFrame(data)
+        df.to_excel(file_path, index=False)
+        return
+    write_rows(data, file_path)
+
+
+def generate_csv_report(rows, file_path, columns=None):
+    """Stream rows to a CSV file (see write_rows); returns the row count."""
+    return write_rows(rows, file_path, columns)
+
+
+def __getattr__(name):
+    # `utils.pdfkit` imports pdfkit the first time it is used
+    if name == "pdfkit":
+        import pdfkit
+
+        globals()["pdfkit"] = pdfkit
+        return pdfkit
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
 
 def generate_pdf_report(html_content, file_path):
+    pdfkit = globals().get("pdfkit") or __getattr__("pdfkit")
     pdfkit.from_string(html_content, file_path)
+
+
+# Output extension of each generate_report() kind
+REPORT_KINDS = {"excel": "xlsx", "csv": "csv", "pdf": "pdf"}
+
+
+def generate_report(kind, payload, file_path):
+    """Generate one report file from a job payload (see jobs.py).
+
+    excel/csv: {"rows": [...], "columns": [...] (optional)}; pdf: {"html": "..."}.
+    """
+    if kind == "pdf":
+        generate_pdf_report(payload["html"], file_path)
+    elif kind == "excel":
+        rows = payload["rows"]
+        if payload.get("columns") or len(rows) > DATAFRAME_MAX_ROWS:
+            write_rows(rows, file_path, payload.get("columns"))
+        else:
+            generate_excel_report(rows, file_path)
+    elif kind == "csv":
+        write_rows(payload["rows"], file_path, payload.get("columns"))
+    else:
+        raise ValueError(f"Unknown report kind: {kind}")
@@ -0,0 +1,122 @@
+"""
+Run from the `backend/` folder:
+
+python -m benchmarks.bench_export                  # 1,000,000 rows
+python -m benchmarks.bench_export --rows 200000 --modes csv xlsx
+
+Builds a throwaway SQLite reports table and exports it three ways, each in a
+fresh process so peak memory (ru_maxrss) is measured per mode:
+
+- dataframe: the old path - load every row, build a pandas DataFrame, to_excel
+- xlsx: utils.write_rows() fed from a yield_per query, openpyxl write-only mode
+- csv: utils.write_rows() fed from a yield_per query
+"""
+
+import argparse
+import json
+import os
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import create_engine, insert, select
+from sqlalchemy.orm import Session
+
+from app import models
+
+MODES = ("dataframe", "xlsx", "csv")
+
+
+def populate(engine, rows):
+    rnd = random.Random(42)
+    start = datetime(2015, 1, 1)
+    models.Base.metadata.create_all(engine)
+    with engine.begin() as conn:
+        for offset in range(0, rows, 50_000):
+            conn.execute(insert(models.Report.__table__), [
+                {
+                    "site_name": f"site_{rnd.randrange(50):02d}",
+                    "category": rnd.choice(["macd", "rsi", "stochastic"]),
+                    "file_name": f"report_{i}.pdf",
+                    "file_type": "pdf",
+                    "date": start + timedelta(minutes=i),
+                    "visibility": "shared",
+                }
+                for i in range(offset, min(offset + 50_000, rows))
+            ])
+
+
+def max_rss_mib():
+    # kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def export(mode, db_path, out_dir):
+    """Runs in the child process; prints one JSON result line."""
+    from app import utils
+
+    engine = create_engine("sqlite:///" + db_path)
+    r = models.Report
+    stmt = select(r.id, r.site_name, r.category, r.file_name, r.date, r.visibility).order_by(r.id)
+    if mode == "dataframe":
+        import pandas  # noqa: F401  (imported before the baseline, like the streaming modes' openpyxl)
+    else:
+        import openpyxl  # noqa: F401
+    baseline = max_rss_mib()
+
+    t0 = time.perf_counter()
+    with Session(engine) as db:
+        if mode == "dataframe":
+            rows = [dict(row._mapping) for row in db.execute(stmt)]
+            utils.DATAFRAME_MAX_ROWS = len(rows)
+            path = os.path.join(out_dir, "dataframe.xlsx")
+            utils.generate_excel_report(rows, path)
+            count = len(rows)
+        else:
+            path = os.path.join(out_dir, f"stream.{mode}")
+            count = utils.write_rows(db.execute(stmt.execution_options(yield_per=5000)), path)
+    elapsed = time.perf_counter() - t0
+    print(json.dumps({
+        "rows": count,
+        "seconds": elapsed,
+        "peak_mib": max_rss_mib(),
+        "growth_mib": max_rss_mib() - baseline,
+        "file_mib": os.path.getsize(path) / 2**20,
+    }))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--modes", nargs="+", choices=MODES, default=list(MODES))
+    parser.add_argument("--child", choices=MODES, help=argparse.SUPPRESS)
+    parser.add_argument("--db", help=argparse.SUPPRESS)
+    parser.add_argument("--out", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        export(args.child, args.db, args.out)
+        return
+
+    tmp = tempfile.mkdtemp(prefix="export_bench_")
+    db_path = os.path.join(tmp, "bench.sqlite")
+    populate(create_engine("sqlite:///" + db_path), args.rows)
+
+    print(f"{args.rows} rows, one process per mode\n")
+    print(f"{'mode':<12}{'seconds':>10}{'rows/s':>12}{'peak RSS (MiB)':>16}{'growth (MiB)':>14}{'file (MiB)':>12}")
+    for mode in args.modes:
+        out = subprocess.run(
+            [sys.executable, "-m", "benchmarks.bench_export", "--child", mode, "--db", db_path, "--out", tmp],
+            check=True, capture_output=True, text=True,
+        ).stdout
+        r = json.loads(out.strip().splitlines()[-1])
+        print(f"{mode:<12}{r['seconds']:>10.1f}{r['rows'] / r['seconds']:>12,.0f}{r['peak_mib']:>16.0f}"
+              f"{r['growth_mib']:>14.0f}{r['file_mib']:>12.1f}")
+
+
+if __name__ == "__main__":
+    main()
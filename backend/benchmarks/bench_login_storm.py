@@ -0,0 +1,126 @@
+"""
+Run from the `backend/` folder:
+
+python -m benchmarks.bench_login_storm                 # 200 concurrent logins
+python -m benchmarks.bench_login_storm --logins 500 --workers 4
+
+Fires a burst of concurrent /login requests at the app (in-process, over
+ASGI) while a second client keeps polling a report listing, and reports the
+listing latency during the storm. Runs twice: with bcrypt in the shared
+request threadpool (the old inline behaviour) and with the dedicated hashing
+pool and its bounded queue.
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import tempfile
+import time
+
+_tmp = tempfile.mkdtemp(prefix="login_storm_")
+os.environ["DATABASE_URL"] = "sqlite:///" + os.path.join(_tmp, "bench.sqlite")
+os.environ["UPLOAD_FOLDER"] = os.path.join(_tmp, "uploads")
+os.environ.setdefault("AUTH_CACHE_TTL_SECONDS", "0")  # every listing request pays the full auth path
+
+import httpx
+from starlette.concurrency import run_in_threadpool
+
+from app import auth, hashing, models
+from app.main import app
+from app.database import SessionLocal, engine
+
+PASSWORD = "correct horse battery staple"
+
+
+class InlineHasher(hashing.PasswordHasher):
+    """The old behaviour: bcrypt in the request threadpool, no queue limit."""
+
+    def __init__(self):
+        super().__init__(kind="inline", workers=0, max_pending=10**9)
+
+    async def run(self, fn, *args):
+        return await run_in_threadpool(fn, *args)
+
+    def shutdown(self):
+        pass
+
+
+def setup_users(logins):
+    models.Base.metadata.create_all(bind=engine)
+    hashed = auth.get_password_hash(PASSWORD)
+    with SessionLocal() as db:
+        db.add_all(models.User(email=f"trader{i}@example.com", hashed_password=hashed, site_name="shared",
+                               allowed_sites="shared") for i in range(logins))
+        db.add(models.User(email="reader@example.com", hashed_password=hashed, site_name="shared",
+                           allowed_sites="shared"))
+        db.commit()
+    return {"Authorization": "Bearer " + auth.create_access_token({"sub": "reader@example.com"})}
+
+
+async def storm(hasher, logins, reader_headers):
+    hashing.hasher = hasher
+    # raise_app_exceptions=False: a pool timeout is a 500, not an aborted benchmark
+    transport = httpx.ASGITransport(app=app, raise_app_exceptions=False)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        done = asyncio.Event()
+        latencies = []
+        listing_errors = []
+
+        async def poll_listing():
+            while not done.is_set():
+                t0 = time.perf_counter()
+                resp = await client.get("/reports/shared/macd", headers=reader_headers)
+                latencies.append((time.perf_counter() - t0) * 1000)
+                if resp.status_code != 200:
+                    listing_errors.append(resp.status_code)
+
+        async def login(i):
+            resp = await client.post("/login", json={"email": f"trader{i}@example.com", "password": PASSWORD})
+            return resp.status_code
+
+        poller = asyncio.create_task(poll_listing())
+        t0 = time.perf_counter()
+        statuses = await asyncio.gather(*(login(i) for i in range(logins)))
+        elapsed = time.perf_counter() - t0
+        done.set()
+        await poller
+
+    return {
+        "elapsed_s": elapsed,
+        "ok": statuses.count(200),
+        "shed": statuses.count(503),
+        "failed": len(statuses) - statuses.count(200) - statuses.count(503),
+        "listing_p50_ms": statistics.median(latencies),
+        "listing_p95_ms": statistics.quantiles(latencies, n=20)[-1] if len(latencies) > 1 else latencies[0],
+        "listing_max_ms": max(latencies),
+        "listing_requests": len(latencies),
+        "listing_errors": len(listing_errors),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--logins", type=int, default=200)
+    parser.add_argument("--workers", type=int, default=hashing.PASSWORD_HASH_WORKERS)
+    parser.add_argument("--max-pending", type=int, default=hashing.PASSWORD_HASH_MAX_PENDING)
+    args = parser.parse_args()
+
+    reader_headers = setup_users(args.logins)
+    pooled = hashing.PasswordHasher(kind="process", workers=args.workers, max_pending=args.max_pending)
+    pooled.start()
+
+    results = {}
+    for name, hasher in (("inline", InlineHasher()), ("hashing pool", pooled)):
+        results[name] = asyncio.run(storm(hasher, args.logins, reader_headers))
+    pooled.shutdown()
+
+    print(f"{args.logins} concurrent logins, hashing pool: {args.workers} processes, queue limit {args.max_pending}\n")
+    print(f"{'mode':<14}{'storm (s)':>11}{'ok':>6}{'503':>6}{'5xx':>6}{'listing p50 (ms)':>18}{'p95 (ms)':>10}{'max (ms)':>10}{'listings':>10}{'errors':>8}")
+    for name, r in results.items():
+        print(f"{name:<14}{r['elapsed_s']:>11.2f}{r['ok']:>6}{r['shed']:>6}{r['failed']:>6}"
+              f"{r['listing_p50_ms']:>18.1f}{r['listing_p95_ms']:>10.1f}{r['listing_max_ms']:>10.1f}{r['listing_requests']:>10}{r['listing_errors']:>8}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,158 @@
+"""
+Run from the `backend/` folder:
+
+python -m benchmarks.bench_report_listing            # 1,000,000 rows
+python -m benchmarks.bench_report_listing --rows 200000
+
+Builds a throwaway SQLite database with synthetic reports and times the
+report listing queries before (ILIKE filters, no indexes) and after
+(equality filters on the canonical lowercase keys + composite indexes), then
+the first and a later keyset page as the API runs them (one indexed query per
+listing site, merged), with their query plans.
+"""
+
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from types import SimpleNamespace
+
+from sqlalchemy import create_engine, insert, or_, text
+
+from app import crud, models
+
+CATEGORIES = ["macd", "rsi", "stochastic", "other1", "other2"]
+
+
+def populate(engine, rows, sites):
+    site_names = [f"site_{i:03d}" for i in range(sites)] + ["admin"]
+    start = datetime(2015, 1, 1)
+    rnd = random.Random(42)
+    batch = []
+    with engine.begin() as conn:
+        for i in range(rows):
+            batch.append({
+                "site_name": rnd.choice(site_names),
+                "category": rnd.choice(CATEGORIES),
+                "file_name": f"report_{i}.pdf",
+                "file_type": "pdf",
+                "date": start + timedelta(hours=rnd.randrange(24 * 365 * 10)),
+                "visibility": "personal" if rnd.random() < 0.2 else "shared",
+            })
+            if len(batch) == 50_000:
+                conn.execute(insert(models.Report.__table__), batch)
+                batch.clear()
+        if batch:
+            conn.execute(insert(models.Report.__table__), batch)
+
+
+def legacy_queries(site, category):
+    r = models.Report
+    site_filter = or_(r.site_name.ilike(site), r.site_name.ilike("admin"))
+    return {
+        "get_reports": lambda q: q.filter(site_filter),
+        "get_reports_by_category": lambda q: q.filter(site_filter, r.category.ilike(category)),
+    }
+
+
+def indexed_queries(site, category):
+    r = models.Report
+    site_filter = r.site_name.in_([site, "admin"])
+    return {
+        "get_reports": lambda q: q.filter(site_filter),
+        "get_reports_by_category": lambda q: q.filter(site_filter, r.category == category),
+    }
+
+
+def time_queries(engine, queries, repeat):
+    from sqlalchemy.orm import Session
+
+    results = {}
+    with Session(engine) as db:
+        for name, build in queries.items():
+            samples = []
+            for _ in range(repeat):
+                t0 = time.perf_counter()
+                build(db.query(models.Report.id, models.Report.date)).order_by(models.Report.date.desc()).limit(100).all()
+                samples.append((time.perf_counter() - t0) * 1000)
+            results[name] = statistics.median(samples)
+    return results
+
+
+def time_pages(engine, site, category, repeat):
+    """Median ms of the first and the 50th page of the listing endpoints, and their query plans."""
+    from sqlalchemy.orm import Session
+
+    user = SimpleNamespace(id=0, site_name="admin")
+    sites = crud.listing_sites(site)
+    results, plans = {}, {}
+    with Session(engine) as db:
+        for name, cat in (("page get_reports", None), ("page by_category", category)):
+            stmt = crud.visible_reports_stmt(user, site, cat)
+            cursor = None
+            for _ in range(49):
+                cursor = crud.paginate_reports(db, stmt, 100, cursor, sites)[1]
+            for label, page_cursor in (("first", None), ("50th", cursor)):
+                samples = []
+                for _ in range(repeat):
+                    t0 = time.perf_counter()
+                    crud.paginate_reports(db, stmt, 100, page_cursor, sites)
+                    samples.append((time.perf_counter() - t0) * 1000)
+                results[f"{name} ({label})"] = statistics.median(samples)
+            page = crud.site_page_stmts(stmt, 100, cursor, sites)[0]
+            sql = str(page.compile(engine, compile_kwargs={"literal_binds": True}))
+            plans[name] = [row[-1] for row in db.execute(text("EXPLAIN QUERY PLAN " + sql))]
+    return results, plans
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--sites", type=int, default=40)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_engine("sqlite:///" + os.path.join(tmp, "bench.sqlite"))
+        # Create the table without its indexes to reproduce the old schema
+        table = models.Report.__table__
+        indexes = set(table.indexes)
+        table.indexes.clear()
+        table.create(engine)
+        table.indexes.update(indexes)
+
+        print(f"Populating {args.rows:,} reports...")
+        t0 = time.perf_counter()
+        populate(engine, args.rows, args.sites)
+        print(f"  done in {time.perf_counter() - t0:.1f}s")
+
+        before = time_queries(engine, legacy_queries("site_007", "rsi"), args.repeat)
+
+        t0 = time.perf_counter()
+        for index in indexes:
+            index.create(engine)
+        print(f"Indexes built in {time.perf_counter() - t0:.1f}s")
+
+        after = time_queries(engine, indexed_queries("site_007", "rsi"), args.repeat)
+        pages, plans = time_pages(engine, "site_007", "rsi", args.repeat)
+        engine.dispose()
+
+    print(f"\n{'query':<26}{'before (ms)':>14}{'after (ms)':>14}{'speedup':>10}")
+    for name in before:
+        print(f"{name:<26}{before[name]:>14.2f}{after[name]:>14.2f}{before[name] / after[name]:>9.1f}x")
+
+    print(f"\n{'keyset page (100 rows)':<32}{'ms':>8}")
+    for name, ms in pages.items():
+        print(f"{name:<32}{ms:>8.2f}")
+    for name, plan in plans.items():
+        print(f"\nEXPLAIN QUERY PLAN, {name} (one site, later page):")
+        for line in plan:
+            print("  " + line)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+"""
+Run from the `backend/` folder:
+
+python -m benchmarks.bench_serialization             # 10,000-row listing
+python -m benchmarks.bench_serialization --rows 50000
+
+Builds a throwaway SQLite database and times one unpaginated listing response,
+split into query and serialization time:
+
+- orm + jsonable_encoder: full Report entities, FastAPI's jsonable_encoder and
+  json.dumps (the old listing path)
+- orm + response_model: full entities validated into ReportOut and dumped by
+  pydantic-core (what a plain `response_model=` endpoint would do)
+- columns + dumps: the ReportOut columns only, rows as dicts, schemas.dumps()
+  (orjson when installed, pydantic-core otherwise; both are shown)
+"""
+
+import argparse
+import os
+import statistics
+import tempfile
+import time
+from datetime import datetime, timedelta
+from typing import List
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from pydantic import TypeAdapter
+from sqlalchemy import create_engine, insert
+from sqlalchemy.orm import Session
+
+from app import crud, models, schemas
+
+
+def populate(engine, rows):
+    start = datetime(2020, 1, 1)
+    with engine.begin() as conn:
+        conn.execute(insert(models.Report.__table__), [
+            {
+                "site_name": "shared",
+                "category": "macd",
+                "file_name": f"MACD_{i}.pdf",
+                "file_type": "pdf",
+                "date": start + timedelta(hours=i),
+                "visibility": "shared",
+                "blob_sha256": None,
+            }
+            for i in range(rows)
+        ])
+
+
+def timed(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        result = fn()
+        samples.append((time.perf_counter() - t0) * 1000)
+    return statistics.median(samples), result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=10_000)
+    parser.add_argument("--repeat", type=int, default=7)
+    args = parser.parse_args()
+
+    path = os.path.join(tempfile.mkdtemp(prefix="serialization_"), "bench.sqlite")
+    engine = create_engine("sqlite:///" + path)
+    models.Base.metadata.create_all(engine)
+    populate(engine, args.rows)
+
+    user = models.User(id=1, email="bench@example.com", hashed_password="x", site_name="shared")
+    columns_stmt = crud.visible_reports_stmt(user, "shared", "macd")
+    entity_stmt = columns_stmt.with_only_columns(models.Report)
+    page_adapter = TypeAdapter(List[schemas.ReportOut])
+
+    def orm_rows():
+        with Session(engine) as db:
+            return db.execute(entity_stmt).scalars().all()
+
+    def column_rows():
+        with Session(engine) as db:
+            return crud.report_dicts(db.execute(columns_stmt))
+
+    def pydantic_core_dumps(rows):
+        orjson, schemas.orjson = schemas.orjson, None
+        try:
+            return schemas.dumps(rows)
+        finally:
+            schemas.orjson = orjson
+
+    cases = [
+        ("orm + jsonable_encoder", orm_rows, lambda rows: JSONResponse(jsonable_encoder(rows)).body),
+        ("orm + response_model", orm_rows, lambda rows: page_adapter.dump_json(page_adapter.validate_python(rows))),
+        ("columns + dumps (pydantic-core)", column_rows, pydantic_core_dumps),
+    ]
+    if schemas.orjson is not None:
+        cases.append(("columns + dumps (orjson)", column_rows, schemas.dumps))
+
+    print(f"{args.rows} rows, median of {args.repeat} runs\n")
+    print(f"{'path':<34}{'query (ms)':>12}{'serialize (ms)':>16}{'total (ms)':>12}{'body (KiB)':>12}")
+    baseline = None
+    for name, query, serialize in cases:
+        query_ms, rows = timed(query, args.repeat)
+        serialize_ms, body = timed(lambda: serialize(rows), args.repeat)
+        assert len(rows) == args.rows
+        total = query_ms + serialize_ms
+        baseline = baseline or total
+        print(f"{name:<34}{query_ms:>12.1f}{serialize_ms:>16.1f}{total:>12.1f}{len(body) / 1024:>12.0f}"
+              f"   x{baseline / total:.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+"""
+Run from the `backend/` folder:
+
+python -m benchmarks.bench_startup                 # 5 runs of each measurement
+python -m benchmarks.bench_startup --runs 10 --importtime
+
+Measures cold start in fresh interpreters against a throwaway SQLite database
+(created once with app.migrate, like a deployment would):
+
+- import: wall time of `import app.main`
+- first request: from launching `uvicorn app.main:app` until GET /report-categories
+  answers 200 (interpreter start, imports, lifespan startup and the request)
+
+--importtime also lists the slowest modules from `python -X importtime`.
+"""
+
+import argparse
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+
+BACKEND_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+
+IMPORT_SNIPPET = (
+    "import json, time; t = time.perf_counter(); import app.main; "
+    "print(json.dumps({'seconds': time.perf_counter() - t}))"
+)
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def time_import(env):
+    out = subprocess.run([sys.executable, "-c", IMPORT_SNIPPET], cwd=BACKEND_DIR, env=env,
+                         check=True, capture_output=True, text=True).stdout
+    return json.loads(out.strip().splitlines()[-1])["seconds"]
+
+
+def time_first_request(env, timeout=60.0):
+    port = free_port()
+    url = f"http://127.0.0.1:{port}/report-categories"
+    t0 = time.perf_counter()
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port), "--log-level", "warning"],
+        cwd=BACKEND_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        while time.perf_counter() - t0 < timeout:
+            try:
+                with urllib.request.urlopen(url, timeout=1) as resp:
+                    if resp.status == 200:
+                        return time.perf_counter() - t0
+            except OSError:
+                if proc.poll() is not None:
+                    raise RuntimeError("uvicorn exited before answering")
+                time.sleep(0.005)
+        raise RuntimeError("no response within the timeout")
+    finally:
+        proc.terminate()
+        proc.wait()
+
+
+def slowest_imports(env, count=15):
+    err = subprocess.run([sys.executable, "-X", "importtime", "-c", "import app.main"], cwd=BACKEND_DIR, env=env,
+                         check=True, capture_output=True, text=True).stderr
+    rows = []
+    for line in err.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        # "import time:   self [us] | cumulative | imported package"
+        self_us, cumulative_us, name = (part.strip() for part in line.split(":", 1)[1].split("|"))
+        rows.append((int(cumulative_us), int(self_us), name))
+    return sorted(rows, reverse=True)[:count]
+
+
+def summary(label, samples):
+    ms = [s * 1000 for s in samples]
+    print(f"{label:<16}{statistics.median(ms):>10.0f}{min(ms):>10.0f}{max(ms):>10.0f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--importtime", action="store_true", help="also list the slowest imports")
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp(prefix="startup_bench_")
+    env = {
+        **os.environ,
+        "DATABASE_URL": "sqlite:///" + os.path.join(tmp, "bench.sqlite"),
+        "UPLOAD_FOLDER": os.path.join(tmp, "uploads"),
+        # background workers are not part of what is measured
+        "JOB_WORKERS": "0",
+        "SEARCH_INDEX_WORKERS": "0",
+    }
+    subprocess.run([sys.executable, "-m", "app.migrate"], cwd=BACKEND_DIR, env=env, check=True, capture_output=True)
+
+    print(f"{args.runs} runs each, fresh interpreter per run\n")
+    print(f"{'ms':<16}{'median':>10}{'min':>10}{'max':>10}")
+    summary("import", [time_import(env) for _ in range(args.runs)])
+    summary("first request", [time_first_request(env) for _ in range(args.runs)])
+
+    if args.importtime:
+        print(f"\n{'cumulative ms':>14}{'self ms':>10}  module")
+        for cumulative_us, self_us, name in slowest_imports(env):
+            print(f"{cumulative_us / 1000:>14.1f}{self_us / 1000:>10.1f}  {name}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+"""
+Run from the `backend/` folder (after `alembic upgrade head`):
+
+python migrate_to_blobs.py [--dry-run]
+
+One-off migration of the flat `uploaded_reports/` folder into the
+content-addressed blob store. Every report without a blob has its file hashed;
+the first copy of each distinct content is linked (or copied, across file
+systems) to `uploaded_reports/blobs/<aa>/<sha256>`, and the report rows are
+pointed at the shared blob with the right reference count. The flat files are
+only deleted once their batch is committed, so the script can be interrupted
+at any point and re-run: an uncommitted batch still has its legacy files.
+"""
+
+import argparse
+import hashlib
+import os
+import shutil
+
+from app.database import SessionLocal, UPLOAD_FOLDER
+from app import blobstore, models
+
+
+def file_sha256(path, chunk_size=1024 * 1024):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def store_copy(legacy_path, path):
+    """Put the legacy file's bytes at the blob path, leaving the legacy file in place."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.part"
+    try:
+        os.link(legacy_path, tmp)
+    except OSError:
+        shutil.copyfile(legacy_path, tmp)
+    # atomic, and harmless when a crashed run already put the same bytes there
+    os.replace(tmp, path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Move uploaded_reports/ into the blob store.")
+    parser.add_argument("--dry-run", action="store_true", help="only hash and report the savings")
+    parser.add_argument("--batch-size", type=int, default=200)
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    # legacy file name -> sha256, for rows sharing a file that was already stored
+    moved = {}
+    seen = set()
+    migrated = missing = duplicates = saved_bytes = 0
+    last_id = 0
+    try:
+        while True:
+            reports = (
+                db.query(models.Report)
+                .filter(models.Report.blob_sha256.is_(None), models.Report.id > last_id)
+                .order_by(models.Report.id)
+                .limit(args.batch_size)
+                .all()
+            )
+            if not reports:
+                break
+            last_id = reports[-1].id
+            # legacy file name -> path, deleted once this batch is committed
+            done = {}
+
+            for r in reports:
+                legacy_path = os.path.join(UPLOAD_FOLDER, r.file_name)
+                if r.file_name in moved:
+                    sha256 = moved[r.file_name]
+                elif os.path.isfile(legacy_path):
+                    sha256 = file_sha256(legacy_path)
+                    size = os.path.getsize(legacy_path)
+                    if sha256 in seen or db.get(models.Blob, sha256) is not None:
+                        duplicates += 1
+                        saved_bytes += size
+                    else:
+                        seen.add(sha256)
+                        if not args.dry_run:
+                            store_copy(legacy_path, blobstore.blob_path(sha256))
+                            db.add(models.Blob(sha256=sha256, size=size, ref_count=0))
+                            db.flush()
+                    moved[r.file_name] = sha256
+                else:
+                    print(f"⚠️ File {r.file_name} not found on disk (report {r.id}); leaving it for the reconciler")
+                    missing += 1
+                    continue
+                done[r.file_name] = legacy_path
+
+                if not args.dry_run:
+                    blobstore.add_reference(db, sha256)
+                    r.blob_sha256 = sha256
+                migrated += 1
+
+            if not args.dry_run:
+                db.commit()
+                for name, legacy_path in done.items():
+                    # rows in a later batch may share the file; the last batch deletes it
+                    still_used = (
+                        db.query(models.Report.id)
+                        .filter(models.Report.file_name == name, models.Report.blob_sha256.is_(None))
+                        .first()
+                    )
+                    if still_used is None and os.path.exists(legacy_path):
+                        os.remove(legacy_path)
+            print(f"...processed up to report id {last_id}")
+
+        verb = "Would migrate" if args.dry_run else "Migrated"
+        print(f"{verb} {migrated} reports into {len(seen)} new blobs; "
+              f"{duplicates} duplicate files ({saved_bytes} bytes) removed, {missing} files missing.")
+    except Exception as e:
+        db.rollback()
+        print("Error migrating reports:", e)
+        raise
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,5 @@
 import os
+import tempfile
 import pytest
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
@@ -6,8 +7,17 @@ from fastapi.testclient import TestClient
 
 # ensure environment variable is set to not interfere
 os.environ.setdefault("DATABASE_URL", "sqlite:///:memory:")
+# keep uploads made by the tests out of backend/uploaded_reports
+os.environ.setdefault("UPLOAD_FOLDER", tempfile.mkdtemp(prefix="report_uploads_"))
+# endpoint tests don't need process pools per TestClient; test_hashing/test_previews cover them
+os.environ.setdefault("PASSWORD_HASH_EXECUTOR", "thread")
+os.environ.setdefault("PREVIEW_EXECUTOR", "thread")
+# job tests run their own runner against the test database
+os.environ.setdefault("JOB_WORKERS", "0")
+# search tests index with their own SearchIndexer
+os.environ.setdefault("SEARCH_INDEX_WORKERS", "0")
 
-from app import main, models
+from app import main, models, database
 
 @pytest.fixture(scope="session")
 def db_engine(tmp_path_factory):
@@ -35,6 +45,22 @@ def client(db_session):
         finally:
             pass
     main.app.dependency_overrides[main.get_db] = override_get_db
+    main.app.dependency_overrides[database.get_db] = override_get_db
+    main.app.dependency_overrides[database.get_async_db] = override_get_db
     with TestClient(main.app) as c:
         yield c
     main.app.dependency_overrides.clear()
+
+@pytest.fixture()
+def async_client(client, db_engine):
+    # same app, but async endpoints get a real AsyncSession (DB_ASYNC mode)
+    from sqlalchemy.pool import NullPool
+    from app.database import AsyncSession, async_database_url, create_async_engine
+    # NullPool: connections never outlive the TestClient's event loop
+    engine = create_async_engine(async_database_url(str(db_engine.url)), poolclass=NullPool)
+
+    async def override_get_async_db():
+        async with AsyncSession(engine) as db:
+            yield db
+    main.app.dependency_overrides[database.get_async_db] = override_get_async_db
+    yield client
@@ -13,3 +13,47 @@ def test_token_roundtrip():
     token = auth.create_access_token(data)
     decoded = jwt.decode(token, auth.SECRET_KEY, algorithms=[auth.ALGORITHM])
     assert decoded["sub"] == "user@example.com"
+
+
+def test_current_user_is_cached_and_invalidated(db_session):
+    from sqlalchemy import event
+    from app import models, principals
+
+    db_session.add(models.User(email="cached@x.com", hashed_password="h", site_name="shared", allowed_sites="shared"))
+    db_session.commit()
+    token = auth.create_access_token({"sub": "cached@x.com"})
+
+    queries = []
+    listener = lambda *args: queries.append(args[2])
+    event.listen(db_session.get_bind(), "before_cursor_execute", listener)
+    try:
+        first = auth.get_current_user(token, db_session)
+        lookups = len(queries)
+        assert auth.get_current_user(token, db_session) is first
+        assert len(queries) == lookups  # second call served from the cache
+        assert first.allowed_sites == ("shared",)
+
+        user = db_session.query(models.User).filter_by(email="cached@x.com").one()
+        user.allowed_sites = "shared,personal"
+        db_session.commit()
+        assert principals.cache.get("cached@x.com") is None
+        assert auth.get_current_user(token, db_session).allowed_sites == ("personal", "shared")
+    finally:
+        event.remove(db_session.get_bind(), "before_cursor_execute", listener)
+
+
+def test_principal_cache_ttl_and_lru():
+    from app.principals import Principal, PrincipalCache
+
+    cache = PrincipalCache(maxsize=2, ttl=60)
+    p = Principal(id=1, email="a", site_name="shared", allowed_sites=())
+    for key in ("a", "b", "c"):
+        cache.put(key, p)
+    assert cache.get("a") is None and cache.get("c") is p  # "a" was evicted
+    assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 1
+
+    expired = PrincipalCache(ttl=0.01)
+    expired.put("a", p)
+    import time
+    time.sleep(0.02)
+    assert expired.get("a") is None
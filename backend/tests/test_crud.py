@@ -9,3 +9,98 @@ def test_get_user_by_email(db_session):
     result = crud.get_user_by_email(db_session, "foo@x.com")
     assert result is not None
     assert result.email == "foo@x.com"
+
+
+def test_report_keys_stored_lowercase(db_session):
+    from datetime import datetime
+    report = models.Report(site_name=" Shared", category="MACD", file_name="MACD_01012025.pdf",
+                           file_type="pdf", date=datetime(2025, 1, 1), visibility="Shared")
+    db_session.add(report)
+    db_session.commit()
+
+    assert (report.site_name, report.category, report.visibility) == ("shared", "macd", "shared")
+    result = crud.get_reports_by_category(db_session, "SHARED", "Macd")
+    assert [r.id for r in result] == [report.id]
+
+
+def test_async_helpers_match_sync_session(db_engine, db_session):
+    import asyncio
+    from datetime import datetime
+    from app.database import AsyncSession, async_database_url, create_async_engine
+
+    db_session.add(models.Report(site_name="asyncsite", category="rsi", file_name="rsi_02012025.pdf",
+                                 file_type="pdf", date=datetime(2025, 1, 2), visibility="shared"))
+    db_session.commit()
+    user = models.User(email="async@x.com", hashed_password="h", site_name="asyncsite", allowed_sites="asyncsite")
+    stmt = crud.visible_reports_stmt(user, "asyncsite", "rsi")
+    expected = [r["id"] for r in crud.paginate_reports(db_session, stmt, 10)[0]]
+
+    async def run():
+        # regular Session: queries are pushed to the threadpool
+        sync_ids = [r["id"] for r in (await crud.apaginate_reports(db_session, stmt, 10))[0]]
+        engine = create_async_engine(async_database_url(str(db_engine.url)))
+        try:
+            async with AsyncSession(engine) as adb:
+                async_ids = [r["id"] for r in (await crud.apaginate_reports(adb, stmt, 10))[0]]
+                dates = await crud.avisible_report_dates(adb, user, "asyncsite", "rsi")
+        finally:
+            await engine.dispose()
+        return sync_ids, async_ids, dates
+
+    sync_ids, async_ids, dates = asyncio.run(run())
+    assert sync_ids == async_ids == expected and len(expected) == 1
+    assert dates == ["2025-01-02"]
+
+
+def test_allowed_sites_are_membership_rows(db_session):
+    user = models.User(email="member@x.com", hashed_password="h", site_name="shared", allowed_sites="shared, Personal")
+    db_session.add(user)
+    db_session.commit()
+
+    rows = db_session.query(models.UserSite.site_name).filter_by(user_id=user.id).order_by(models.UserSite.site_name)
+    assert [r.site_name for r in rows] == ["personal", "shared"]
+    assert user.allowed_sites == "personal,shared"
+
+    user.allowed_sites = ["shared"]
+    db_session.commit()
+    assert db_session.query(models.UserSite).filter_by(user_id=user.id).count() == 1
+
+
+def test_pages_are_merged_per_site_without_a_sort(db_session):
+    from datetime import datetime
+    tie = datetime(2025, 3, 1)
+    reports = [models.Report(site_name=site, category="rsi", file_name=f"page_{i}.pdf", file_type="pdf",
+                             date=tie.replace(day=day), visibility="shared")
+               for i, (site, day) in enumerate([("pagesite", 1), ("admin", 1), ("pagesite", 2), ("admin", 3),
+                                                ("pagesite", 3)])]
+    db_session.add_all(reports)
+    db_session.commit()
+    try:
+        _check_pages(db_session)
+    finally:
+        # 'admin' reports show up in every other test's listings
+        for report in reports:
+            db_session.delete(report)
+        db_session.commit()
+
+
+def _check_pages(db_session):
+    from sqlalchemy import text
+    user = models.User(email="pages@x.com", hashed_password="h", site_name="admin", allowed_sites="admin")
+    stmt = crud.visible_reports_stmt(user, "pagesite", "rsi")
+    sites = crud.listing_sites("pagesite")
+    expected = [r["id"] for r in crud.visible_reports_query(db_session, user, "pagesite", "rsi")]
+
+    paged, cursor = [], None
+    while True:
+        items, cursor = crud.paginate_reports(db_session, stmt, 2, cursor, sites)
+        paged += [r["id"] for r in items]
+        if cursor is None:
+            break
+    assert paged == expected and len(paged) >= 5
+
+    # each site's page is read in index order, (date, id) ties included
+    for page in crud.site_page_stmts(stmt, 2, None, sites):
+        sql = str(page.compile(db_session.get_bind(), compile_kwargs={"literal_binds": True}))
+        plan = " ".join(row[-1] for row in db_session.execute(text("EXPLAIN QUERY PLAN " + sql)))
+        assert "ix_reports_site_category_date" in plan and "TEMP B-TREE" not in plan
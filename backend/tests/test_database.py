@@ -0,0 +1,24 @@
+from sqlalchemy import create_engine, text
+
+from app import database
+
+
+def test_file_sqlite_profile_sets_pragmas_and_counts_checkouts(tmp_path):
+    url = f"sqlite:///{tmp_path / 'profile.db'}"
+    options = database.engine_options(url)
+    assert options["poolclass"] is database.TimedQueuePool and options["echo"] is False
+    engine = database.configure_engine(create_engine(url, **options))
+
+    before = database.get_pool_stats()["checkouts"]
+    with engine.connect() as conn:
+        assert conn.execute(text("PRAGMA journal_mode")).scalar() == "wal"
+        assert conn.execute(text("PRAGMA busy_timeout")).scalar() == database.SQLITE_BUSY_TIMEOUT_MS
+    stats = database.get_pool_stats(engine)
+    engine.dispose()
+
+    assert stats["checkouts"] == before + 1
+    assert stats["pools"][0]["class"] == "TimedQueuePool" and stats["pools"][0]["checked_out"] == 0
+
+
+def test_memory_sqlite_keeps_default_pool():
+    assert "poolclass" not in database.engine_options("sqlite:///:memory:")
@@ -0,0 +1,48 @@
+import asyncio
+import threading
+
+import pytest
+
+from app import hashing
+
+
+def test_process_pool_hash_and_verify():
+    hasher = hashing.PasswordHasher(kind="process", workers=1)
+    try:
+        async def run():
+            hashed = await hasher.hash("secret")
+            return await hasher.verify("secret", hashed), await hasher.verify("wrong", hashed)
+        assert asyncio.run(run()) == (True, False)
+        assert hasher.stats()["completed"] == 3 and hasher.stats()["pending"] == 0
+    finally:
+        hasher.shutdown()
+
+
+def test_full_queue_is_rejected():
+    release = threading.Event()
+    hasher = hashing.PasswordHasher(kind="thread", workers=1, max_pending=2)
+
+    async def run():
+        blocked = [asyncio.ensure_future(hasher.run(release.wait)) for _ in range(2)]
+        await asyncio.sleep(0.05)
+        with pytest.raises(hashing.HashingBusy):
+            await hasher.run(release.wait)
+        release.set()
+        await asyncio.gather(*blocked)
+
+    try:
+        asyncio.run(run())
+        assert hasher.stats()["rejected"] == 1 and hasher.stats()["pending"] == 0
+    finally:
+        hasher.shutdown()
+
+
+def test_login_sheds_load_with_503(client, monkeypatch):
+    client.post("/create-account", json={"email": "storm@x.com", "password": "pass"})
+    monkeypatch.setattr(hashing.hasher, "max_pending", 0)
+    resp = client.post("/login", json={"email": "storm@x.com", "password": "pass"})
+    assert resp.status_code == 503 and resp.headers["retry-after"] == "1"
+
+
+def test_lifespan_starts_the_pool(client):
+    assert hashing.hasher._pool.running
@@ -0,0 +1,52 @@
+import asyncio
+import hashlib
+import io
+import os
+
+import pytest
+from fastapi import UploadFile
+
+from app import ingest
+
+
+def test_stage_upload_hashes_and_sizes(tmp_path):
+    data = os.urandom(3 * ingest.UPLOAD_CHUNK_SIZE + 17)
+    staged = asyncio.run(ingest.stage_upload(UploadFile(io.BytesIO(data), filename="a.pdf"), folder=str(tmp_path)))
+
+    assert staged.size == len(data)
+    assert staged.sha256 == hashlib.sha256(data).hexdigest()
+    ingest.place(staged, str(tmp_path / "final.pdf"))
+    assert (tmp_path / "final.pdf").read_bytes() == data
+    assert not any(p.suffix == ".part" for p in tmp_path.iterdir())
+
+
+def test_stage_upload_enforces_limit_and_cleans_up(tmp_path):
+    upload = UploadFile(io.BytesIO(b"x" * 2048), filename="big.pdf")
+    with pytest.raises(ingest.UploadTooLarge):
+        asyncio.run(ingest.stage_upload(upload, max_bytes=1024, folder=str(tmp_path)))
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_chunked_upload_over_the_limit_is_refused(client, db_session, monkeypatch):
+    from app import models
+    monkeypatch.setitem(ingest.UPLOAD_SIZE_LIMITS, "/upload-report", 1024)
+    boundary = "chunkedboundary"
+    head = (f"--{boundary}\r\n"
+            'Content-Disposition: form-data; name="site_name"\r\n\r\nchunksite\r\n'
+            f"--{boundary}\r\n"
+            'Content-Disposition: form-data; name="category"\r\n\r\nrsi\r\n'
+            f"--{boundary}\r\n"
+            'Content-Disposition: form-data; name="file"; filename="big.pdf"\r\n'
+            "Content-Type: application/pdf\r\n\r\n").encode()
+
+    def body():
+        # no Content-Length: httpx sends a generator with chunked transfer encoding
+        yield head
+        for _ in range(64):
+            yield b"x" * 4096
+        yield f"\r\n--{boundary}--\r\n".encode()
+
+    resp = client.post("/upload-report", content=body(),
+                       headers={"Content-Type": f"multipart/form-data; boundary={boundary}"})
+    assert resp.status_code == 413 and resp.json() == {"detail": "Upload too large"}
+    assert db_session.query(models.Report).filter_by(site_name="chunksite").count() == 0
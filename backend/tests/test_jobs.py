@@ -0,0 +1,106 @@
+import time
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy.orm import sessionmaker
+
+from app import jobs, models
+
+
+def _auth_headers(client, email, **account):
+    resp = client.post("/create-account", json={"email": email, "password": "pass", **account})
+    return {"Authorization": f"Bearer {resp.json()['access_token']}"}
+
+
+@pytest.fixture()
+def runner(db_engine, monkeypatch):
+    runner = jobs.JobRunner(sessionmaker(bind=db_engine), workers=1, timeout=60, poll_seconds=0.05)
+    monkeypatch.setattr(jobs, "runner", runner)
+    runner.start()
+    yield runner
+    runner.stop()
+
+
+def _wait_until_done(client, db_session, job_id, headers, timeout=60):
+    deadline = time.monotonic() + timeout
+    while True:
+        db_session.expire_all()  # the test client shares one session across requests
+        job = client.get(f"/jobs/{job_id}", headers=headers).json()
+        if job["status"] in ("succeeded", "failed") or time.monotonic() > deadline:
+            return job
+        time.sleep(0.05)
+
+
+def test_csv_job_is_generated_and_listed(client, db_session, runner):
+    admin = _auth_headers(client, "jobs-admin@x.com", site_name="admin")
+    resp = client.post("/jobs", headers=admin, json={
+        "kind": "csv", "site_name": "jobsite", "category": "Signals", "date": "2024-06-03",
+        "rows": [{"ticker": "ABC", "rsi": 71}, {"ticker": "XYZ", "rsi": 28}],
+    })
+    assert resp.status_code == 202 and resp.json()["status"] == "queued"
+
+    job = _wait_until_done(client, db_session, resp.json()["id"], admin)
+    assert job["status"] == "succeeded" and job["attempts"] == 1
+    result = client.get(f"/jobs/{job['id']}/result", headers=admin)
+    assert result.text.splitlines() == ["ticker,rsi", "ABC,71", "XYZ,28"]
+    token = client.post(f"/jobs/{job['id']}/link", headers=admin).json()["token"]
+    assert client.get(f"/jobs/{job['id']}/result", params={"token": token}).text == result.text
+
+    # named from the category as sent, like an upload of the same category
+    listed = client.get("/reports/jobsite/signals", headers=admin).json()["items"]
+    assert [(r["id"], r["file_name"]) for r in listed] == [(job["report_id"], "Signals_03062024.csv")]
+    assert db_session.get(models.Job, job["id"]).payload is None
+
+    # deleting the report detaches the job, so a later report reusing the id isn't served as its result
+    assert client.delete(f"/delete-report/{job['report_id']}", headers=admin).status_code == 200
+    db_session.expire_all()
+    assert db_session.get(models.Job, job["id"]).report_id is None
+    assert client.get(f"/jobs/{job['id']}/result", headers=admin).status_code == 404
+
+
+def test_job_rows_are_capped(client, monkeypatch):
+    admin = _auth_headers(client, "jobs-admin3@x.com", site_name="admin")
+    monkeypatch.setattr(jobs, "JOB_MAX_ROWS", 2)
+    resp = client.post("/jobs", headers=admin, json={
+        "kind": "csv", "site_name": "jobsite", "category": "big", "rows": [{"a": i} for i in range(3)],
+    })
+    assert resp.status_code == 413
+
+
+def test_failed_job_is_recorded(client, db_session, runner):
+    admin = _auth_headers(client, "jobs-admin2@x.com", site_name="admin")
+    # control characters can't be stored in an XLSX cell, so the generator raises
+    job_id = client.post("/jobs", headers=admin, json={
+        "kind": "excel", "site_name": "jobsite", "category": "broken", "rows": [{"a": "\x01"}],
+    }).json()["id"]
+    job = _wait_until_done(client, db_session, job_id, admin)
+    assert job["status"] == "failed" and job["error"]
+    assert client.get(f"/jobs/{job_id}/result", headers=admin).status_code == 409
+
+    # only admins submit, and other users can't see the job
+    other = _auth_headers(client, "jobs-user@x.com")
+    assert client.post("/jobs", headers=other, json={"kind": "pdf", "site_name": "s", "category": "c",
+                                                     "html": "<p>x</p>"}).status_code == 403
+    assert client.get(f"/jobs/{job_id}", headers=other).status_code == 404
+
+
+def test_generation_timeout_kills_the_process(tmp_path):
+    rows = '{"rows": [{"a": 1}]}'
+    with pytest.raises(jobs.JobTimeout):
+        jobs.run_generation("csv", rows, str(tmp_path / "out.csv"), timeout=0.001)
+
+
+def test_stale_running_jobs_are_requeued_then_failed(db_engine, db_session):
+    runner = jobs.JobRunner(sessionmaker(bind=db_engine), workers=0, timeout=1)
+    started = datetime.utcnow() - timedelta(hours=1)
+    for job_id, attempts in (("stale-retry", 1), ("stale-final", jobs.JOB_MAX_ATTEMPTS)):
+        db_session.add(models.Job(id=job_id, kind="csv", status="running", payload="{}", site_name="s",
+                                  category="c", date=datetime(2024, 1, 1), attempts=attempts, started_at=started))
+    db_session.commit()
+
+    with runner.session_factory() as db:
+        runner._recover_stale(db)
+    db_session.expire_all()
+    assert db_session.get(models.Job, "stale-retry").status == "queued"
+    assert db_session.get(models.Job, "stale-final").status == "failed"
+    assert runner.stats()["requeued"] == 1
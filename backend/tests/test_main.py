@@ -1,3 +1,5 @@
+import os
+
 from app.main import app
 
 
@@ -21,9 +23,12 @@ def test_sites_endpoint(client):
     assert isinstance(resp.json(), list)
 
 
-def test_login_helper(db_session):
+def test_login_helper(db_session, db_engine, monkeypatch):
     # directly exercise login.login_user without HTTP
+    from sqlalchemy.orm import sessionmaker
     from app import login, models
+    # login_user opens its own session; point it at the test database
+    monkeypatch.setattr(login.database, "SessionLocal", sessionmaker(bind=db_engine))
     # add a user
     user = models.User(email="hi@there", hashed_password=login.auth.get_password_hash("x"), site_name="shared", allowed_sites="shared")
     db_session.add(user)
@@ -33,3 +38,414 @@ def test_login_helper(db_session):
     assert "successful" in msg.lower()
     ok2, msg2 = login.login_user("hi@there", "wrong")
     assert not ok2
+
+
+def _auth_headers(client, email, **account):
+    resp = client.post("/create-account", json={"email": email, "password": "pass", **account})
+    assert resp.status_code == 200
+    return {"Authorization": f"Bearer {resp.json()['access_token']}"}
+
+
+def test_listing_applies_visibility_in_sql(client, db_session):
+    from datetime import datetime
+    from app import models
+    for vis in ("shared", "personal"):
+        db_session.add(models.Report(site_name="shared", category="rsi", file_name=f"RSI_{vis}.pdf",
+                                     file_type="pdf", date=datetime(2024, 3, 4, 9), visibility=vis))
+    db_session.commit()
+
+    shared_user = _auth_headers(client, "vis-shared@x.com")
+    personal_user = _auth_headers(client, "vis-personal@x.com", site_name="personal")
+
+    resp = client.get("/reports/shared/RSI", headers=shared_user)
+    assert resp.status_code == 200
+    assert [r["visibility"] for r in resp.json()["items"]] == ["shared"]
+
+    resp = client.get("/reports/shared/rsi/2024-03-04", headers=personal_user)
+    assert sorted(r["visibility"] for r in resp.json()["items"]) == ["personal", "shared"]
+
+
+def test_listing_keyset_pagination(client, db_session):
+    from datetime import datetime
+    from app import models
+    for day in range(1, 6):
+        db_session.add(models.Report(site_name="shared", category="other2", file_name=f"Other2_0{day}012024.pdf",
+                                     file_type="pdf", date=datetime(2024, 1, day), visibility="shared"))
+    db_session.commit()
+    headers = _auth_headers(client, "pager@x.com")
+
+    seen, cursor = [], None
+    while True:
+        params = {"limit": 2, **({"cursor": cursor} if cursor else {})}
+        page = client.get("/reports/shared/other2", params=params, headers=headers).json()
+        assert len(page["items"]) <= 2
+        seen += [r["file_name"] for r in page["items"]]
+        cursor = page["next_cursor"]
+        if cursor is None:
+            break
+
+    full = client.get("/reports/shared/other2", params={"unpaginated": True}, headers=headers).json()
+    assert seen == [r["file_name"] for r in full]
+    assert seen[0] == "Other2_05012024.pdf" and len(seen) == 5
+
+    resp = client.get("/reports/shared/other2", params={"cursor": "not-a-cursor"}, headers=headers)
+    assert resp.status_code == 400
+
+
+def test_report_dates_is_distinct_and_read_only(client, db_session):
+    from datetime import datetime
+    from app import models
+    for hour, vis in ((9, "shared"), (15, "shared"), (10, "personal")):
+        db_session.add(models.Report(site_name="shared", category="stochastic", file_name=f"missing_{hour}.pdf",
+                                     file_type="pdf", date=datetime(2024, 2, hour % 2 + 1, hour), visibility=vis))
+    db_session.commit()
+    headers = _auth_headers(client, "dates@x.com")
+
+    resp = client.get("/report-dates/shared/Stochastic", headers=headers)
+    assert resp.status_code == 200
+    assert resp.json() == ["2024-02-02"]
+    # files don't exist on disk, but the GET must not delete anything
+    assert db_session.query(models.Report).filter_by(category="stochastic").count() == 3
+
+
+def test_report_calendar_counts_per_day_and_category(client, db_session):
+    from datetime import datetime
+    from app import models
+    for site, category, day, hour, vis in (("calsite", "macd", 3, 9, "shared"), ("calsite", "macd", 3, 17, "shared"),
+                                           ("calsite", "weekly", 3, 10, "shared"), ("admin", "weekly", 4, 8, "shared"),
+                                           ("calsite", "macd", 4, 11, "personal"), ("calsite", "weekly", 9, 12, "shared"),
+                                           ("othersite", "macd", 3, 9, "shared")):
+        db_session.add(models.Report(site_name=site, category=category, file_name=f"cal_{site}_{day}_{hour}.pdf",
+                                     file_type="pdf", date=datetime(2024, 5, day, hour), visibility=vis))
+    db_session.commit()
+    headers = _auth_headers(client, "calendar@x.com")
+
+    resp = client.get("/report-calendar/CalSite", params={"start": "2024-05-01", "end": "2024-05-05"}, headers=headers)
+    assert resp.status_code == 200
+    assert resp.json() == {"dates": ["2024-05-04", "2024-05-03", "2024-05-03"],
+                           "categories": ["weekly", "macd", "weekly"], "counts": [1, 2, 1]}
+    assert client.get("/report-calendar/calsite", headers=headers).json()["dates"][0] == "2024-05-09"
+    assert client.get("/report-calendar/calsite", params={"start": "May 1"}, headers=headers).status_code == 400
+
+
+def test_dashboard_summary_merges_global_reports(client, db_session):
+    from datetime import datetime
+    from app import models
+    for site, category, day, vis in (("sumsite", "daily", 3, "shared"), ("sumsite", "daily", 5, "shared"),
+                                     ("sumsite", "daily", 6, "personal"), ("sumsite", "monthly", 1, "shared"),
+                                     ("admin", "daily", 4, "shared"), ("admin", "yearly", 2, "shared")):
+        db_session.add(models.Report(site_name=site, category=category, file_name=f"sum_{site}_{category}_{day}.pdf",
+                                     file_type="pdf", date=datetime(2024, 7, day), visibility=vis))
+    db_session.commit()
+    headers = _auth_headers(client, "summary@x.com", site_name="sumsite")
+
+    resp = client.get("/dashboard-summary", headers=headers)
+    assert resp.status_code == 200
+    [site] = resp.json()["sites"]
+    cells = {c["category"]: (c["count"], c["latest"]["file_name"]) for c in site["categories"]}
+    # other tests leave admin (global) reports behind too
+    assert site["site_name"] == "sumsite" and site["total"] == sum(c["count"] for c in site["categories"])
+    assert cells["daily"] == (3, "sum_sumsite_daily_5.pdf")
+    assert cells["monthly"] == (1, "sum_sumsite_monthly_1.pdf")
+    assert cells["yearly"] == (1, "sum_admin_yearly_2.pdf")
+
+    # cached per visibility class and site list: a matching ETag is a 304
+    again = client.get("/dashboard-summary", headers={**headers, "If-None-Match": resp.headers["ETag"]})
+    assert again.status_code == 304
+    # same URL and visibility, other memberships: that ETag doesn't match
+    other = _auth_headers(client, "summary-other@x.com", site_name="othersite")
+    resp = client.get("/dashboard-summary", headers={**other, "If-None-Match": resp.headers["ETag"]})
+    assert resp.status_code == 200 and [s["site_name"] for s in resp.json()["sites"]] == ["othersite"]
+
+
+def test_upload_report_streams_file_into_place(client):
+    import hashlib
+    body = b"%PDF-1.4 upload test"
+    resp = client.post("/upload-report", data={"site_name": "Shared", "category": "Other1", "date": "2023-05-06"},
+                       files={"file": ("report.pdf", body, "application/pdf")})
+    assert resp.status_code == 200
+    report = resp.json()["report"]
+    assert report["file_name"] == "Other1_06052023.pdf"
+    assert report["sha256"] == hashlib.sha256(body).hexdigest() and report["size"] == len(body)
+    reader = _auth_headers(client, "upload-reader@x.com")
+    assert client.get("/uploaded_reports/Other1_06052023.pdf", headers=reader).content == body
+
+    # same site/category/date without override/save_as_new is refused
+    resp = client.post("/upload-report", data={"site_name": "shared", "category": "Other1", "date": "2023-05-06"},
+                       files={"file": ("report.pdf", body, "application/pdf")})
+    assert resp.status_code == 400
+
+
+def test_identical_uploads_share_one_blob(client, db_session):
+    from app import blobstore, models
+    admin = _auth_headers(client, "blob-admin@x.com", site_name="admin")
+    body = b"same bytes for two sites"
+    ids = []
+    for site in ("shared", "personal"):
+        resp = client.post("/upload-report", data={"site_name": site, "category": "MACD", "date": "2022-07-08"},
+                           files={"file": ("r.pdf", body, "application/pdf")})
+        ids.append(resp.json()["report"]["id"])
+    sha = resp.json()["report"]["sha256"]
+    assert resp.json()["report"]["deduplicated"] is True
+    assert db_session.get(models.Blob, sha).ref_count == 2
+
+    client.delete(f"/delete-report/{ids[0]}", headers=admin)
+    db_session.expire_all()
+    assert db_session.get(models.Blob, sha).ref_count == 1
+    assert os.path.exists(blobstore.blob_path(sha))
+
+    client.delete(f"/delete-report/{ids[1]}", headers=admin)
+    db_session.expire_all()
+    assert db_session.get(models.Blob, sha) is None
+    assert not os.path.exists(blobstore.blob_path(sha))
+
+
+def test_bulk_upload_files_and_zip(client):
+    import io
+    import json
+    import zipfile
+    manifest = [
+        {"file": "a.pdf", "site_name": "shared", "category": "RSI", "date": "2021-01-04"},
+        {"file": "b.pdf", "site_name": "shared", "category": "RSI", "date": "2021-01-04", "save_as_new": True},
+        {"file": "c.pdf", "site_name": "shared", "category": "RSI", "date": "2021-01-04"},
+        {"file": "missing.pdf", "site_name": "shared", "category": "RSI", "date": "2021-01-05"},
+    ]
+    files = [("files", (name, f"bulk {name}".encode(), "application/pdf")) for name in ("a.pdf", "b.pdf", "c.pdf")]
+    resp = client.post("/upload-reports/bulk", data={"manifest": json.dumps(manifest)}, files=files)
+    assert resp.status_code == 200
+    body = resp.json()
+    assert (body["created"], body["failed"]) == (2, 2)
+    statuses = [(r["status"], r.get("report", {}).get("file_name")) for r in body["results"]]
+    assert statuses[:2] == [("created", "RSI_04012021.pdf"), ("created", "RSI_04012021_2.pdf")]
+    assert [r["status"] for r in body["results"][2:]] == ["error", "error"]
+
+    buf = io.BytesIO()
+    with zipfile.ZipFile(buf, "w") as zf:
+        zf.writestr("nightly/x.xlsx", b"zip member")
+    manifest = [{"file": "nightly/x.xlsx", "site_name": "shared", "category": "RSI", "date": "2021-01-04",
+                 "override": True}]
+    resp = client.post("/upload-reports/bulk", data={"manifest": json.dumps(manifest)},
+                       files={"archive": ("batch.zip", buf.getvalue(), "application/zip")})
+    [result] = resp.json()["results"]
+    assert result["status"] == "created" and result["report"]["file_name"] == "RSI_04012021.xlsx"
+    reader = _auth_headers(client, "bulk-reader@x.com")
+    assert client.get("/uploaded_reports/RSI_04012021.xlsx", headers=reader).content == b"zip member"
+
+
+def test_uploaded_file_by_name_is_served_from_the_callers_sites(client):
+    for site, body in (("namesite-a", b"site a"), ("namesite-b", b"site b")):
+        resp = client.post("/upload-report", data={"site_name": site, "category": "Samename", "date": "2022-03-04"},
+                           files={"file": ("r.csv", body, "text/csv")})
+        assert resp.json()["report"]["file_name"] == "Samename_04032022.csv"
+    reader_a = _auth_headers(client, "name-a@x.com", site_name="namesite-a")
+    reader_b = _auth_headers(client, "name-b@x.com", site_name="namesite-b")
+    outsider = _auth_headers(client, "name-c@x.com", site_name="namesite-c")
+    # b's upload is newer, but a only ever gets a's file
+    assert client.get("/uploaded_reports/Samename_04032022.csv", headers=reader_a).content == b"site a"
+    assert client.get("/uploaded_reports/Samename_04032022.csv", headers=reader_b).content == b"site b"
+    assert client.get("/uploaded_reports/Samename_04032022.csv", headers=outsider).status_code == 404
+
+
+def test_bulk_entries_sharing_a_file_each_get_the_whole_file(client):
+    import json
+    body = os.urandom(3 * 1024 * 1024 + 17)
+    manifest = [{"file": "a.pdf", "site_name": site, "category": "rsi", "date": "2021-03-01"} for site in ("s1", "s2")]
+    resp = client.post("/upload-reports/bulk", data={"manifest": json.dumps(manifest)},
+                       files=[("files", ("a.pdf", body, "application/pdf"))])
+    reports = [r["report"] for r in resp.json()["results"]]
+    assert [r["size"] for r in reports] == [len(body), len(body)]
+    assert reports[0]["sha256"] == reports[1]["sha256"] and reports[1]["deduplicated"]
+    reader = _auth_headers(client, "bulk-shared-reader@x.com")
+    for report in reports:
+        assert client.get(f"/report/{report['id']}/content", headers=reader).content == body
+
+
+def test_bulk_zip_limits_are_checked_before_extraction(client, monkeypatch):
+    import io
+    import json
+    import zipfile
+    from app import main
+    buf = io.BytesIO()
+    with zipfile.ZipFile(buf, "w", zipfile.ZIP_DEFLATED) as zf:
+        zf.writestr("a.pdf", b"\0" * 10_000)
+        zf.writestr("b.pdf", b"\0" * 10_000)
+    manifest = json.dumps([{"file": "a.pdf", "site_name": "zipsite", "category": "rsi", "date": "2021-02-01"}])
+
+    def upload():
+        return client.post("/upload-reports/bulk", data={"manifest": manifest},
+                           files={"archive": ("batch.zip", buf.getvalue(), "application/zip")})
+
+    monkeypatch.setattr(main, "BULK_ZIP_MAX_MEMBERS", 1)
+    assert upload().status_code == 413
+    monkeypatch.setattr(main, "BULK_ZIP_MAX_MEMBERS", 2)
+    monkeypatch.setattr(main, "BULK_ZIP_MAX_BYTES", 15_000)
+    resp = upload()
+    assert resp.status_code == 413 and "expands" in resp.json()["detail"]
+    monkeypatch.setattr(main, "BULK_ZIP_MAX_BYTES", 20_000)
+    assert upload().json()["created"] == 1
+
+
+def test_oversized_bulk_request_is_refused(client, monkeypatch):
+    import json
+    from app import ingest
+    monkeypatch.setitem(ingest.UPLOAD_SIZE_LIMITS, "/upload-reports/bulk", 1000)
+    manifest = json.dumps([{"file": "big.pdf", "site_name": "bigsite", "category": "rsi", "date": "2021-02-01"}])
+    resp = client.post("/upload-reports/bulk", data={"manifest": manifest},
+                       files={"files": ("big.pdf", b"x" * 100_000, "application/pdf")})
+    assert resp.status_code == 413
+    assert client.get("/reports/bigsite/rsi", headers=_auth_headers(client, "big@x.com")).json()["items"] == []
+
+
+def test_listing_with_async_session(async_client, db_session):
+    from datetime import datetime
+    from app import models
+    for day in (7, 8, 9):
+        db_session.add(models.Report(site_name="asyncsite", category="macd", file_name=f"MACD_0{day}012024.pdf",
+                                     file_type="pdf", date=datetime(2024, 1, day), visibility="shared"))
+    db_session.commit()
+    headers = _auth_headers(async_client, "async-lister@x.com", site_name="asyncsite", allowed_sites=["asyncsite"])
+
+    page = async_client.get("/reports/asyncsite/macd", params={"limit": 2}, headers=headers).json()
+    assert [r["file_name"] for r in page["items"]] == ["MACD_09012024.pdf", "MACD_08012024.pdf"]
+    rest = async_client.get("/reports/asyncsite/macd", params={"cursor": page["next_cursor"]}, headers=headers).json()
+    assert [r["file_name"] for r in rest["items"]] == ["MACD_07012024.pdf"] and rest["next_cursor"] is None
+    assert async_client.get("/report-dates/asyncsite/macd", headers=headers).json() == ["2024-01-09", "2024-01-08", "2024-01-07"]
+
+
+def test_db_pool_stats_admin_only(client):
+    assert client.get("/admin/db-pool", headers=_auth_headers(client, "pool-user@x.com")).status_code == 403
+    resp = client.get("/admin/db-pool", headers=_auth_headers(client, "pool-admin@x.com", site_name="admin"))
+    assert resp.status_code == 200
+    assert {"checkouts", "wait_seconds_max", "pools"} <= resp.json().keys()
+
+
+def test_auth_cache_stats_admin_only(client):
+    assert client.get("/admin/auth-cache", headers=_auth_headers(client, "cache-user@x.com")).status_code == 403
+    headers = _auth_headers(client, "cache-admin@x.com", site_name="admin")
+    client.get("/admin/auth-cache", headers=headers)
+    stats = client.get("/admin/auth-cache", headers=headers).json()
+    assert stats["hits"] >= 1 and "misses" in stats
+
+
+def test_personal_membership_grants_personal_reports(client, db_session):
+    from datetime import datetime
+    from app import models
+    db_session.add(models.Report(site_name="members", category="rsi", file_name="RSI_members.pdf",
+                                 file_type="pdf", date=datetime(2024, 6, 1), visibility="personal"))
+    db_session.commit()
+    outsider = _auth_headers(client, "no-personal@x.com", site_name="shared", allowed_sites=["shared"])
+    member = _auth_headers(client, "has-personal@x.com", site_name="shared", allowed_sites=["shared", "personal"])
+
+    assert client.get("/reports/members/rsi", headers=outsider).json()["items"] == []
+    assert len(client.get("/reports/members/rsi", headers=member).json()["items"]) == 1
+
+    login = client.post("/login", json={"email": "has-personal@x.com", "password": "pass"}).json()
+    assert login["user"]["allowed_sites"] == "personal,shared"
+
+
+def test_report_content_ranges_and_conditional_get(client):
+    body = bytes(range(256)) * 40
+    report = client.post("/upload-report", data={"site_name": "contentsite", "category": "macd", "date": "2023-07-08",
+                                                 "visibility": "personal"},
+                         files={"file": ("r.pdf", body, "application/pdf")}).json()["report"]
+    url = f"/report/{report['id']}/content"
+    reader = _auth_headers(client, "content-reader@x.com", site_name="personal")
+
+    assert client.get(url).status_code == 401
+    shared = _auth_headers(client, "content-shared@x.com")
+    assert client.get(url, headers=shared).status_code == 404  # personal report, hidden
+    assert client.post(f"/report/{report['id']}/link", headers=shared).status_code == 404
+
+    # ?token= takes a link token for this report only, never the session token
+    session_token = reader["Authorization"].split()[1]
+    assert client.get(url, params={"token": session_token}).status_code == 401
+    token = client.post(f"/report/{report['id']}/link", headers=reader).json()["token"]
+    assert client.get(f"/report/{report['id'] + 1}/content", params={"token": token}).status_code == 401
+    assert client.get(url, headers={"Authorization": f"Bearer {token}"}).status_code == 401
+
+    resp = client.get(url, params={"token": token})
+    assert resp.status_code == 200 and resp.content == body
+    assert resp.headers["etag"] == f'"{report["sha256"]}"'
+    assert "immutable" in resp.headers["cache-control"]
+
+    resp = client.get(url, params={"token": token}, headers={"Range": "bytes=100-199"})
+    assert resp.status_code == 206 and resp.content == body[100:200]
+
+    resp = client.get(url, params={"token": token}, headers={"If-None-Match": resp.headers["etag"]})
+    assert resp.status_code == 304 and resp.content == b""
+    resp = client.get(url, params={"token": token}, headers={"If-Modified-Since": resp.headers["last-modified"]})
+    assert resp.status_code == 304
+
+
+def test_listing_etag_and_invalidation_on_write(client, db_session):
+    from app import catalog
+    admin = _auth_headers(client, "catalog-admin@x.com", site_name="admin")
+    reader = _auth_headers(client, "catalog-reader@x.com")
+    report = client.post("/upload-report", data={"site_name": "catalogsite", "category": "rsi", "date": "2023-09-01"},
+                         files={"file": ("r.pdf", b"catalog", "application/pdf")}).json()["report"]
+
+    first = client.get("/reports/catalogsite/rsi", headers=reader)
+    etag = first.headers["etag"]
+    assert [r["id"] for r in first.json()["items"]] == [report["id"]]
+
+    hits = catalog.results.stats()["hits"]
+    assert client.get("/reports/catalogsite/rsi", headers=reader).json() == first.json()
+    assert catalog.results.stats()["hits"] == hits + 1
+    assert client.get("/reports/catalogsite/rsi", headers={**reader, "If-None-Match": etag}).status_code == 304
+
+    # a visibility change bumps the catalog version: new ETag, report hidden from a shared user
+    client.patch(f"/report/{report['id']}/visibility", json={"visibility": "personal"}, headers=admin)
+    resp = client.get("/reports/catalogsite/rsi", headers={**reader, "If-None-Match": etag})
+    assert resp.status_code == 200 and resp.headers["etag"] != etag and resp.json()["items"] == []
+
+
+def test_result_cache_is_bounded_by_bytes():
+    from app.catalog import ResultCache
+    cache = ResultCache(maxsize=10, max_bytes=10)
+    cache.put("a", b"12345")
+    cache.put("b", b"12345")
+    cache.put("c", b"123")
+    assert cache.get("a") is None and cache.get("c") == b"123"
+    assert cache.stats()["bytes"] == 8 and cache.stats()["evictions"] == 1
+
+
+def test_listing_body_matches_report_schema(client, db_session):
+    from datetime import datetime
+    from fastapi.encoders import jsonable_encoder
+    from app import models, schemas
+    report = models.Report(site_name="schemasite", category="macd", file_name="MACD_01022024.pdf",
+                           file_type="pdf", date=datetime(2024, 2, 1, 9, 30, 15, 250000), visibility="shared")
+    db_session.add(report)
+    db_session.commit()
+    headers = _auth_headers(client, "schema@x.com", site_name="schemasite")
+
+    page = schemas.ReportPage.model_validate(client.get("/reports/schemasite/macd", headers=headers).json())
+    assert page.items == [schemas.ReportOut.model_validate(report)]
+    # column rows encode exactly like the old ORM + jsonable_encoder path
+    listed = client.get("/reports/schemasite/macd", params={"unpaginated": True}, headers=headers).json()
+    assert listed == [jsonable_encoder(schemas.ReportOut.model_validate(report))]
+    assert listed[0]["date"] == "2024-02-01T09:30:15.250000"
+
+
+def test_report_preview_rendered_after_upload(client):
+    import time
+    headers = _auth_headers(client, "preview@x.com", site_name="previewsite")
+    csv_report = client.post("/upload-report", data={"site_name": "previewsite", "category": "rsi", "date": "2023-10-02"},
+                             files={"file": ("r.csv", b"ticker,rsi\nABC,71\n", "text/csv")}).json()["report"]
+    doc_report = client.post("/upload-report", data={"site_name": "previewsite", "category": "macd", "date": "2023-10-02"},
+                             files={"file": ("r.docx", b"not a preview type", "application/octet-stream")}).json()["report"]
+
+    url = f"/report/{csv_report['id']}/preview"
+    for _ in range(200):
+        resp = client.get(url, headers=headers)
+        if resp.status_code == 200:
+            break
+        time.sleep(0.02)
+    assert resp.status_code == 200 and resp.headers["content-type"] == "application/json"
+    assert resp.json()["rows"] == [["ABC", "71"]]
+    assert "immutable" in resp.headers["cache-control"]
+    assert client.get(url, headers={**headers, "If-None-Match": resp.headers["etag"]}).status_code == 304
+
+    # no preview for this type: the client falls back to /content
+    resp = client.get(f"/report/{doc_report['id']}/preview", headers=headers)
+    assert resp.status_code == 404 and resp.json()["detail"] == "No preview for this report"
@@ -0,0 +1,84 @@
+import re
+
+import pytest
+from sqlalchemy import event
+
+from app import metrics
+
+
+def _sample(text, name, **labels):
+    """Value of one sample line, or None."""
+    for line in text.splitlines():
+        if line.startswith(name + "{") or line.startswith(name + " "):
+            found = dict(re.findall(r'(\w+)="([^"]*)"', line.split(" ")[0]))
+            if all(found.get(k) == v for k, v in labels.items()):
+                return float(line.rsplit(" ", 1)[1])
+    return None
+
+
+@pytest.fixture()
+def counted_engine(db_engine):
+    # the test engine is not built by database.configure_engine
+    event.listen(db_engine, "before_cursor_execute", metrics.before_cursor_execute)
+    event.listen(db_engine, "after_cursor_execute", metrics.after_cursor_execute)
+    yield db_engine
+    event.remove(db_engine, "before_cursor_execute", metrics.before_cursor_execute)
+    event.remove(db_engine, "after_cursor_execute", metrics.after_cursor_execute)
+
+
+def test_histogram_buckets_are_cumulative():
+    hist = metrics.Histogram("demo_seconds", "Demo.", ("route",), buckets=(0.1, 1.0))
+    for value in (0.05, 0.1, 0.5, 3.0):
+        hist.observe(value, '/a/"{x}"')
+    lines = list(hist.render())
+    assert lines[:2] == ["# HELP demo_seconds Demo.", "# TYPE demo_seconds histogram"]
+    assert lines[2:] == [
+        'demo_seconds_bucket{route="/a/\\"{x}\\"",le="0.1"} 2',
+        'demo_seconds_bucket{route="/a/\\"{x}\\"",le="1.0"} 3',
+        'demo_seconds_bucket{route="/a/\\"{x}\\"",le="+Inf"} 4',
+        'demo_seconds_sum{route="/a/\\"{x}\\""} 3.65',
+        'demo_seconds_count{route="/a/\\"{x}\\""} 4',
+    ]
+
+
+def test_metrics_per_route_template_with_sql_and_bytes(client, counted_engine):
+    upload = client.post("/upload-report", files={"file": ("metrics.csv", b"a,b\n1,2\n", "text/csv")},
+                         data={"site_name": "metricsite", "category": "metrics", "date": "2024-05-01"})
+    assert upload.status_code == 200
+    file_name = upload.json()["report"]["file_name"]
+    resp = client.post("/create-account", json={"email": "metrics-reader@x.com", "password": "pass",
+                                                 "site_name": "metricsite"})
+    reader = {"Authorization": f"Bearer {resp.json()['access_token']}"}
+    assert client.get("/uploaded_reports/nope.csv").status_code == 401
+    before = client.get("/metrics").text
+    route = "/uploaded_reports/{file_name}"
+    served = _sample(before, "file_bytes_sent_total", route=route) or 0
+    count = _sample(before, "http_request_db_queries_count", method="GET", route=route) or 0
+
+    assert client.get(f"/uploaded_reports/{file_name}", headers=reader).content == b"a,b\n1,2\n"
+    assert client.get("/uploaded_reports/nope.csv", headers=reader).status_code == 404
+
+    text = client.get("/metrics").text
+    assert text.startswith("# HELP")
+    assert _sample(text, "http_requests_total", method="GET", route=route, status="200") >= 1
+    assert _sample(text, "http_requests_total", method="GET", route=route, status="404") >= 1
+    assert _sample(text, "http_request_duration_seconds_count", method="GET", route=route) >= 2
+    # the raw path never becomes a label
+    assert "nope.csv" not in text
+    assert _sample(text, "file_bytes_sent_total", route=route) == served + 8
+    assert _sample(text, "http_request_db_queries_count", method="GET", route=route) == count + 2
+    assert _sample(text, "http_request_db_queries_sum", method="GET", route=route) >= 2
+    assert _sample(text, "upload_bytes_total") >= 8
+    assert _sample(text, "db_queries_total") >= 2
+
+    assert client.get("/no/such/path").status_code == 404
+    text = client.get("/metrics").text
+    assert _sample(text, "http_requests_total", method="GET", route=metrics.UNMATCHED_ROUTE, status="404") >= 1
+
+
+def test_metrics_token(client, monkeypatch):
+    monkeypatch.setattr(metrics, "METRICS_TOKEN", "s3cret")
+    assert client.get("/metrics").status_code == 401
+    resp = client.get("/metrics", headers={"Authorization": "Bearer s3cret"})
+    assert resp.status_code == 200
+    assert resp.headers["content-type"].startswith("text/plain; version=0.0.4")
@@ -0,0 +1,66 @@
+from sqlalchemy import create_engine, inspect, text
+
+from app import migrate
+
+
+def test_new_database_is_created_and_stamped(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'new.db'}")
+    assert migrate.status(engine) == {"current": None, "head": migrate.head_revision(), "tables": False}
+
+    assert migrate.upgrade(engine) == "created"
+    state = migrate.status(engine)
+    assert state["current"] == state["head"] and state["tables"]
+    assert {"reports", "jobs", "report_text", "report_text_fts"} <= set(inspect(engine).get_table_names())
+    # running it again is a no-op upgrade
+    assert migrate.upgrade(engine) == "upgraded"
+
+
+def test_outdated_database_is_upgraded(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'old.db'}")
+    migrate.upgrade(engine)
+    with engine.begin() as conn:
+        # back to the revision before the search index
+        conn.execute(text("DROP TABLE report_text_fts"))
+        conn.execute(text("DROP TABLE report_text"))
+        conn.execute(text("UPDATE alembic_version SET version_num = '4f7b3e1c9a26'"))
+
+    assert migrate.upgrade(engine) == "upgraded"
+    assert migrate.status(engine)["current"] == migrate.head_revision()
+    assert "report_text" in inspect(engine).get_table_names()
+
+
+def test_importing_main_does_not_touch_the_database(tmp_path):
+    import os
+    import subprocess
+    import sys
+    db = tmp_path / "untouched.db"
+    subprocess.run([sys.executable, "-c", "import app.main"], check=True, cwd=migrate.BACKEND_DIR,
+                   env={**os.environ, "DATABASE_URL": f"sqlite:///{db}"}, capture_output=True)
+    assert not db.exists()
+
+
+def test_pre_alembic_database_is_upgraded_with_its_data(tmp_path):
+    from sqlalchemy.orm import Session
+
+    from app import models
+    engine = create_engine(f"sqlite:///{tmp_path / 'baseline.db'}")
+    with engine.begin() as conn:
+        # what create_all made on import before Alembic; visibility came from a later ALTER
+        conn.execute(text("CREATE TABLE users (id INTEGER PRIMARY KEY, email VARCHAR NOT NULL UNIQUE, "
+                          "hashed_password VARCHAR NOT NULL, site_name VARCHAR NOT NULL, "
+                          "allowed_sites VARCHAR NOT NULL)"))
+        conn.execute(text("CREATE TABLE reports (id INTEGER PRIMARY KEY, site_name VARCHAR NOT NULL, "
+                          "category VARCHAR NOT NULL, file_name VARCHAR NOT NULL, file_type VARCHAR NOT NULL, "
+                          "date DATETIME NOT NULL)"))
+        conn.execute(text("INSERT INTO users VALUES (1, 'old@x.com', 'h', 'shared', 'Shared, personal')"))
+        conn.execute(text("INSERT INTO reports VALUES (1, 'Shared', 'RSI', 'RSI_01012024.csv', 'csv', "
+                          "'2024-01-01 00:00:00')"))
+
+    assert migrate.upgrade(engine) == "legacy"
+    assert migrate.status(engine)["current"] == migrate.head_revision()
+    with Session(engine) as db:
+        assert db.get(models.User, 1).site_list == ["personal", "shared"]
+        report = db.get(models.Report, 1)
+        assert (report.site_name, report.category, report.visibility) == ("shared", "rsi", "shared")
+        db.add(models.User(email="new@x.com", hashed_password="h", site_name="shared", allowed_sites=["shared"]))
+        db.commit()
@@ -0,0 +1,54 @@
+from datetime import datetime
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session, sessionmaker
+
+import migrate_to_blobs
+from app import blobstore, models
+
+
+def _setup(tmp_path, monkeypatch):
+    engine = create_engine(f"sqlite:///{tmp_path / 'blobs.db'}")
+    models.Base.metadata.create_all(bind=engine)
+    SessionLocal = sessionmaker(bind=engine)
+    folder = tmp_path / "uploads"
+    folder.mkdir()
+    monkeypatch.setattr(migrate_to_blobs, "SessionLocal", SessionLocal)
+    monkeypatch.setattr(migrate_to_blobs, "UPLOAD_FOLDER", str(folder))
+    monkeypatch.setattr(blobstore, "BLOB_FOLDER", str(folder / "blobs"))
+    monkeypatch.setattr("sys.argv", ["migrate_to_blobs.py", "--batch-size", "2"])
+    (folder / "a.pdf").write_bytes(b"same bytes")
+    (folder / "b.pdf").write_bytes(b"same bytes")
+    (folder / "c.pdf").write_bytes(b"other bytes")
+    with SessionLocal() as db:
+        # c.pdf is shared by rows in two batches
+        for i, name in enumerate(["a.pdf", "c.pdf", "b.pdf", "c.pdf"]):
+            db.add(models.Report(site_name="shared", category="macd", file_name=name,
+                                 file_type="pdf", date=datetime(2024, 1, i + 1)))
+        db.commit()
+    return SessionLocal, folder
+
+
+def test_crash_before_commit_keeps_the_files(tmp_path, monkeypatch):
+    SessionLocal, folder = _setup(tmp_path, monkeypatch)
+    real_commit = Session.commit
+
+    def crash(self):
+        raise KeyboardInterrupt
+
+    # interrupted after the first batch's blobs were written, before its commit
+    monkeypatch.setattr(Session, "commit", crash)
+    with pytest.raises(KeyboardInterrupt):
+        migrate_to_blobs.main()
+    monkeypatch.setattr(Session, "commit", real_commit)
+    assert sorted(p.name for p in folder.glob("*.pdf")) == ["a.pdf", "b.pdf", "c.pdf"]
+
+    migrate_to_blobs.main()
+    assert list(folder.glob("*.pdf")) == []
+    with SessionLocal() as db:
+        reports = db.query(models.Report).order_by(models.Report.id).all()
+        assert all(r.blob_sha256 for r in reports)
+        contents = [open(blobstore.report_file_path(r), "rb").read() for r in reports]
+        assert contents == [b"same bytes", b"other bytes", b"same bytes", b"other bytes"]
+        assert sorted(b.ref_count for b in db.query(models.Blob)) == [2, 2]
@@ -0,0 +1,67 @@
+import json
+import threading
+import time
+
+from app import previews
+
+
+def _wait_for(path, timeout=10):
+    deadline = time.monotonic() + timeout
+    while not path.exists() and time.monotonic() < deadline:
+        time.sleep(0.02)
+    return path.exists()
+
+
+def test_table_previews_keep_the_first_rows(tmp_path, monkeypatch):
+    from openpyxl import Workbook
+    monkeypatch.setattr(previews, "PREVIEW_MAX_ROWS", 2)
+    csv_file = tmp_path / "r.csv"
+    csv_file.write_text("date,close\n2024-01-01,1\n2024-01-02,2\n2024-01-03,3\n")
+    assert previews.render("CSV", str(csv_file), str(tmp_path / "r.json"))
+    assert json.loads((tmp_path / "r.json").read_text()) == {
+        "columns": ["date", "close"], "rows": [["2024-01-01", "1"], ["2024-01-02", "2"]], "truncated": True,
+    }
+
+    workbook = Workbook()
+    workbook.active.title = "Signals"
+    workbook.active.append(["ticker", "rsi"])
+    workbook.active.append(["ABC", 71.5])
+    workbook.save(tmp_path / "r.xlsx")
+    assert previews.render("xlsx", str(tmp_path / "r.xlsx"), str(tmp_path / "x.json"))
+    assert json.loads((tmp_path / "x.json").read_text()) == {
+        "columns": ["ticker", "rsi"], "rows": [["ABC", 71.5]], "truncated": False, "sheet": "Signals",
+    }
+    assert previews.preview_format("docx") is None and previews.preview_format("PDF") == "png"
+
+
+def test_process_pool_renders_in_background(tmp_path):
+    src = tmp_path / "r.csv"
+    src.write_text("a,b\n1,2\n")
+    renderer = previews.PreviewRenderer(kind="process", workers=1)
+    try:
+        assert renderer.submit("csv", str(src), str(tmp_path / "r.json"))
+        assert _wait_for(tmp_path / "r.json")
+    finally:
+        renderer.shutdown()
+    assert renderer.stats()["completed"] == 1
+
+
+def test_queue_is_bounded_and_deduplicated(tmp_path, monkeypatch):
+    release = threading.Event()
+    monkeypatch.setattr(previews, "render", lambda *args: release.wait(5))
+    renderer = previews.PreviewRenderer(kind="thread", workers=1, max_pending=2)
+    try:
+        assert renderer.submit("csv", "a.csv", "a.json")
+        assert renderer.submit("csv", "a.csv", "a.json")  # already queued
+        assert renderer.submit("csv", "b.csv", "b.json")
+        assert not renderer.submit("csv", "c.csv", "c.json")
+        assert not renderer.submit("docx", "d.docx", "d.json")
+        assert renderer.stats()["pending"] == 2 and renderer.stats()["rejected"] == 1
+        release.set()
+        deadline = time.monotonic() + 5
+        while renderer.stats()["pending"] and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert renderer.stats()["completed"] == 2
+    finally:
+        release.set()
+        renderer.shutdown()
@@ -0,0 +1,109 @@
+import asyncio
+import time
+from types import SimpleNamespace
+
+import pytest
+from starlette.concurrency import run_in_threadpool
+
+from app import metrics, profiler
+
+
+def _auth_headers(client, email, **account):
+    resp = client.post("/create-account", json={"email": email, "password": "pass", **account})
+    return {"Authorization": f"Bearer {resp.json()['access_token']}"}
+
+
+def _spin(seconds):
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        pass
+
+
+def _blocking_export():
+    _spin(0.06)
+
+
+async def _slow_app(scope, receive, send):
+    _spin(0.03)
+    await run_in_threadpool(_blocking_export)
+    await asyncio.sleep(0.03)
+    await send({"type": "http.response.start", "status": 200, "headers": []})
+    await send({"type": "http.response.body", "body": b""})
+
+
+@pytest.fixture()
+def fresh_profiler(monkeypatch):
+    instance = profiler.Profiler(sample_percent=0, slow_ms=0, interval_ms=1, max_overhead=0.5)
+    monkeypatch.setattr(profiler, "profiler", instance)
+    yield instance
+    instance.stop()
+
+
+def _call(app, path="/slow"):
+    async def send(message):
+        pass
+    asyncio.run(app({"type": "http", "method": "GET", "path": path}, None, send))
+
+
+def test_slow_request_stacks_cover_loop_threadpool_and_waits(fresh_profiler):
+    fresh_profiler.configure(slow_ms=50)
+    _call(profiler.ProfilerMiddleware(_slow_app))
+
+    [entry] = fresh_profiler.entries()
+    assert entry["reason"] == "slow" and entry["status"] == 200 and entry["path"] == "/slow"
+    assert entry["samples"] == sum(entry["stacks"].values()) > 0
+    stacks = list(entry["stacks"])
+    assert any(s.endswith("test_profiler._slow_app;test_profiler._spin") for s in stacks)
+    # threadpool work is attributed to the request through its await chain
+    assert any("(threadpool);test_profiler._blocking_export" in s for s in stacks)
+    assert any(s.endswith("(await FutureIter)") for s in stacks)
+
+    collapsed = fresh_profiler.collapsed([entry])
+    assert all(line.startswith("GET <unmatched>;") and line.rsplit(" ", 1)[1].isdigit()
+               for line in collapsed.splitlines())
+
+
+def test_fast_requests_are_dropped_and_disabled_profiler_passes_through(fresh_profiler):
+    middleware = profiler.ProfilerMiddleware(_slow_app)
+    _call(middleware)
+    assert fresh_profiler.stats()["enabled"] is False and fresh_profiler._thread is None
+
+    fresh_profiler.configure(slow_ms=60_000)
+    _call(middleware)
+    assert fresh_profiler.entries() == [] and fresh_profiler.stats()["watching"] == 0
+
+
+def test_profiled_request_keeps_the_first_statements():
+    stats = metrics.RequestStats()
+    stats.statements, stats.statement_limit = [], 1
+    token = metrics.current_request.set(stats)
+    try:
+        for sql in ("SELECT 1", "SELECT 2"):
+            context = SimpleNamespace()
+            metrics.before_cursor_execute(None, None, sql, (), context, False)
+            metrics.after_cursor_execute(None, None, sql, (), context, False)
+    finally:
+        metrics.current_request.reset(token)
+    assert stats.queries == 2 and [sql for sql, _ in stats.statements] == ["SELECT 1"]
+
+
+def test_admin_profiles(client, fresh_profiler):
+    admin = _auth_headers(client, "profiler-admin@x.com", site_name="admin")
+    user = _auth_headers(client, "profiler-user@x.com", site_name="profsite")
+    assert client.get("/admin/profiles", headers=user).status_code == 403
+    assert client.put("/admin/profiler", json={"sample_percent": 101}, headers=admin).status_code == 422
+
+    assert client.put("/admin/profiler", json={"sample_percent": 100}, headers=admin).json()["enabled"]
+    client.get("/report-categories", params={"token": "secret"})
+    client.put("/admin/profiler", json={"sample_percent": 0}, headers=admin)
+
+    listing = client.get("/admin/profiles", headers=admin).json()
+    entry = next(e for e in listing if e["route"] == "/report-categories")
+    assert "stacks" not in entry and "token" not in entry["path"]
+    detail = client.get(f"/admin/profiles/{entry['id']}", headers=admin).json()
+    assert detail["queries"] == entry["queries"] and isinstance(detail["statements"], list)
+
+    flamegraph = client.get("/admin/profiles/flamegraph", params={"route": "/report-categories"}, headers=admin)
+    assert flamegraph.headers["content-type"].startswith("text/plain")
+    assert all(line.startswith("GET /report-categories") for line in flamegraph.text.splitlines())
+    assert client.get("/admin/profiles/999999", headers=admin).status_code == 404
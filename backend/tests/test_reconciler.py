@@ -0,0 +1,46 @@
+from datetime import datetime
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app import models, reconciler
+
+
+def _setup(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'reconcile.db'}")
+    models.Base.metadata.create_all(bind=engine)
+    SessionLocal = sessionmaker(bind=engine)
+    folder = tmp_path / "uploads"
+    folder.mkdir()
+    (folder / "present.pdf").write_bytes(b"x")
+    (folder / "stray.pdf").write_bytes(b"x")
+    with SessionLocal() as db:
+        for i, name in enumerate(["present.pdf", "gone_1.pdf", "gone_2.pdf"]):
+            db.add(models.Report(site_name="shared", category="macd", file_name=name,
+                                 file_type="pdf", date=datetime(2024, 1, i + 1)))
+        db.commit()
+    return SessionLocal, str(folder)
+
+
+def test_dry_run_reports_without_deleting(tmp_path):
+    SessionLocal, folder = _setup(tmp_path)
+    result = reconciler.reconcile(SessionLocal, folder, batch_size=1, max_batches_per_second=0,
+                                  dry_run=True, report_stray=True)
+
+    assert result.rows_scanned == 3
+    assert sorted(result.orphan_file_names) == ["gone_1.pdf", "gone_2.pdf"]
+    assert result.orphans_deleted == 0
+    assert result.stray_file_names == ["stray.pdf"]
+    with SessionLocal() as db:
+        assert db.query(models.Report).count() == 3
+
+
+def test_reconcile_deletes_orphans_in_batches(tmp_path):
+    SessionLocal, folder = _setup(tmp_path)
+    runs_before = reconciler.get_stats()["runs"]
+    result = reconciler.reconcile(SessionLocal, folder, batch_size=2, max_batches_per_second=0)
+
+    assert result.orphans_deleted == 2
+    with SessionLocal() as db:
+        assert [r.file_name for r in db.query(models.Report)] == ["present.pdf"]
+    assert reconciler.get_stats()["runs"] == runs_before + 1
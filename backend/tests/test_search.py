@@ -0,0 +1,97 @@
+import io
+
+import pytest
+from openpyxl import Workbook
+from sqlalchemy.orm import sessionmaker
+
+from app import crud, extract, search
+
+
+def _auth_headers(client, email, **account):
+    resp = client.post("/create-account", json={"email": email, "password": "pass", **account})
+    return {"Authorization": f"Bearer {resp.json()['access_token']}"}
+
+
+def _upload(client, name, body, category, visibility="shared"):
+    resp = client.post("/upload-report", files={"file": (name, body, "application/octet-stream")},
+                       data={"site_name": "searchsite", "category": category, "date": "2024-03-01",
+                             "visibility": visibility})
+    assert resp.status_code == 200
+    return resp.json()["report"]["id"]
+
+
+@pytest.fixture()
+def indexer(db_engine):
+    indexer = search.SearchIndexer(sessionmaker(bind=db_engine), workers=1, kind="thread", batch_size=5)
+    yield indexer
+    indexer.stop()
+
+
+def _xlsx_bytes(rows):
+    workbook = Workbook()
+    for row in rows:
+        workbook.active.append(row)
+    buf = io.BytesIO()
+    workbook.save(buf)
+    return buf.getvalue()
+
+
+def test_search_finds_indexed_contents_with_visibility(client, db_session, indexer):
+    csv_id = _upload(client, "signals.csv", b"ticker,signal\nZEBRACORP,oversold\n", "rsi")
+    xlsx_id = _upload(client, "book.xlsx", _xlsx_bytes([["ticker", "note"], ["QUOKKA", "oversold breakout"]]), "macd")
+    personal_id = _upload(client, "private.txt", b"oversold quokka watchlist", "notes", visibility="personal")
+    indexer.index_all()
+    assert search.index_status(db_session)["pending"] == 0
+
+    admin = _auth_headers(client, "search-admin@x.com", site_name="admin")
+    hits = client.get("/search", params={"q": "quokka", "site_name": "searchsite"}, headers=admin).json()["items"]
+    assert {h["id"] for h in hits} == {xlsx_id, personal_id}
+    assert all("[quokka]" in h["snippet"].lower() for h in hits)
+
+    # prefix match on the last word, narrowed by category
+    hits = client.get("/search", params={"q": "zebra", "site_name": "searchsite", "category": "RSI"},
+                      headers=admin).json()["items"]
+    assert [h["id"] for h in hits] == [csv_id]
+
+    # shared-only users don't find personal reports
+    user = _auth_headers(client, "search-user@x.com", site_name="searchsite")
+    hits = client.get("/search", params={"q": "oversold", "site_name": "searchsite", "limit": 1}, headers=user).json()
+    assert len(hits["items"]) == 1 and hits["next_offset"] == 1
+    rest = client.get("/search", params={"q": "oversold", "site_name": "searchsite", "limit": 1, "offset": 1},
+                      headers=user).json()
+    assert {hits["items"][0]["id"], rest["items"][0]["id"]} == {csv_id, xlsx_id} and rest["next_offset"] is None
+
+
+def test_deleted_report_text_is_not_inherited(client, db_session, indexer):
+    admin = _auth_headers(client, "search-admin3@x.com", site_name="admin")
+    old_id = _upload(client, "old.txt", b"AAPL earnings recap", "recycled")
+    indexer.index_all()
+    assert client.delete(f"/delete-report/{old_id}", headers=admin).status_code == 200
+
+    # SQLite hands the freed (highest) id to the next report
+    new_id = _upload(client, "new.txt", b"MSFT earnings recap", "recycled")
+    assert new_id == old_id
+    assert indexer.index_all() == 1
+    params = {"site_name": "searchsite", "category": "recycled"}
+    assert client.get("/search", params={"q": "aapl", **params}, headers=admin).json()["items"] == []
+    hits = client.get("/search", params={"q": "msft", **params}, headers=admin).json()["items"]
+    assert [h["id"] for h in hits] == [new_id]
+
+
+def test_query_syntax_is_not_interpreted(client):
+    admin = _auth_headers(client, "search-admin2@x.com", site_name="admin")
+    for q in ('"unbalanced', "a OR NOT b*", "col:value (x"):
+        resp = client.get("/search", params={"q": q, "site_name": "searchsite"}, headers=admin)
+        assert resp.status_code == 200, q
+    assert crud.fts5_query('say "hi" now') == '"say" """hi""" "now"*'
+    assert client.get("/search", params={"q": "  ", "site_name": "searchsite"}, headers=admin).status_code == 400
+
+
+def test_extract_text_statuses(tmp_path):
+    html = tmp_path / "r.html"
+    html.write_text("<h1>Weekly</h1><p>caf&eacute; signals</p>")
+    assert extract.extract_text("html", str(html)) == ("indexed", "Weekly café signals")
+    assert extract.extract_text("zip", str(html))[0] == "unsupported"
+    assert extract.extract_text("csv", str(tmp_path / "missing.csv"))[0] == "failed"
+    (tmp_path / "blank.txt").write_text("  \n")
+    assert extract.extract_text("txt", str(tmp_path / "blank.txt")) == ("empty", "")
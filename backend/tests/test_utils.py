@@ -20,3 +20,35 @@ def test_generate_pdf_report(tmp_path, monkeypatch):
     path = tmp_path / "out.pdf"
     utils.generate_pdf_report("<p>x</p>", str(path))
     assert path.exists()
+
+
+def test_write_rows_streams_a_yield_per_query(tmp_path, db_session):
+    from datetime import datetime
+    from openpyxl import load_workbook
+    from sqlalchemy import select
+    from app import models, utils
+    for day in (1, 2, 3):
+        db_session.add(models.Report(site_name="exportsite", category="rsi", file_name=f"RSI_0{day}.pdf",
+                                     file_type="pdf", date=datetime(2024, 5, day), visibility="shared"))
+    db_session.commit()
+    stmt = (select(models.Report.file_name, models.Report.date)
+            .where(models.Report.site_name == "exportsite").order_by(models.Report.date))
+
+    xlsx = tmp_path / "out.xlsx"
+    assert utils.write_rows(db_session.execute(stmt.execution_options(yield_per=2)), str(xlsx)) == 3
+    values = list(load_workbook(xlsx, read_only=True).active.values)
+    assert values[0] == ("file_name", "date") and values[3] == ("RSI_03.pdf", datetime(2024, 5, 3))
+
+    csv_path = tmp_path / "out.csv"
+    reports = db_session.scalars(select(models.Report).where(models.Report.site_name == "exportsite")
+                                 .order_by(models.Report.date).execution_options(yield_per=2))
+    assert utils.generate_csv_report(reports, str(csv_path), columns=["file_name", "category"]) == 3
+    assert csv_path.read_text().splitlines() == ["file_name,category", "RSI_01.pdf,rsi", "RSI_02.pdf,rsi", "RSI_03.pdf,rsi"]
+
+
+def test_generate_excel_report_streams_generators(tmp_path):
+    from openpyxl import load_workbook
+    from app import utils
+    path = tmp_path / "gen.xlsx"
+    utils.generate_excel_report(({"n": i, "sq": i * i} for i in range(5)), str(path))
+    assert list(load_workbook(path, read_only=True).active.values)[-1] == (4, 16)
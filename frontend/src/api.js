@@ -67,3 +67,21 @@ export async function changeReportVisibility(reportId, visibility) {
 
   return response.json();
 }
+
+// iframes/links/<img> can't send an Authorization header, so their URLs carry a
+// short-lived link token for this one report (never the session token)
+export async function reportLinkToken(reportId) {
+  const res = await api.post(`/report/${reportId}/link`);
+  return res.data.token;
+}
+
+export function reportContentUrl(reportId, linkToken) {
+  const base = process.env.REACT_APP_API_URL || 'http://localhost:8000';
+  return `${base}/report/${reportId}/content?token=${encodeURIComponent(linkToken || "")}`;
+}
+
+// Small rendition (PNG, or first rows as JSON for CSV/XLSX); 404 until it has been rendered
+export function reportPreviewUrl(reportId, linkToken) {
+  const base = process.env.REACT_APP_API_URL || 'http://localhost:8000';
+  return `${base}/report/${reportId}/preview?token=${encodeURIComponent(linkToken || "")}`;
+}
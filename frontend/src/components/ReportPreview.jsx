@@ -0,0 +1,93 @@
+// src/components/ReportPreview.jsx
+import React, { useEffect, useState } from "react";
+import api, { reportContentUrl, reportLinkToken, reportPreviewUrl } from "../api";
+
+const IMAGE_TYPES = ["pdf", "png", "jpg", "jpeg", "gif", "bmp", "webp", "tif", "tiff"];
+const TABLE_TYPES = ["csv", "xlsx", "xlsm"];
+
+// Shows the lightweight preview of a report; the full file is only loaded on request.
+// Without a preview (not rendered yet, or unsupported type) it falls back to the
+// full PDF iframe / download link.
+function ReportPreview({ report }) {
+  const fileType = (report.file_type || "").toLowerCase();
+  const [showFull, setShowFull] = useState(false);
+  const [previewFailed, setPreviewFailed] = useState(false);
+  const [table, setTable] = useState(null);
+  const [linkToken, setLinkToken] = useState(null);
+  const [linkFailed, setLinkFailed] = useState(false);
+
+  const isImage = IMAGE_TYPES.includes(fileType);
+  const isTable = TABLE_TYPES.includes(fileType);
+
+  useEffect(() => {
+    if (!isTable) return;
+    api
+      .get(`/report/${report.id}/preview`)
+      .then((res) => setTable(res.data))
+      .catch(() => setPreviewFailed(true));
+  }, [report.id, isTable]);
+
+  useEffect(() => {
+    let cancelled = false;
+    reportLinkToken(report.id)
+      .then((token) => !cancelled && setLinkToken(token))
+      .catch(() => !cancelled && setLinkFailed(true));
+    return () => { cancelled = true; };
+  }, [report.id]);
+
+  if (linkFailed) {
+    return <p className="text-gray-500 text-sm">{report.file_name} is not available.</p>;
+  }
+  if (!linkToken) {
+    return <p className="text-gray-500 text-sm">Loading {report.file_name}…</p>;
+  }
+
+  const downloadLink = (
+    <a href={reportContentUrl(report.id, linkToken)} target="_blank" rel="noopener noreferrer" className="text-blue-500 underline">Download {report.file_name}</a>
+  );
+
+  if (showFull || previewFailed || !(isImage || isTable)) {
+    return fileType === "pdf" ? (
+      <iframe src={reportContentUrl(report.id, linkToken)} width="100%" height="600px" title={report.file_name} className="rounded border" />
+    ) : (
+      downloadLink
+    );
+  }
+
+  if (isImage) {
+    return (
+      <div>
+        <img src={reportPreviewUrl(report.id, linkToken)} alt={`Preview of ${report.file_name}`} loading="lazy"
+             onError={() => setPreviewFailed(true)} className="rounded border max-w-full" />
+        {fileType === "pdf" ? (
+          <button onClick={() => setShowFull(true)} className="mt-2 text-blue-500 underline">Open full report</button>
+        ) : (
+          <div className="mt-2">{downloadLink}</div>
+        )}
+      </div>
+    );
+  }
+
+  return (
+    <div>
+      {table && (
+        <div className="overflow-x-auto">
+          <table className="min-w-full text-sm border">
+            <thead className="bg-gray-100">
+              <tr>{table.columns.map((c, i) => <th key={i} className="px-2 py-1 border text-left">{c}</th>)}</tr>
+            </thead>
+            <tbody>
+              {table.rows.map((row, i) => (
+                <tr key={i}>{row.map((v, j) => <td key={j} className="px-2 py-1 border">{v === null ? "" : String(v)}</td>)}</tr>
+              ))}
+            </tbody>
+          </table>
+          {table.truncated && <p className="text-gray-500 text-sm mt-1">Showing the first {table.rows.length} rows.</p>}
+        </div>
+      )}
+      <div className="mt-2">{downloadLink}</div>
+    </div>
+  );
+}
+
+export default ReportPreview;
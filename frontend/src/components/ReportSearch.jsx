@@ -0,0 +1,63 @@
+// src/components/ReportSearch.jsx
+import React, { useState } from "react";
+import { useNavigate } from "react-router-dom";
+import api from "../api";
+
+// Full-text search over the contents of a site's reports (GET /search).
+// Results link to the report's day in the viewer.
+function ReportSearch({ siteName }) {
+  const navigate = useNavigate();
+  const [query, setQuery] = useState("");
+  const [results, setResults] = useState(null);
+  const [nextOffset, setNextOffset] = useState(null);
+
+  const runSearch = (offset = 0) => {
+    if (!query.trim()) return;
+    api
+      .get("/search", { params: { q: query, site_name: siteName, offset } })
+      .then((res) => {
+        setResults((prev) => (offset ? [...prev, ...res.data.items] : res.data.items));
+        setNextOffset(res.data.next_offset);
+      })
+      .catch((err) => console.error(err));
+  };
+
+  const openReport = (r) => {
+    navigate(`/${siteName}/dashboard/reports/${r.category}/${r.date.slice(0, 10)}/view`);
+  };
+
+  return (
+    <div className="max-w-4xl mx-auto mb-6">
+      <form onSubmit={(e) => { e.preventDefault(); runSearch(); }} className="flex gap-2">
+        <input
+          type="search"
+          value={query}
+          onChange={(e) => setQuery(e.target.value)}
+          placeholder="Search report contents…"
+          className="flex-1 rounded border px-3 py-2"
+        />
+        <button type="submit" className="bg-blue-500 text-white rounded px-4 py-2 hover:bg-blue-600">Search</button>
+      </form>
+
+      {results && (
+        <ul className="mt-4 bg-white rounded-2xl shadow-md divide-y">
+          {results.length === 0 && <li className="p-4 text-gray-500">No reports match "{query}".</li>}
+          {results.map((r) => (
+            <li key={r.id} onClick={() => openReport(r)} className="p-4 cursor-pointer hover:bg-gray-50">
+              <div className="font-semibold">{r.file_name}</div>
+              <div className="text-sm text-gray-500">{r.category.toUpperCase()} — {r.date.slice(0, 10)}</div>
+              {r.snippet && <div className="text-sm mt-1">{r.snippet}</div>}
+            </li>
+          ))}
+          {nextOffset !== null && (
+            <li className="p-4 text-center">
+              <button onClick={() => runSearch(nextOffset)} className="text-blue-500 underline">Load more</button>
+            </li>
+          )}
+        </ul>
+      )}
+    </div>
+  );
+}
+
+export default ReportSearch;
@@ -1,12 +1,26 @@
 // src/pages/Dashboard.jsx
-import React from "react";
+import React, { useEffect, useState } from "react";
 import { useNavigate, useParams } from "react-router-dom";
 import HeaderBar from "../components/HeaderBar";
 import Sidebar from "../components/Sidebar";
+import ReportSearch from "../components/ReportSearch";
+import api from "../api";
 
 function Dashboard() {
   const navigate = useNavigate();
   const { site_name } = useParams();
+  // count and newest report per category, from one /dashboard-summary call
+  const [summary, setSummary] = useState({});
+
+  useEffect(() => {
+    api
+      .get("/dashboard-summary", { params: { site_name } })
+      .then((res) => {
+        const cells = res.data.sites.length ? res.data.sites[0].categories : [];
+        setSummary(Object.fromEntries(cells.map((c) => [c.category, c])));
+      })
+      .catch((err) => console.error(err));
+  }, [site_name]);
 
   const handleCategoryClick = (category) => {
     navigate(`/${site_name}/dashboard/reports/${category.toLowerCase()}/dates`);
@@ -32,14 +46,20 @@ function Dashboard() {
         <Sidebar backLinks={[{ label: "Back to Site Selection", path: "/sites" }]} />
 
         <main className="flex-1 px-6">
+          <ReportSearch siteName={site_name} />
           <div className="flex flex-wrap justify-center items-stretch gap-6 max-w-4xl mx-auto">
             {categories.map((cat) => (
               <div
                 key={cat}
                 onClick={() => handleCategoryClick(cat)}
-                className="bg-white text-black shadow-md rounded-2xl p-6 text-center cursor-pointer hover:bg-blue-500 hover:text-white transition duration-200 w-64 h-28 flex items-center justify-center"
+                className="bg-white text-black shadow-md rounded-2xl p-6 text-center cursor-pointer hover:bg-blue-500 hover:text-white transition duration-200 w-64 h-28 flex flex-col items-center justify-center"
               >
                 <h2 className="text-xl font-semibold">{cat}</h2>
+                {summary[cat.toLowerCase()] && (
+                  <p className="text-sm">
+                    {summary[cat.toLowerCase()].count} reports · latest {summary[cat.toLowerCase()].latest.date.slice(0, 10)}
+                  </p>
+                )}
               </div>
             ))}
 
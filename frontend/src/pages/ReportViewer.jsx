@@ -4,18 +4,28 @@ import { useParams, useNavigate } from "react-router-dom";
 import api, { deleteReport, changeReportVisibility } from "../api";
 import HeaderBar from "../components/HeaderBar";
 import Sidebar from "../components/Sidebar";
+import ReportPreview from "../components/ReportPreview";
 
 function ReportViewer() {
   const { site_name, category, date } = useParams();
   const navigate = useNavigate();
 
   const [reports, setReports] = useState([]);
+  const [nextCursor, setNextCursor] = useState(null);
 
-  useEffect(() => {
+  const loadReports = (cursor = null) => {
     api
-      .get(`/reports/${site_name}/${category}/${date}`)
-      .then((res) => setReports(res.data))
+      .get(`/reports/${site_name}/${category}/${date}`, { params: cursor ? { cursor } : {} })
+      .then((res) => {
+        setReports((prev) => (cursor ? [...prev, ...res.data.items] : res.data.items));
+        setNextCursor(res.data.next_cursor);
+      })
       .catch((err) => console.error(err));
+  };
+
+  useEffect(() => {
+    loadReports();
+    // eslint-disable-next-line react-hooks/exhaustive-deps
   }, [site_name, category, date]);
 
   const handleDelete = async (id) => {
@@ -58,11 +68,7 @@ function ReportViewer() {
                     <p className="mb-4"><strong>File Name:</strong> {report.file_name}</p>
                     <p className="mb-2"><strong>Visibility:</strong> {report.visibility || 'shared'}</p>
 
-                    {report.file_type === "pdf" ? (
-                      <iframe src={`http://localhost:8000/uploaded_reports/${report.file_name}`} width="100%" height="600px" title={report.file_name} className="rounded border" />
-                    ) : (
-                      <a href={`http://localhost:8000/uploaded_reports/${report.file_name}`} target="_blank" rel="noopener noreferrer" className="text-blue-500 underline">Download {report.file_name}</a>
-                    )}
+                    <ReportPreview report={report} />
                   </div>
 
                   {site_name === "admin" && (
@@ -86,6 +92,11 @@ function ReportViewer() {
                   )}
                 </div>
               ))}
+              {nextCursor && (
+                <div className="text-center">
+                  <button onClick={() => loadReports(nextCursor)} className="bg-blue-500 text-white px-4 py-2 rounded hover:bg-blue-600 transition">Load more</button>
+                </div>
+              )}
             </div>
           )}
         </main>
@@ -1,10 +1,20 @@
 // src/pages/SitePages.jsx
-import React from 'react';
+import React, { useEffect, useState } from 'react';
 import { useNavigate } from 'react-router-dom';
 import HeaderBar from "../components/HeaderBar";
+import api from "../api";
 
 function SitePages() {
   const navigate = useNavigate();
+  // report totals per site, one /dashboard-summary call for all allowed sites
+  const [totals, setTotals] = useState({});
+
+  useEffect(() => {
+    api
+      .get('/dashboard-summary')
+      .then((res) => setTotals(Object.fromEntries(res.data.sites.map((s) => [s.site_name, s]))))
+      .catch((err) => console.error(err));
+  }, []);
 
   // Retrieve allowed sites from localStorage (saved after login)
   const allowedSites = JSON.parse(localStorage.getItem('allowed_sites')) || [];
@@ -59,6 +69,11 @@ function SitePages() {
             >
               <h2 className="text-2xl font-semibold mb-2">{site.title}</h2>
               <p>{site.description}</p>
+              {totals[site.key] && totals[site.key].latest_date && (
+                <p className="text-sm mt-2">
+                  {totals[site.key].total} reports · latest {totals[site.key].latest_date.slice(0, 10)}
+                </p>
+              )}
             </div>
           ))
         ) : (
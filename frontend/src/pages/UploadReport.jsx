@@ -34,10 +34,11 @@ function UploadReport() {
 
     try {
       const existing = await api.get(
-        `/reports/${site_name}/${category}/${reportDate}`
+        `/reports/${site_name}/${category}/${reportDate}`,
+        { params: { limit: 1 } }
       );
 
-      if (existing.data.length > 0) {
+      if (existing.data.items.length > 0) {
         setPendingUpload({ file, category, reportDate });
         setShowOptions(true);
         setLoading(false);
@@ -8,7 +8,7 @@ echo.
 
 REM Backend startup
 echo 📡 Starting Backend (FastAPI)...
-start "Report Portal - Backend" cmd /k "cd backend && venv\Scripts\activate && uvicorn app.main:app --reload --host 0.0.0.0 --port 8000"
+start "Report Portal - Backend" cmd /k "cd backend && venv\Scripts\activate && python -m app.migrate && uvicorn app.main:app --reload --host 0.0.0.0 --port 8000"
 
 REM Wait a moment for backend to start
 timeout /t 2 /nobreak
@@ -17,7 +17,7 @@ $ScriptDir = $PSScriptRoot
 
 # Backend startup
 Write-Host "📡 Starting Backend (FastAPI)..." -ForegroundColor Cyan
-$BackendCmd = "cd '$ScriptDir\backend'; .\venv\Scripts\activate; uvicorn app.main:app --reload --host 0.0.0.0 --port 8000"
+$BackendCmd = "cd '$ScriptDir\backend'; .\venv\Scripts\activate; python -m app.migrate; uvicorn app.main:app --reload --host 0.0.0.0 --port 8000"
 Start-Process -FilePath "powershell" -ArgumentList "-NoExit", "-Command", $BackendCmd
 
 # Wait a moment for backend to start
@@ -14,6 +14,8 @@ echo ""
 echo "📡 Starting Backend (FastAPI)..."
 cd backend
 source venv/bin/activate
+# create or upgrade the database schema (the API no longer does it on import)
+python -m app.migrate
 uvicorn app.main:app --reload --host 0.0.0.0 --port 8000 &
 BACKEND_PID=$!
 cd ..